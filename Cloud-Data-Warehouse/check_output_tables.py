@@ -1,32 +1,73 @@
+import argparse
 import configparser
 import psycopg2
 import pandas as pd
-from sql_queries import analytics
+from sql_queries import table_counts, analytics_tables, rollup_analytics, table_stats_queries
+
 
 def get_result_analytics(cur):
     """
-    Method to get the queries from the analytics and put the result into a DataFrame
+    Method to get the count queries from the analytics and put the result into a DataFrame,
+    all queries are combined into one UNION ALL query
     
     :param cur: psycopg2 cursor object
     :return DataFrame with counts of all tables    
     """
-    res_df = pd.DataFrame(columns=['count'])
-    for k,v in analytics.items():
-        cur.execute(v)
-        results = cur.fetchone()
-        for row in results:
-            res_df.loc[k, 'count'] = row
-    return res_df.astype(int)
+    union = "\nUNION ALL\n".join(f"SELECT {k}, ({v})" for k, v in enumerate(table_counts.values()))
+    cur.execute(union)
+    counts = dict(cur.fetchall())
+    return pd.DataFrame({'count': [counts[k] for k in range(len(table_counts))]}, index=list(table_counts)).astype(int)
+
+
+def get_table_stats(cur):
+    """
+    Method to get the (estimated) row counts and sizes of all tables from the catalog in one query:
+    `svv_table_info` on Redshift, `pg_class` on Postgres. Run ANALYZE first for accurate estimates on Postgres.
+
+    :param cur: psycopg2 cursor object
+    :return DataFrame with the rows and size in MB of all tables
+    """
+    cur.execute("SELECT version()")
+    engine = 'redshift' if 'redshift' in cur.fetchone()[0].lower() else 'postgres'
+
+    tables = ", ".join(f"'{table}'" for table in analytics_tables.values())
+    cur.execute(table_stats_queries[engine].format(tables))
+    stats = pd.DataFrame.from_records(cur.fetchall(), columns=['table', 'rows', 'size_mb'], index='table')
+
+    # Empty tables are missing in svv_table_info
+    stats = stats.reindex(list(analytics_tables.values())).fillna(0).astype(int)
+    stats.index = list(analytics_tables)
+    return stats
+
+
+def get_rollup(cur, title):
+    """
+    Method to run a dashboard query on the rollup tables
+
+    :param cur: psycopg2 cursor object
+    :param (str) title: title of the query in `rollup_analytics`
+    :return DataFrame with the result of the query
+    """
+    cur.execute(rollup_analytics[title])
+    return pd.DataFrame.from_records(cur.fetchall(), columns=[column[0] for column in cur.description])
     
 
 def main():
+    parser = argparse.ArgumentParser(description='Check the row counts of the staging, fact and dimension tables')
+    parser.add_argument('--exact', action='store_true', help='count the rows instead of reading the catalog estimates')
+    parser.add_argument('--rollups', action='store_true', help='also show the dashboard queries on the rollup tables')
+    args = parser.parse_args()
+
     config = configparser.ConfigParser()
     config.read('dwh.cfg')
 
     conn = psycopg2.connect("host={} dbname={} user={} password={} port={}".format(*config['CLUSTER'].values()))
     cur = conn.cursor()
 
-    print(get_result_analytics(cur))
+    print(get_result_analytics(cur) if args.exact else get_table_stats(cur))
+    if args.rollups:
+        for title in rollup_analytics:
+            print(f"\n{title}\n{get_rollup(cur, title)}")
     conn.close()
 
 if __name__ == "__main__":
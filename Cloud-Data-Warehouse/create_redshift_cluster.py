@@ -3,8 +3,11 @@ import boto3
 import json
 import time
 import configparser
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
 
+# Error codes of Redshift while a new IAM role is not visible to it yet
+ROLE_NOT_READY_CODES = ('InvalidParameterValue',)
 
 
 def parse_config_file(filename, show=True):
@@ -85,12 +88,13 @@ def create_clients(dwh_region, key, secret):
     return ec2, s3, iam, redshift
 
 
-def create_iam_role_and_policy(iam, dwh_iam_role_name):
+def create_iam_role_and_policy(iam, dwh_iam_role_name, waiter_config={'Delay': 1, 'MaxAttempts': 30}):
     """
     Method to create IAM role based on DWH_IAM_ROLE_NAME
     
     :param iam: IAM client from boto3
     :param (str) dwh_iam_role_name: DWH_IAM_ROLE_NAME (from configuration file)
+    :param (dict) waiter_config: WaiterConfig of the `role_exists` waiter, a `Delay` of 0 runs it offline without waiting
     :return pointer to IAM role
     """
     
@@ -107,9 +111,11 @@ def create_iam_role_and_policy(iam, dwh_iam_role_name):
                    'Principal': {'Service': 'redshift.amazonaws.com'}}],
                  'Version': '2012-10-17'})
         )    
-    except Exception as e:
-        print(e)
-        
+    except iam.exceptions.EntityAlreadyExistsException:
+        print("IAM Role already exists, continue")
+
+    # A new role is not visible to all IAM endpoints right away
+    iam.get_waiter('role_exists').wait(RoleName=dwh_iam_role_name, WaiterConfig=waiter_config)
     
     print("1.2 Attaching Policy")
 
@@ -122,7 +128,8 @@ def create_iam_role_and_policy(iam, dwh_iam_role_name):
     print(roleArn)
     return roleArn
     
-def create_red_shift_cluster(redshift, roleArn, dwh_cluster_type,dwh_node_type, dwh_num_nodes, dwh_db, dwh_cluster_identifier, dwh_db_user, dwh_db_password):
+def create_red_shift_cluster(redshift, roleArn, dwh_cluster_type,dwh_node_type, dwh_num_nodes, dwh_db, dwh_cluster_identifier, dwh_db_user, dwh_db_password,
+                             attempts=6, sleep=time.sleep):
     """
     Method to create a new Redshift cluster
     
@@ -137,27 +144,39 @@ def create_red_shift_cluster(redshift, roleArn, dwh_cluster_type,dwh_node_type,
                         cluster operations such as deleting or modifying. The identifier also appears in the Amazon Redshift console.
     :param (str) dwh_db_user: The user name associated with the master user account for the cluster that is being created.
     :param (str) dwh_db_password: The password associated with the master user account for the cluster that is being created.
+    :param (int) attempts: Number of attempts while Redshift does not see the new IAM role yet
+    :param sleep: Function to wait a number of seconds, replace it to run offline with botocore stubs
     """
     
+    for attempt in range(attempts):
+        try:
+            response = redshift.create_cluster(        
+                #HW
+                ClusterType=dwh_cluster_type,
+                NodeType=dwh_node_type,
+                NumberOfNodes=int(dwh_num_nodes),
 
-    try:
-        response = redshift.create_cluster(        
-            #HW
-            ClusterType=dwh_cluster_type,
-            NodeType=dwh_node_type,
-            NumberOfNodes=int(dwh_num_nodes),
-
-            #Identifiers & Credentials
-            DBName=dwh_db,
-            ClusterIdentifier=dwh_cluster_identifier,
-            MasterUsername=dwh_db_user,
-            MasterUserPassword=dwh_db_password,
-
-            #Roles (for s3 access)
-            IamRoles=[roleArn]  
-        )
-    except Exception as e:
-        print(e)
+                #Identifiers & Credentials
+                DBName=dwh_db,
+                ClusterIdentifier=dwh_cluster_identifier,
+                MasterUsername=dwh_db_user,
+                MasterUserPassword=dwh_db_password,
+
+                #Roles (for s3 access)
+                IamRoles=[roleArn]  
+            )
+            return
+        except redshift.exceptions.ClusterAlreadyExistsFault:
+            print("Cluster Already exists, continue")
+            return
+        except ClientError as e:
+            # The IAM role is eventually consistent, Redshift can reject a role that was just created
+            error = e.response.get('Error', {})
+            if error.get('Code') not in ROLE_NOT_READY_CODES or 'role' not in error.get('Message', '').lower() \
+                    or attempt == attempts - 1:
+                raise
+            print(f"IAM Role not usable yet, retrying in {2 ** attempt}s")
+            sleep(2 ** attempt)
 
 def get_cluster_properties(redshift, dwh_cluster_identifier, pretty=False):
     """
@@ -200,6 +219,36 @@ def cluster_available(cluster_props):
         return False
 
 
+def wait_for_cluster(redshift, dwh_cluster_identifier, delay=5, max_delay=30, timeout=1800, sleep=time.sleep):
+    """
+    Method to wait until the Redshift cluster is available. The polling interval starts short and doubles
+    up to `max_delay`, so the endpoint is used soon after it is available without polling too often.
+    
+    :param redshift: Redshift client from boto3
+    :param (str) dwh_cluster_identifier: Identifier of the cluster
+    :param (float) delay: First polling interval in seconds
+    :param (float) max_delay: Maximum polling interval in seconds
+    :param (float) timeout: Maximum time to wait in seconds
+    :param sleep: Function to wait a number of seconds, replace it to run offline with botocore stubs
+    :return: Properties of the available Redshift cluster
+    """
+    waited = 0
+    while True:
+        cluster_props = get_cluster_properties(redshift, dwh_cluster_identifier, pretty=False)
+        print(f"Cluster status: {cluster_props['ClusterStatus']}")
+        if cluster_available(cluster_props) and cluster_props.get('Endpoint'):
+            return cluster_props
+        if cluster_props['ClusterStatus'] in ('deleting', 'final-snapshot', 'hardware-failure', 'incompatible-hsm',
+                                              'incompatible-network', 'incompatible-parameters', 'incompatible-restore'):
+            raise RuntimeError(f"Cluster {dwh_cluster_identifier} will not become available: {cluster_props['ClusterStatus']}")
+        if waited >= timeout:
+            raise TimeoutError(f"Cluster {dwh_cluster_identifier} not available after {waited}s")
+        print(f"Cluster not available yet, we will wait {delay}s")
+        sleep(delay)
+        waited += delay
+        delay = min(delay * 2, max_delay)
+
+
 def get_dwh_endpoint_role_arn(cluster_props):
     """
     Method to get DWH_ENDPOINT/HOST and DWH_ROLE_ARN/IAM ROLE
@@ -211,18 +260,30 @@ def get_dwh_endpoint_role_arn(cluster_props):
     DWH_ROLE_ARN = cluster_props['IamRoles'][0]['IamRoleArn']
     return DWH_ENDPOINT, DWH_ROLE_ARN
 
-def open_incoming_tcp(ec2, cluster_props, dwh_port):
+def get_default_vpc_id(ec2):
+    """
+    Method to get the id of the default VPC, a new cluster is launched in this VPC
+    
+    :param ec2: EC2 resource of boto3
+    :return: Id of the default VPC
+    """
+    return list(ec2.vpcs.filter(Filters=[{'Name': 'isDefault', 'Values': ['true']}]))[0].id
+
+
+def open_incoming_tcp(ec2, dwh_port, vpc_id=None):
     """
     Method To open an incoming  TCP port to access the cluster endpoint
     
-    :param ec2: EC2 client of boto3
-    :param (dict) cluster_props: roperties of Redshift Cluster
+    :param ec2: EC2 resource of boto3
     :param (str) dwh_port: Port of the DWH
+    :param (str) vpc_id: VPC of the cluster, defaults to the default VPC so the port can be opened before the cluster exists
+    :return: Id of the VPC
     """
      
     try:
-        vpc = ec2.Vpc(id=cluster_props['VpcId'])
-        defaultSg = list(vpc.security_groups.all())[0]
+        vpc_id = vpc_id or get_default_vpc_id(ec2)
+        vpc = ec2.Vpc(id=vpc_id)
+        defaultSg = list(vpc.security_groups.filter(Filters=[{'Name': 'group-name', 'Values': ['default']}]))[0]
         print(defaultSg)
         defaultSg.authorize_ingress(
             GroupName=defaultSg.group_name,
@@ -233,7 +294,32 @@ def open_incoming_tcp(ec2, cluster_props, dwh_port):
         )
     except Exception as e:
         print(e)
-        
+    return vpc_id
+
+
+def write_cluster_config(filename, cluster_props):
+    """
+    Method to write the HOST and ARN of the cluster to the configuration file
+    
+    :param (str) filename: path to filename of configuration file
+    :param (dict) cluster_props: Properties of Redshift Cluster
+    """
+    DWH_ENDPOINT, DWH_ROLE_ARN = get_dwh_endpoint_role_arn(cluster_props)
+    print("DWH_ENDPOINT :: ", DWH_ENDPOINT)
+    print("DWH_ROLE_ARN :: ", DWH_ROLE_ARN)
+
+    config = configparser.ConfigParser()
+
+    with open(filename) as configfile:
+        config.read_file(configfile)
+
+    config.set("CLUSTER", "HOST", DWH_ENDPOINT)
+    config.set("IAM_ROLE", "ARN", DWH_ROLE_ARN)
+
+    with open(filename, 'w+') as configfile:
+        config.write(configfile)
+
+
 def main(filename='dwh.cfg'):
     
     # Parsing the configuration file
@@ -243,43 +329,23 @@ def main(filename='dwh.cfg'):
     # Creating the clients
     ec2, s3, iam, redshift = create_clients(DWH_REGION, KEY, SECRET)
     
-    # Create the IAM Role and Access Policy
-    roleArn = create_iam_role_and_policy(iam, DWH_IAM_ROLE_NAME)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        # Open an incoming TCP port in the default VPC while the IAM Role and the cluster are created
+        ingress = executor.submit(open_incoming_tcp, ec2, DWH_PORT)
+
+        # Create the IAM Role and Access Policy
+        roleArn = create_iam_role_and_policy(iam, DWH_IAM_ROLE_NAME)
     
-    # Create the Redshift Cluster
-    try:
+        # Create the Redshift Cluster and wait until it is available
         create_red_shift_cluster(redshift, roleArn, DWH_CLUSTER_TYPE,DWH_NODE_TYPE, DWH_NUM_NODES, DWH_DB, DWH_CLUSTER_IDENTIFIER, DWH_DB_USER, DWH_DB_PASSWORD)
-    except ClusterAlreadyExists:
-        print("Cluster Already exists, continue")
-        
-    
-    while True:
-        print('Get cluster properties')
-        cluster_props = get_cluster_properties(redshift, DWH_CLUSTER_IDENTIFIER, pretty=False)
-        print(f"Cluster status: {cluster_props['ClusterStatus']}")
-        if cluster_available(cluster_props):
-            DWH_ENDPOINT, DWH_ROLE_ARN = get_dwh_endpoint_role_arn(cluster_props)
-            print("DWH_ENDPOINT :: ", DWH_ENDPOINT)
-            print("DWH_ROLE_ARN :: ", DWH_ROLE_ARN)
-            break
-        else:
-            print("Cluster not available yet, we will wait 60s")
-        time.sleep(60)
-    
-    # Writing to Configuration file
-    config = configparser.ConfigParser()
+        cluster_props = wait_for_cluster(redshift, DWH_CLUSTER_IDENTIFIER)
 
-    with open(filename) as configfile:
-        config.read_file(configfile)
-
-    config.set("CLUSTER", "HOST", cluster_props['Endpoint']['Address'])
-    config.set("IAM_ROLE", "ARN", cluster_props['IamRoles'][0]['IamRoleArn'])
-
-    with open(filename, 'w+') as configfile:
-        config.write(configfile)
+        # Writing to Configuration file
+        write_cluster_config(filename, cluster_props)
 
-    # Open an incoming  TCP port to access the cluster endpoint
-    open_incoming_tcp(ec2, cluster_props, DWH_PORT)
+        # An existing cluster can live in another VPC than the default one
+        if ingress.result() != cluster_props['VpcId']:
+            open_incoming_tcp(ec2, DWH_PORT, cluster_props['VpcId'])
     
     
 if __name__ == '__main__':
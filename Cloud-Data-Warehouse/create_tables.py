@@ -1,28 +1,28 @@
 import configparser
 import psycopg2
-from sql_queries import create_table_queries, drop_table_queries
+from sql_queries import create_table_queries, drop_table_queries, rollup_table_create_queries, rollup_table_drop_queries
 
 
 def drop_tables(cur, conn):
     """
-    Drops each table (staging, fact, dimensions) using the queries in `drop_table_queries` list.
+    Drops each table (staging, fact, dimensions, rollups) using the queries in `drop_table_queries` and `rollup_table_drop_queries` lists.
     
     :param cur: psycopg2 cursor object
     :param conn: psycopg2 connection object
     """
-    for query in drop_table_queries:
+    for query in drop_table_queries + rollup_table_drop_queries:
         cur.execute(query)
         conn.commit()
 
 
 def create_tables(cur, conn):
     """
-    Creates each table (staging, fact, dimensions) using the queries in `create_table_queries` list. 
+    Creates each table (staging, fact, dimensions, rollups) using the queries in `create_table_queries` and `rollup_table_create_queries` lists. 
     
     :param cur: psycopg2 cursor object
     :param conn: psycopg2 connection object
     """
-    for query in create_table_queries:
+    for query in create_table_queries + rollup_table_create_queries:
         cur.execute(query)
         conn.commit()
 
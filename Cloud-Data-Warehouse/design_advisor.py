@@ -0,0 +1,317 @@
+import argparse
+import configparser
+import re
+import psycopg2
+import pandas as pd
+from sql_queries import create_table_queries
+
+# Row count of a table below which it is copied to every node (DISTSTYLE ALL)
+ALL_THRESHOLD = 1000000
+
+# Staging column each column of the final tables is loaded from (see the insert queries in `sql_queries`)
+COLUMN_SOURCES = {
+    'songplays': {'start_time': ('staging_events', 'ts'), 'user_id': ('staging_events', 'userId'),
+                  'level': ('staging_events', 'level'), 'song_id': ('staging_songs', 'song_id'),
+                  'artist_id': ('staging_songs', 'artist_id'), 'session_id': ('staging_events', 'sessionId'),
+                  'location': ('staging_events', 'location'), 'user_agent': ('staging_events', 'userAgent')},
+    'users': {'user_id': ('staging_events', 'userId'), 'first_name': ('staging_events', 'firstName'),
+              'last_name': ('staging_events', 'lastName'), 'gender': ('staging_events', 'gender'),
+              'level': ('staging_events', 'level')},
+    'songs': {'song_id': ('staging_songs', 'song_id'), 'title': ('staging_songs', 'title'),
+              'artist_id': ('staging_songs', 'artist_id'), 'year': ('staging_songs', 'year'),
+              'duration': ('staging_songs', 'duration')},
+    'artists': {'artist_id': ('staging_songs', 'artist_id'), 'name': ('staging_songs', 'artist_name'),
+                'location': ('staging_songs', 'artist_location'), 'latitude': ('staging_songs', 'artist_latitude'),
+                'longitude': ('staging_songs', 'artist_longitude')},
+    'time': {'start_time': ('staging_events', 'ts')}
+}
+
+# Staging column whose distinct values estimate the number of rows of a table (None: all staging rows)
+ROW_SOURCES = {
+    'staging_events': ('staging_events', None),
+    'staging_songs': ('staging_songs', None),
+    'songplays': ('staging_events', None),
+    'users': ('staging_events', 'userId'),
+    'songs': ('staging_songs', 'song_id'),
+    'artists': ('staging_songs', 'artist_id'),
+    'time': ('staging_events', 'ts')
+}
+
+# Joins between the fact and the dimensions used by the analytics on the star schema,
+# and between the staging tables in the songplay insert
+JOINS = [
+    (('songplays', 'user_id'), ('users', 'user_id')),
+    (('songplays', 'song_id'), ('songs', 'song_id')),
+    (('songplays', 'artist_id'), ('artists', 'artist_id')),
+    (('songplays', 'start_time'), ('time', 'start_time')),
+    (('staging_events', 'song'), ('staging_songs', 'title')),
+]
+
+# Assumed compression ratio per encoding to estimate the scanned bytes
+COMPRESSION_RATIO = {'raw': 1.0, 'az64': 3.0, 'zstd': 3.0, 'bytedict': 4.0, 'delta': 2.0}
+
+CONSTRAINT = re.compile(r"\s+(NOT NULL|NULL|UNIQUE|PRIMARY KEY|REFERENCES)\b", re.IGNORECASE)
+
+
+def parse_create_table(query):
+    """
+    Method to split a CREATE TABLE statement into its table name and column definitions
+
+    :param (str) query: CREATE TABLE statement from `sql_queries`
+    :return table name, dictionary with the column definition per column and the DISTKEY and SORTKEY columns
+    """
+    table = re.search(r"CREATE TABLE (?:IF NOT EXISTS )?(\w+)", query).group(1)
+    body = query[query.index('(') + 1:query.rindex(')')]
+
+    definitions, depth, current = [], 0, ''
+    for char in body:
+        depth += {'(': 1, ')': -1}.get(char, 0)
+        if char == ',' and depth == 0:
+            definitions.append(current.strip())
+            current = ''
+        else:
+            current += char
+    definitions.append(current.strip())
+
+    columns, distkey, sortkey = {}, None, None
+    for definition in filter(None, definitions):
+        name = definition.split()[0]
+        if re.search(r"\bDISTKEY\b", definition, re.IGNORECASE):
+            distkey = name
+        if re.search(r"\bSORTKEY\b", definition, re.IGNORECASE):
+            sortkey = name
+        columns[name] = re.sub(r"\s+(DISTKEY|SORTKEY)\b", "", definition, flags=re.IGNORECASE)
+    return table, columns, distkey, sortkey
+
+
+def profile_table(cur, table, columns):
+    """
+    Method to profile a staging table in one query: row count, and distinct count, NULL count and average width per column
+
+    :param cur: psycopg2 cursor object
+    :param (str) table: staging table
+    :param (list) columns: columns of the staging table
+    :return DataFrame with one row per column and the row count of the table
+    """
+    aggregates = ["COUNT(*)"]
+    for column in columns:
+        aggregates += [f"COUNT(DISTINCT {column})",
+                       f"SUM(CASE WHEN {column} IS NULL THEN 1 ELSE 0 END)",
+                       f"AVG(OCTET_LENGTH(CAST({column} AS varchar)))"]
+    cur.execute(f"SELECT {', '.join(aggregates)} FROM {table}")
+    result = cur.fetchone()
+
+    num_rows = result[0]
+    profile = pd.DataFrame([result[1 + 3 * k:4 + 3 * k] for k in range(len(columns))],
+                           index=[c.lower() for c in columns], columns=['distinct', 'nulls', 'avg_width'])
+    profile['avg_width'] = profile['avg_width'].astype(float).fillna(0)
+    return profile, num_rows
+
+
+def profile_staging(cur, tables):
+    """
+    Method to profile all staging tables
+
+    :param cur: psycopg2 cursor object
+    :param (dict) tables: column definitions per table as returned by `parse_create_table`
+    :return dictionary with per staging table the column profile and the row count
+    """
+    return {table: profile_table(cur, table, list(tables[table]['columns']))
+            for table in ('staging_events', 'staging_songs')}
+
+
+def estimate_table(table, columns, profiles):
+    """
+    Method to estimate the rows and the per column cardinality and width of a table from the staging profiles
+
+    :param (str) table: table name
+    :param (list) columns: columns of the table
+    :param (dict) profiles: result of `profile_staging`
+    :return number of rows and DataFrame with the distinct count and average width per column
+    """
+    source_table, source_column = ROW_SOURCES[table]
+    staging_profile, staging_rows = profiles[source_table]
+    num_rows = staging_rows if source_column is None else staging_profile.loc[source_column.lower(), 'distinct']
+
+    estimates = []
+    for column in columns:
+        source = (table, column) if table.startswith('staging') else COLUMN_SOURCES[table].get(column)
+        if source is None:
+            # Surrogate keys (IDENTITY) and the parts of a timestamp are integers
+            estimates.append((column, num_rows, 4.0))
+            continue
+        column_profile = profiles[source[0]][0].loc[source[1].lower()]
+        estimates.append((column, min(column_profile['distinct'], num_rows), column_profile['avg_width']))
+    return num_rows, pd.DataFrame(estimates, columns=['column', 'distinct', 'avg_width']).set_index('column')
+
+
+def choose_encoding(definition, distinct, is_sortkey):
+    """
+    Method to choose the compression encoding of a column
+
+    :param (str) definition: column definition
+    :param (int) distinct: estimated number of distinct values
+    :param (bool) is_sortkey: True if the column is the sort key (sort keys are left uncompressed)
+    :return encoding
+    """
+    data_type = definition.split()[1].lower()
+    if is_sortkey:
+        return 'raw'
+    if data_type in ('int', 'integer', 'bigint', 'smallint', 'timestamp', 'date', 'numeric', 'decimal'):
+        return 'az64'
+    if distinct < 256:
+        return 'bytedict'
+    return 'zstd'
+
+
+def advise_table(table, columns, num_rows, estimates):
+    """
+    Method to choose the distribution style, sort key and column encodings of a table
+
+    :param (str) table: table name
+    :param (dict) columns: column definitions of the table
+    :param (int) num_rows: estimated number of rows
+    :param estimates: DataFrame with the distinct count and average width per column
+    :return dictionary with the physical design of the table
+    """
+    join_columns = [left[1] for left, right in JOINS if left[0] == table] + \
+                   [right[1] for left, right in JOINS if right[0] == table]
+
+    if num_rows < ALL_THRESHOLD and not table.startswith('staging'):
+        diststyle, distkey = 'ALL', None
+    elif join_columns:
+        # The most selective join column spreads the rows evenly and collocates the joins on it
+        distkey = max(join_columns, key=lambda c: estimates.loc[c, 'distinct'])
+        diststyle = 'KEY' if estimates.loc[distkey, 'distinct'] >= num_rows / 100 else 'EVEN'
+        distkey = distkey if diststyle == 'KEY' else None
+    else:
+        diststyle, distkey = 'EVEN', None
+
+    timestamps = [c for c, d in columns.items() if d.split()[1].lower() == 'timestamp']
+    sortkey = timestamps[0] if timestamps else next(iter(columns))
+
+    encodings = {c: choose_encoding(d, estimates.loc[c, 'distinct'], c == sortkey) for c, d in columns.items()}
+    return {'diststyle': diststyle, 'distkey': distkey, 'sortkey': sortkey, 'encodings': encodings}
+
+
+def current_design(columns, distkey, sortkey):
+    """
+    Method to describe the physical design of the current DDL in `sql_queries` (COPY with compupdate off)
+
+    :return dictionary with the physical design of the table
+    """
+    return {'diststyle': 'KEY' if distkey else 'EVEN', 'distkey': distkey, 'sortkey': sortkey,
+            'encodings': {c: 'raw' for c in columns}}
+
+
+def create_table_ddl(table, columns, design):
+    """
+    Method to write the CREATE TABLE statement of a physical design
+
+    :param (str) table: table name
+    :param (dict) columns: column definitions of the table
+    :param (dict) design: result of `advise_table`
+    :return CREATE TABLE statement
+    """
+    definitions = []
+    for column, definition in columns.items():
+        encode = f" ENCODE {design['encodings'][column]}"
+        match = CONSTRAINT.search(definition)
+        definitions.append(definition[:match.start()] + encode + definition[match.start():] if match
+                           else definition + encode)
+
+    distribution = f"DISTSTYLE {design['diststyle']}"
+    if design['distkey']:
+        distribution += f" DISTKEY ({design['distkey']})"
+    return "CREATE TABLE IF NOT EXISTS {} (\n    {})\n{}\nSORTKEY ({});".format(
+        table, ",\n    ".join(definitions), distribution, design['sortkey'])
+
+
+def estimate_costs(tables, designs, num_nodes):
+    """
+    Method to estimate the scanned bytes per table and the redistributed bytes per join of a set of designs
+
+    :param (dict) tables: table properties with the estimated rows and column widths
+    :param (dict) designs: physical design per table
+    :param (int) num_nodes: number of nodes of the cluster
+    :return DataFrame with the estimated scan and redistribution cost in MB
+    """
+    def table_bytes(table, columns=None):
+        estimates = tables[table]['estimates']
+        columns = columns or list(estimates.index)
+        return sum(tables[table]['rows'] * estimates.loc[c, 'avg_width'] /
+                   COMPRESSION_RATIO[designs[table]['encodings'][c]] for c in columns)
+
+    costs = [('scan', table, table_bytes(table) / 1e6) for table in tables]
+    for (left, left_column), (right, right_column) in JOINS:
+        left_design, right_design = designs[left], designs[right]
+        if 'ALL' in (left_design['diststyle'], right_design['diststyle']) or \
+                (left_design['distkey'] == left_column and right_design['distkey'] == right_column):
+            moved = 0.0
+        elif left_design['distkey'] == left_column:
+            moved = table_bytes(right, [right_column])
+        elif right_design['distkey'] == right_column:
+            moved = table_bytes(left, [left_column])
+        else:
+            # Broadcast the smaller side to every node
+            moved = min(table_bytes(left, [left_column]), table_bytes(right, [right_column])) * num_nodes
+        costs.append(('redistribute', f"{left}.{left_column} = {right}.{right_column}", moved / 1e6))
+    return pd.DataFrame(costs, columns=['step', 'object', 'MB'])
+
+
+def main():
+    """
+    Method to:
+
+    1. Parse the current DDL from `sql_queries`
+    2. Profile the staging tables (cardinalities, NULLs and widths) with one query per table
+    3. Choose the distribution style, sort key and column encodings of every table and write the DDL
+    4. With --compare: show the estimated scan and redistribution cost of the advised against the current DDL
+    """
+    parser = argparse.ArgumentParser(description='Advise the physical design of the warehouse tables')
+    parser.add_argument('--compare', action='store_true', help='compare the estimated cost with the current DDL')
+    parser.add_argument('--output', help='file to write the advised DDL to')
+    args = parser.parse_args()
+
+    config = configparser.ConfigParser()
+    config.read('dwh.cfg')
+    num_nodes = int(config.get('CLUSTER', 'DWH_NUM_NODES', fallback=1))
+
+    conn = psycopg2.connect("host={} dbname={} user={} password={} port={}".format(*config['CLUSTER'].values()))
+    cur = conn.cursor()
+
+    tables = {}
+    for query in create_table_queries:
+        table, columns, distkey, sortkey = parse_create_table(query)
+        tables[table] = {'columns': columns, 'distkey': distkey, 'sortkey': sortkey}
+
+    profiles = profile_staging(cur, tables)
+    conn.close()
+
+    advised, current, ddl = {}, {}, []
+    for table, properties in tables.items():
+        num_rows, estimates = estimate_table(table, list(properties['columns']), profiles)
+        properties.update({'rows': num_rows, 'estimates': estimates})
+        advised[table] = advise_table(table, properties['columns'], num_rows, estimates)
+        current[table] = current_design(properties['columns'], properties['distkey'], properties['sortkey'])
+        ddl.append(create_table_ddl(table, properties['columns'], advised[table]))
+
+    print(pd.DataFrame([(t, tables[t]['rows'], d['diststyle'], d['distkey'], d['sortkey'])
+                        for t, d in advised.items()],
+                       columns=['table', 'rows', 'diststyle', 'distkey', 'sortkey']).set_index('table'))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write('\n\n'.join(ddl) + '\n')
+    else:
+        print('\n\n'.join(ddl))
+
+    if args.compare:
+        comparison = estimate_costs(tables, current, num_nodes).rename(columns={'MB': 'current_MB'})
+        comparison['advised_MB'] = estimate_costs(tables, advised, num_nodes)['MB']
+        print(comparison.round(2).to_string(index=False))
+        print(comparison.groupby('step')[['current_MB', 'advised_MB']].sum().round(2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,120 @@
 import configparser
-import psycopg2
-from sql_queries import copy_table_queries, insert_table_queries
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from psycopg2.pool import ThreadedConnectionPool
+from sql_queries import staging_events_copy, staging_songs_copy, songplay_table_insert, user_table_insert, \
+    song_table_insert, artist_table_insert, time_table_insert, rollup_table_update
+from prepare_staging import prepare_staging
 
+# Statements of the load with the statements they depend on, every statement of `copy_table_queries` and
+# `insert_table_queries` in `sql_queries` plus the rollup update
+load_graph = {
+    'staging_events': (staging_events_copy, []),
+    'staging_songs': (staging_songs_copy, []),
+    'users': (user_table_insert, ['staging_events']),
+    'time': (time_table_insert, ['staging_events']),
+    'songs': (song_table_insert, ['staging_songs']),
+    'artists': (artist_table_insert, ['staging_songs']),
+    'songplays': (songplay_table_insert, ['staging_events', 'staging_songs']),
+    'rollups': (rollup_table_update, ['songplays'])
+}
 
-def load_staging_tables(cur, conn):
+
+def check_graph(graph):
     """
-    Method to load data from the logs to the staging tables
-    
-    :param cur: psycopg2 cursor object
-    :param conn: psycopg2 connection object
+    Method to check that every dependency of a load graph exists and that the graph has no cycles
+
+    :param (dict) graph: statement name to a tuple of the query and the names it depends on
     """
-    
-    print('Copying Song en Logs from Music App to staging tables')
-    for k, query in enumerate(copy_table_queries):
-        print(f'Query {k+1} from {len(copy_table_queries)}:\n{query}')
-        cur.execute(query)
-        conn.commit()
+    for name, (query, dependencies) in graph.items():
+        unknown = [d for d in dependencies if d not in graph]
+        if unknown:
+            raise ValueError(f"Statement '{name}' depends on unknown statements {unknown}")
+
+    done, remaining = set(), dict(graph)
+    while remaining:
+        ready = [name for name, (query, dependencies) in remaining.items() if set(dependencies) <= done]
+        if not ready:
+            raise ValueError(f"The statements {sorted(remaining)} have a circular dependency")
+        done.update(ready)
+        for name in ready:
+            del remaining[name]
 
 
-def insert_tables(cur, conn):
+def run_statement(pool, name, query):
     """
-    Method to SELECT and INSERT the data from the staging tables into the Facts and Dimensions from the schema design
-    
-    :param cur: psycopg2 cursor object
-    :param conn: psycopg2 connection object
-    """
-              
-    print('Selecting and Inserting data from staging tables into facts and dimensions')
-    for k, query in enumerate(insert_table_queries):
-        print(f'Query {k+1} from {len(insert_table_queries)}:\n{query}')
-        cur.execute(query)
+    Method to run and commit one statement on a connection of the pool
+
+    :param pool: psycopg2 ThreadedConnectionPool object
+    :param (str) name: name of the statement
+    :param (str) query: SQL statement
+    :return tuple with the name, start and end time of the statement
+    """
+    conn = pool.getconn()
+    try:
+        start = time.time()
+        with conn.cursor() as cur:
+            cur.execute(query)
         conn.commit()
+        return name, start, time.time()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn)
+
+
+def run_graph(graph, pool, max_connections):
+    """
+    Method to run the statements of a load graph, every statement starts as soon as its dependencies are done
+    and at most `max_connections` statements run at the same time
+
+    :param (dict) graph: statement name to a tuple of the query and the names it depends on
+    :param pool: psycopg2 ThreadedConnectionPool object with at least `max_connections` connections
+    :param (int) max_connections: maximum number of concurrent statements, e.g. the WLM slots of the queue
+    :return dictionary with the start and end time per statement
+    """
+    check_graph(graph)
+    timings, running = {}, {}
+
+    with ThreadPoolExecutor(max_workers=max_connections) as executor:
+        def submit_ready():
+            for name, (query, dependencies) in graph.items():
+                if name not in timings and name not in running.values() and all(d in timings for d in dependencies):
+                    print(f'Starting {name}')
+                    running[executor.submit(run_statement, pool, name, query)] = name
+
+        submit_ready()
+        while running:
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                del running[future]
+                name, start, end = future.result()
+                timings[name] = (start, end)
+                print(f'Finished {name} in {end - start:.1f}s')
+            submit_ready()
+    return timings
+
+
+def critical_path(graph, timings):
+    """
+    Method to get the longest chain of dependent statements by duration
+
+    :param (dict) graph: statement name to a tuple of the query and the names it depends on
+    :param (dict) timings: start and end time per statement as returned by `run_graph`
+    :return tuple with the names on the critical path and its duration in seconds
+    """
+    longest = {}
+
+    def path_to(name):
+        if name not in longest:
+            duration = timings[name][1] - timings[name][0]
+            chains = [path_to(d) for d in graph[name][1]]
+            path, seconds = max(chains, key=lambda chain: chain[1], default=([], 0))
+            longest[name] = (path + [name], seconds + duration)
+        return longest[name]
+
+    return max((path_to(name) for name in graph), key=lambda chain: chain[1])
 
 
 def main():
@@ -38,20 +122,32 @@ def main():
     Method to:
     
     1. Importing the metadata of the staging tables, the fact and dimensions from `sql_queries`
+       (optional) Splitting the song and log data into evenly sized gzip files with a manifest when `[STAGING] PREPARED_DATA` is configured
     2. Copying the song and log data into the staging tables 
     3. Selecting and Inserting the staging tables into the fact and dimensions
+    4. Adding the new song plays to the rollup tables
     
+    Step 2 to 4 run as a graph of dependent statements on a pool of `[ETL] MAX_CONNECTIONS` connections (default 4)
     """
     config = configparser.ConfigParser()
     config.read('dwh.cfg')
 
-    conn = psycopg2.connect("host={} dbname={} user={} password={} port={}".format(*config['CLUSTER'].values()))
-    cur = conn.cursor()
-    
-    load_staging_tables(cur, conn)
-    insert_tables(cur, conn)
+    if config.get('STAGING', 'PREPARED_DATA', fallback=None):
+        prepare_staging(config)
+
+    max_connections = config.getint('ETL', 'MAX_CONNECTIONS', fallback=4)
+    dsn = "host={} dbname={} user={} password={} port={}".format(*config['CLUSTER'].values())
+    pool = ThreadedConnectionPool(1, max_connections, dsn)
+
+    start = time.time()
+    try:
+        timings = run_graph(load_graph, pool, max_connections)
+    finally:
+        pool.closeall()
 
-    conn.close()
+    path, seconds = critical_path(load_graph, timings)
+    print(f"Loaded {len(timings)} statements in {time.time() - start:.1f}s, "
+          f"critical path {' -> '.join(path)} takes {seconds:.1f}s")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,295 @@
+import argparse
+import configparser
+import glob
+import json
+import os
+import re
+import sys
+from datetime import datetime
+import psycopg2
+from sql_queries import analytics, create_table_queries, rollup_table_create_queries
+from etl import load_graph
+
+# A plan regresses when its estimated cost or rows grow by more than this factor
+COST_FACTOR = 1.5
+
+# A join whose estimated rows exceed its largest input by this factor is a row blowup
+BLOWUP_FACTOR = 10
+
+# Redshift join distribution steps that move data between the nodes
+BROADCAST = ('DS_BCAST_INNER', 'DS_DIST_ALL_INNER')
+REDISTRIBUTE = ('DS_DIST_INNER', 'DS_DIST_OUTER', 'DS_DIST_BOTH')
+
+NODE = re.compile(r"^(?P<indent>\s*(?:->\s*)?)(?P<operation>.+?)\s+\(cost=[\d.]+\.\.(?P<cost>[\d.]+) rows=(?P<rows>\d+) "
+                  r"width=\d+\)(?:\s+\(actual time=[\d.]+\.\.(?P<time>[\d.]+) rows=(?P<actual_rows>\d+) loops=\d+\))?")
+
+# Redshift specific SQL replaced to run the plans on a local Postgres stand-in
+POSTGRES_TRANSLATIONS = [
+    (re.compile(r"\bdayofweek\b", re.IGNORECASE), "dow"),
+    (re.compile(r"\bIDENTITY\(\d+,\s*\d+\)", re.IGNORECASE), "GENERATED BY DEFAULT AS IDENTITY"),
+    (re.compile(r"\b(DISTKEY|SORTKEY)\b", re.IGNORECASE), ""),
+    (re.compile(r"\b(DISTSTYLE|ENCODE)\s+\w+", re.IGNORECASE), ""),
+]
+
+
+def to_postgres(sql):
+    """
+    Method to translate the Redshift specific parts of a statement for Postgres
+
+    :param (str) sql: Redshift SQL statement
+    :return Postgres SQL statement
+    """
+    for pattern, replacement in POSTGRES_TRANSLATIONS:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+def get_engine(cur):
+    """
+    Method to check if the connection is a Redshift cluster or a local Postgres stand-in
+
+    :param cur: psycopg2 cursor object
+    :return 'redshift' or 'postgres'
+    """
+    cur.execute("SELECT version()")
+    return 'redshift' if 'redshift' in cur.fetchone()[0].lower() else 'postgres'
+
+
+def plan_queries():
+    """
+    Method to list the load and analytics queries to explain, COPY statements cannot be explained and
+    statements with several queries (the rollup update) are split
+
+    :return list of tuples with the name and the query
+    """
+    queries = []
+    for name, (query, dependencies) in load_graph.items():
+        statements = [s.strip() for s in query.split(';') if s.strip()]
+        if statements[0].upper().startswith('COPY'):
+            continue
+        queries += [(name if len(statements) == 1 else f"{name}.{k + 1}", s) for k, s in enumerate(statements)]
+    queries += [(title, query.strip().rstrip(';')) for title, query in analytics.items()]
+    return queries
+
+
+def parse_plan(lines):
+    """
+    Method to parse the nodes of a text plan (Redshift or Postgres) into a tree
+
+    :param (list) lines: lines of the EXPLAIN output
+    :return root node, a dictionary with the operation, total cost, estimated (and actual) rows and its children
+    """
+    root, stack = None, []
+    for line in lines:
+        match = NODE.match(line)
+        if not match:
+            continue
+        node = {'operation': match.group('operation').strip(), 'cost': float(match.group('cost')),
+                'rows': int(match.group('rows')), 'children': []}
+        if match.group('actual_rows') is not None:
+            node.update({'actual_rows': int(match.group('actual_rows')), 'time_ms': float(match.group('time'))})
+        indent = len(match.group('indent'))
+        while stack and stack[-1][0] >= indent:
+            stack.pop()
+        if stack:
+            stack[-1][1]['children'].append(node)
+        else:
+            root = node
+        stack.append((indent, node))
+    return root
+
+
+def walk(node):
+    yield node
+    for child in node['children']:
+        yield from walk(child)
+
+
+def plan_flags(root):
+    """
+    Method to find the expensive patterns in a plan: nested loops, broadcast and redistribute steps,
+    joins that produce many more rows than their inputs and (with EXPLAIN ANALYZE) misestimated rows
+
+    :param (dict) root: root node as returned by `parse_plan`
+    :return sorted list of flags, e.g. `broadcast: XN Hash Join DS_BCAST_INNER`
+    """
+    flags = set()
+    for node in walk(root):
+        operation = node['operation']
+        if 'Nested Loop' in operation:
+            flags.add(f"nested loop: {operation}")
+        if any(step in operation for step in BROADCAST):
+            flags.add(f"broadcast: {operation}")
+        if any(step in operation for step in REDISTRIBUTE):
+            flags.add(f"redistribute: {operation}")
+        inputs = max((child['rows'] for child in node['children']), default=0)
+        if ('Join' in operation or 'Nested Loop' in operation) and node['rows'] > BLOWUP_FACTOR * max(inputs, 1):
+            flags.add(f"row blowup: {operation}")
+        if 'actual_rows' in node and max(node['actual_rows'], 1) > BLOWUP_FACTOR * max(node['rows'], 1):
+            flags.add(f"misestimate: {operation}")
+    return sorted(flags)
+
+
+def explain(cur, query, engine, analyze=False):
+    """
+    Method to get the plan of a query. EXPLAIN ANALYZE runs the query, so it is only used on Postgres
+    and inside a transaction that is rolled back.
+
+    :param cur: psycopg2 cursor object
+    :param (str) query: SQL query
+    :param (str) engine: 'redshift' or 'postgres'
+    :param (bool) analyze: True to run the query for the actual rows and times
+    :return lines of the plan
+    """
+    if engine == 'postgres':
+        query = to_postgres(query)
+    try:
+        cur.execute(f"EXPLAIN {'ANALYZE ' if analyze and engine == 'postgres' else ''}{query}")
+        return [row[0] for row in cur.fetchall()]
+    finally:
+        cur.connection.rollback()
+
+
+def capture(cur, engine, analyze=False):
+    """
+    Method to capture the plans of all load and analytics queries
+
+    :param cur: psycopg2 cursor object
+    :param (str) engine: 'redshift' or 'postgres'
+    :param (bool) analyze: True to run EXPLAIN ANALYZE (Postgres only)
+    :return dictionary with per query the plan, estimated cost and rows and the flags
+    """
+    plans = {}
+    for name, query in plan_queries():
+        try:
+            lines = explain(cur, query, engine, analyze)
+        except psycopg2.Error as e:
+            plans[name] = {'query': query, 'error': str(e).strip()}
+            continue
+        root = parse_plan(lines)
+        if root is None:
+            print(f"Warning: skipping {name}, no plan nodes in the output of EXPLAIN")
+            continue
+        plans[name] = {'query': query, 'plan': lines, 'cost': root['cost'], 'rows': root['rows'],
+                       'flags': plan_flags(root)}
+        if 'time_ms' in root:
+            plans[name].update({'actual_rows': root['actual_rows'], 'time_ms': root['time_ms']})
+    return plans
+
+
+def compare(previous, current, cost_factor=COST_FACTOR):
+    """
+    Method to find the queries whose plan got worse since the previous run
+
+    :param (dict) previous: plans of the previous run as returned by `capture`
+    :param (dict) current: plans of this run as returned by `capture`
+    :param (float) cost_factor: maximum growth of the estimated cost and rows
+    :return list of tuples with the query name and the regression
+    """
+    regressions = []
+    for name, plan in current.items():
+        before = previous.get(name)
+        if 'error' in plan and before and 'error' not in before:
+            regressions.append((name, f"error: {plan['error']}"))
+        if not before or 'error' in before or 'error' in plan:
+            continue
+        regressions += [(name, f"new {flag}") for flag in plan['flags'] if flag not in before['flags']]
+        if plan['cost'] > cost_factor * max(before['cost'], 1):
+            regressions.append((name, f"cost {before['cost']:.0f} -> {plan['cost']:.0f}"))
+        if plan['rows'] > cost_factor * max(before['rows'], 1):
+            regressions.append((name, f"rows {before['rows']} -> {plan['rows']}"))
+    return regressions
+
+
+def latest_run(directory, engine, analyze=False):
+    """
+    Method to load the latest stored run of an engine in the same mode, a plan of EXPLAIN ANALYZE has flags
+    (misestimates) that a plan of EXPLAIN cannot have
+
+    :param (str) directory: directory with the stored runs
+    :param (str) engine: 'redshift' or 'postgres'
+    :param (bool) analyze: True for the runs with EXPLAIN ANALYZE
+    :return stored run, None if there is none
+    """
+    for path in sorted(glob.glob(os.path.join(directory, f"plans_{engine}_*.json")), reverse=True):
+        with open(path) as f:
+            run = json.load(f)
+        if run.get('analyze', False) == analyze:
+            return run
+    return None
+
+
+def save_run(directory, run):
+    """
+    Method to store a run as `plans_<engine>_<timestamp>.json`
+
+    :param (str) directory: directory with the stored runs
+    :param (dict) run: engine, mode, timestamp (with microseconds) and plans of the run
+    :return path of the stored run
+    """
+    os.makedirs(directory, exist_ok=True)
+    name = f"plans_{run['engine']}_{run['captured_at'].replace(':', '')}"
+    for k in range(1000):
+        path = os.path.join(directory, f"{name}{f'_{k}' if k else ''}.json")
+        try:
+            with open(path, 'x') as f:
+                json.dump(run, f, indent=2)
+            return path
+        except FileExistsError:
+            continue
+    raise FileExistsError(f"Too many runs stored as {name}")
+
+
+def main():
+    """
+    Method to:
+
+    1. Capture the EXPLAIN (or EXPLAIN ANALYZE on Postgres) plans of the load and analytics queries
+    2. Store them with their estimated cost, rows and flags in the plans directory
+    3. Compare them with the previous run of the same engine and mode (with or without ANALYZE) and exit with 1 on a regression
+    """
+    parser = argparse.ArgumentParser(description='Capture the plans of the warehouse queries and detect regressions')
+    parser.add_argument('--analyze', action='store_true', help='run EXPLAIN ANALYZE (Postgres only, rolled back)')
+    parser.add_argument('--directory', default='plans', help='directory to store the plans in')
+    parser.add_argument('--cost-factor', type=float, default=COST_FACTOR, help='allowed growth of cost and rows')
+    parser.add_argument('--create-tables', action='store_true', help='create the missing tables first (local Postgres)')
+    args = parser.parse_args()
+
+    config = configparser.ConfigParser()
+    config.read('dwh.cfg')
+
+    conn = psycopg2.connect("host={} dbname={} user={} password={} port={}".format(*config['CLUSTER'].values()))
+    cur = conn.cursor()
+    engine = get_engine(cur)
+
+    if args.create_tables:
+        for query in create_table_queries + rollup_table_create_queries:
+            query = re.sub(r"CREATE TABLE (?!IF NOT EXISTS)", "CREATE TABLE IF NOT EXISTS ", query)
+            cur.execute(to_postgres(query) if engine == 'postgres' else query)
+        conn.commit()
+
+    run = {'engine': engine, 'analyze': args.analyze and engine == 'postgres',
+           'captured_at': datetime.utcnow().isoformat(timespec='microseconds'),
+           'plans': capture(cur, engine, args.analyze)}
+    conn.close()
+
+    for name, plan in run['plans'].items():
+        if 'error' in plan:
+            print(f"{name}: error {plan['error']}")
+        else:
+            print(f"{name}: cost {plan['cost']:.0f}, rows {plan['rows']}" +
+                  ''.join(f"\n    {flag}" for flag in plan['flags']))
+
+    previous = latest_run(args.directory, engine, run['analyze'])
+    print(f"Stored the plans in {save_run(args.directory, run)}")
+    if previous:
+        regressions = compare(previous['plans'], run['plans'], args.cost_factor)
+        for name, regression in regressions:
+            print(f"REGRESSION {name}: {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions since {previous['captured_at']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import configparser
+import gzip
+import json
+import os
+import boto3
+
+# Number of slices per node for each node type
+SLICES_PER_NODE = {
+    'dc2.large': 2, 'dc2.8xlarge': 16,
+    'ds2.xlarge': 2, 'ds2.8xlarge': 16,
+    'ra3.xlplus': 2, 'ra3.4xlarge': 4, 'ra3.16xlarge': 16
+}
+
+
+class LocalStore:
+    """
+    File system stand-in for S3, paths are relative to a root directory
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def url(self, key):
+        return os.path.join(self.root, key)
+
+    def list(self, prefix):
+        directory = os.path.join(self.root, prefix)
+        files = [os.path.join(root, name) for root, dirs, names in os.walk(directory) for name in names]
+        return sorted((os.path.relpath(f, self.root), os.path.getsize(f)) for f in files)
+
+    def read(self, key):
+        with open(os.path.join(self.root, key), 'rb') as f:
+            return f.read()
+
+    def write(self, key, data):
+        path = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+
+class S3Store:
+    """
+    Bucket in S3
+    """
+
+    def __init__(self, s3, bucket):
+        self.s3 = s3
+        self.bucket = bucket
+
+    def url(self, key):
+        return f"s3://{self.bucket}/{key}"
+
+    def list(self, prefix):
+        paginator = self.s3.get_paginator('list_objects_v2')
+        return sorted((obj['Key'], obj['Size'])
+                      for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix)
+                      for obj in page.get('Contents', []))
+
+    def read(self, key):
+        return self.s3.get_object(Bucket=self.bucket, Key=key)['Body'].read()
+
+    def write(self, key, data):
+        self.s3.put_object(Bucket=self.bucket, Key=key, Body=data)
+
+
+def open_store(location, key=None, secret=None, region=None):
+    """
+    Method to open an S3 location (s3://bucket/prefix) or a local directory
+
+    :param (str) location: S3 url or local path
+    :param (str) key: AWS key
+    :param (str) secret: AWS secret
+    :param (str) region: Region of the bucket
+    :return store object and the prefix within the store
+    """
+    location = location.strip("'\"")
+    if location.startswith('s3://'):
+        bucket, _, prefix = location[len('s3://'):].partition('/')
+        s3 = boto3.client('s3', region_name=region, aws_access_key_id=key, aws_secret_access_key=secret)
+        return S3Store(s3, bucket), prefix
+    return LocalStore(os.path.dirname(location.rstrip('/'))), os.path.basename(location.rstrip('/'))
+
+
+def number_of_files(config):
+    """
+    Method to get the number of files to split the input into: a multiple of the slices of the cluster
+
+    :param config: configparser object of dwh.cfg
+    :return number of files
+    """
+    # Empty values (as in the README template) fall back to the defaults like missing ones
+    num_slices = int(config.get('STAGING', 'NUM_SLICES', fallback='') or 0) or \
+        config.getint('CLUSTER', 'DWH_NUM_NODES') * SLICES_PER_NODE.get(config.get('CLUSTER', 'DWH_NODE_TYPE'), 2)
+    return num_slices * int(config.get('STAGING', 'FILES_PER_SLICE', fallback='') or 1)
+
+
+def read_lines(store, files):
+    """
+    Method to read the JSON records of the input files line by line
+
+    :param store: LocalStore or S3Store object
+    :param (list) files: keys of the input files
+    :return generator of lines ending with a newline
+    """
+    for key, size in files:
+        data = store.read(key)
+        try:
+            # A single (possibly pretty printed) JSON object, like the song files
+            yield json.dumps(json.loads(data)).encode('utf8') + b'\n'
+        except ValueError:
+            for line in data.splitlines():
+                if line.strip():
+                    yield line + b'\n'
+
+
+def split_input(source_store, source_prefix, target_store, target_prefix, num_files):
+    """
+    Method to re-chunk the files under a prefix into `num_files` evenly sized gzip compressed files
+    and to write a COPY manifest for them. The chunks are balanced on the size of the re-serialized
+    records, which can differ a lot from the size of the raw (pretty printed) files.
+
+    :param source_store: store with the raw input
+    :param (str) source_prefix: prefix of the raw input files
+    :param target_store: store to write the prepared files to
+    :param (str) target_prefix: prefix of the prepared files
+    :param (int) num_files: number of files to write
+    :return url of the manifest
+    """
+    files = source_store.list(source_prefix)
+    lines = list(read_lines(source_store, files))
+    total_size = sum(len(line) for line in lines)
+
+    entries, start, written = [], 0, 0
+    for k in range(num_files):
+        end = len(lines) if k == num_files - 1 else start
+        # Every chunk takes at least one record while the remaining chunks can still get one
+        while end < len(lines) - (num_files - k - 1) and (end == start or written < total_size * (k + 1) / num_files):
+            written += len(lines[end])
+            end += 1
+        key = f"{target_prefix}/part-{k:05d}.json.gz"
+        data = gzip.compress(b''.join(lines[start:end]))
+        target_store.write(key, data)
+        entries.append({'url': target_store.url(key), 'mandatory': True, 'meta': {'content_length': len(data)}})
+        start = end
+    assert len(entries) == num_files and start == len(lines)
+
+    manifest_key = f"{target_prefix}.manifest"
+    target_store.write(manifest_key, json.dumps({'entries': entries}, indent=2).encode('utf8'))
+    print(f"Split {len(files)} files from {source_prefix} into {len(entries)} gzip files under {target_prefix}")
+    return target_store.url(manifest_key)
+
+
+def prepare_staging(config):
+    """
+    Method to prepare the song and log data for the COPY into the staging tables
+
+    :param config: configparser object of dwh.cfg
+    :return dictionary with the manifest url per dataset
+    """
+    key, secret = config.get('AWS', 'KEY'), config.get('AWS', 'SECRET')
+    region = config.get('CLUSTER', 'DWH_REGION')
+    target_store, target_prefix = open_store(config.get('STAGING', 'PREPARED_DATA'), key, secret, region)
+    num_files = number_of_files(config)
+
+    manifests = {}
+    for dataset, option in [('log_data', 'LOG_DATA'), ('song_data', 'SONG_DATA')]:
+        source_store, source_prefix = open_store(config.get('S3', option), key, secret, region)
+        manifests[dataset] = split_input(source_store, source_prefix, target_store,
+                                         f"{target_prefix}/{dataset}", num_files)
+    return manifests
+
+
+def main():
+    config = configparser.ConfigParser()
+    config.read('dwh.cfg')
+    print(prepare_staging(config))
+
+
+if __name__ == "__main__":
+    main()
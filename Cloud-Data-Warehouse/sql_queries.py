@@ -12,6 +12,14 @@ LOG_DATA = config.get("S3", "LOG_DATA")
 LOG_JSONPATH = config.get("S3", "LOG_JSONPATH")
 SONG_DATA = config.get("S3", "SONG_DATA")
 
+# Optional: the input re-chunked into evenly sized gzip files by `prepare_staging.py`
+PREPARED_DATA = config.get("STAGING", "PREPARED_DATA", fallback=None)
+if PREPARED_DATA:
+    LOG_SOURCE, SONG_SOURCE = (f"'{PREPARED_DATA}/{dataset}.manifest'" for dataset in ('log_data', 'song_data'))
+    SOURCE_OPTIONS = "manifest gzip"
+else:
+    LOG_SOURCE, SONG_SOURCE, SOURCE_OPTIONS = LOG_DATA, SONG_DATA, ""
+
 # DROP TABLES
 
 staging_events_table_drop = "DROP TABLE IF EXISTS staging_events"
@@ -45,7 +53,7 @@ songplay_table_create = ("""
     CREATE TABLE IF NOT EXISTS songplays (
         songplay_id int IDENTITY(0,1) PRIMARY KEY, start_time timestamp NOT NULL SORTKEY DISTKEY, 
         user_id int NOT NULL, level varchar, song_id varchar, artist_id varchar,
-        session_id int NOT NULL, location varchar,user_agent varchar);
+        session_id int NOT NULL, location varchar,user_agent varchar, load_id bigint DEFAULT 0 NOT NULL);
 """)
 
 user_table_create = ("""
@@ -77,18 +85,18 @@ time_table_create = ("""
 
 # STAGING TABLES
 staging_events_copy = (f"""
-        COPY staging_events FROM {LOG_DATA}
+        COPY staging_events FROM {LOG_SOURCE}
         credentials 'aws_iam_role={ARN}'
-        format as json {LOG_JSONPATH}
+        format as json {LOG_JSONPATH} {SOURCE_OPTIONS}
         timeformat as 'epochmillisecs'
         compupdate off 
         region '{DWH_REGION}';
 """)
 
 staging_songs_copy  = (f"""
-        COPY staging_songs FROM {SONG_DATA}
+        COPY staging_songs FROM {SONG_SOURCE}
         credentials 'aws_iam_role={ARN}'
-        format as JSON 'auto'
+        format as JSON 'auto' {SOURCE_OPTIONS}
         compupdate off 
         region '{DWH_REGION}';
 """)
@@ -96,26 +104,31 @@ staging_songs_copy  = (f"""
 
 
 # FINAL TABLES
+# Inserts every play that is not loaded yet by its natural key (start_time, user_id, session_id), also the later
+# plays of a session that was partly loaded by an earlier load. Every insert numbers its plays with the next
+# load_id, the IDENTITY songplay_id is not increasing across inserts on Redshift.
 songplay_table_insert = ("""
-    INSERT INTO songplays (start_time, user_id, level, song_id, artist_id, session_id, location, user_agent)
-    SELECT DISTINCT(se.ts) as start_time, 
-           se.userId as user_id, se.level as level, ss.song_id as song_id, 
-           ss.artist_id as artist_id, se.sessionId as session_id, 
-           se.location as location, se.userAgent as user_agent
-    FROM staging_events se
-    JOIN staging_songs ss
-        ON (se.song = ss.title AND se.artist = ss.artist_name)
-    WHERE
-        se.page = 'NextSong' AND
-        se.userId NOT IN (
-            SELECT DISTINCT 
-                s.user_id 
-            FROM 
-                songplays s 
-            WHERE 
-                s.user_id = se.userId AND  
-                s.session_id = se.sessionId
-        ) 
+    INSERT INTO songplays (start_time, user_id, level, song_id, artist_id, session_id, location, user_agent, load_id)
+    SELECT c.start_time, c.user_id, c.level, c.song_id, 
+           c.artist_id, c.session_id, c.location, c.user_agent,
+           (SELECT COALESCE(MAX(load_id), 0) + 1 FROM songplays)
+    FROM (
+        SELECT DISTINCT se.ts as start_time, 
+               se.userId as user_id, se.level as level, ss.song_id as song_id, 
+               ss.artist_id as artist_id, se.sessionId as session_id, 
+               se.location as location, se.userAgent as user_agent
+        FROM staging_events se
+        JOIN staging_songs ss
+            ON (se.song = ss.title AND se.artist = ss.artist_name)
+        WHERE
+            se.page = 'NextSong'
+    ) c
+    LEFT JOIN songplays s
+        ON (s.start_time = c.start_time AND 
+            s.user_id = c.user_id AND 
+            s.session_id = c.session_id)
+    WHERE 
+        s.songplay_id IS NULL
 """)
 
 user_table_insert = ("""
@@ -170,6 +183,68 @@ copy_table_queries = [staging_events_copy, staging_songs_copy]
 insert_table_queries = [songplay_table_insert, user_table_insert, song_table_insert, artist_table_insert, time_table_insert]
 
 
+# ROLLUP TABLES
+# Small aggregates of songplays for the dashboards, updated after each fact load from the plays
+# with a load_id above the watermark only
+
+rollups = {
+    'plays_per_hour_level': {
+        'columns': "hour timestamp NOT NULL SORTKEY, level varchar NOT NULL, plays bigint NOT NULL",
+        'keys': {'hour': "DATE_TRUNC('hour', start_time)", 'level': "COALESCE(level, 'unknown')"}
+    },
+    'plays_per_user_day': {
+        'columns': "day date NOT NULL SORTKEY, user_id int NOT NULL, plays bigint NOT NULL",
+        'keys': {'day': "CAST(DATE_TRUNC('day', start_time) AS date)", 'user_id': "user_id"}
+    },
+    'plays_per_song_day': {
+        'columns': "day date NOT NULL SORTKEY, song_id varchar NOT NULL, plays bigint NOT NULL",
+        'keys': {'day': "CAST(DATE_TRUNC('day', start_time) AS date)", 'song_id': "song_id"}
+    }
+}
+
+rollup_watermark_create = ("""
+    CREATE TABLE IF NOT EXISTS rollup_watermark (last_load_id bigint NOT NULL);
+    INSERT INTO rollup_watermark SELECT -1 WHERE NOT EXISTS (SELECT 1 FROM rollup_watermark);
+""")
+
+
+def rollup_merge(table, keys):
+    """
+    Method to get the statements that add the plays above the watermark to a rollup table
+
+    :param (str) table: name of the rollup table
+    :param (dict) keys: key column of the rollup to the expression on songplays
+    :return UPDATE and INSERT statements
+    """
+    delta = f"""
+        SELECT {', '.join(f'{expression} AS {key}' for key, expression in keys.items())}, COUNT(*) AS plays
+        FROM songplays
+        WHERE load_id > (SELECT MAX(last_load_id) FROM rollup_watermark)
+            AND {' AND '.join(f'{expression} IS NOT NULL' for expression in keys.values())}
+        GROUP BY {', '.join(keys.values())}"""
+    on = ' AND '.join(f"r.{key} = d.{key}" for key in keys)
+    return f"""
+        UPDATE {table} r SET plays = r.plays + d.plays
+        FROM ({delta}) d
+        WHERE {on};
+
+        INSERT INTO {table} ({', '.join(keys)}, plays)
+        SELECT d.* FROM ({delta}) d
+        LEFT JOIN {table} r ON ({on})
+        WHERE r.plays IS NULL;
+"""
+
+
+rollup_table_drop_queries = [f"DROP TABLE IF EXISTS {table}" for table in rollups] + ["DROP TABLE IF EXISTS rollup_watermark"]
+rollup_table_create_queries = [f"CREATE TABLE IF NOT EXISTS {table} ({rollup['columns']}) DISTSTYLE ALL;"
+                               for table, rollup in rollups.items()] + [rollup_watermark_create]
+
+# All rollups and the watermark in one statement, so they are committed together
+rollup_table_update = "".join(rollup_merge(table, rollup['keys']) for table, rollup in rollups.items()) + """
+        UPDATE rollup_watermark SET last_load_id = COALESCE((SELECT MAX(load_id) FROM songplays), last_load_id);
+"""
+
+
 # ANALYTICS 
 table_titles = [
     'Staging events',
@@ -178,17 +253,68 @@ table_titles = [
     'Dimension Songs',
     'Dimension Time',
     'Dimension Users',
-    'Fact Song plays'
+    'Fact Song plays',
+    'Rollup plays per hour and level',
+    'Rollup plays per user and day',
+    'Rollup plays per song and day'
 ]
 
-query_on_tables = [
-    'SELECT COUNT(*) FROM staging_events',
-    'SELECT COUNT(*) FROM staging_songs',
-    'SELECT COUNT(*) FROM artists',
-    'SELECT COUNT(*) FROM songs',
-    'SELECT COUNT(*) FROM time',
-    'SELECT COUNT(*) FROM users',
-    'SELECT COUNT(*) FROM songplays'
+table_names = [
+    'staging_events',
+    'staging_songs',
+    'artists',
+    'songs',
+    'time',
+    'users',
+    'songplays',
+    'plays_per_hour_level',
+    'plays_per_user_day',
+    'plays_per_song_day'
 ]
 
-analytics = dict(zip(table_titles, query_on_tables))
\ No newline at end of file
+query_on_tables = [f'SELECT COUNT(*) FROM {table}' for table in table_names]
+
+table_counts = dict(zip(table_titles, query_on_tables))
+
+# Dashboard queries, read from the rollup tables instead of scanning songplays
+rollup_analytics = {
+    'Plays per hour and level (last 48 hours)': """
+        SELECT hour, level, plays
+        FROM plays_per_hour_level
+        WHERE hour >= (SELECT MAX(hour) FROM plays_per_hour_level) - INTERVAL '47 hours'
+        ORDER BY hour, level
+    """,
+    'Most active users per day': """
+        SELECT day, user_id, plays
+        FROM (SELECT day, user_id, plays, ROW_NUMBER() OVER (PARTITION BY day ORDER BY plays DESC, user_id) AS rn
+              FROM plays_per_user_day) t
+        WHERE rn <= 10
+        ORDER BY day, rn
+    """,
+    'Top songs per day': """
+        SELECT t.day, t.song_id, s.title, t.plays
+        FROM (SELECT day, song_id, plays, ROW_NUMBER() OVER (PARTITION BY day ORDER BY plays DESC, song_id) AS rn
+              FROM plays_per_song_day) t
+        LEFT JOIN songs s ON (s.song_id = t.song_id)
+        WHERE t.rn <= 10
+        ORDER BY t.day, t.rn
+    """
+}
+
+analytics = {**table_counts, **rollup_analytics}
+analytics_tables = dict(zip(table_titles, table_names))
+
+# Row counts and sizes (MB) of all tables from the catalog in one query, estimates without scanning the tables
+table_stats_queries = {
+    'redshift': """
+        SELECT "table", tbl_rows, size
+        FROM svv_table_info
+        WHERE "schema" = current_schema() AND "table" IN ({})
+    """,
+    'postgres': """
+        SELECT c.relname, GREATEST(c.reltuples, 0)::bigint, pg_total_relation_size(c.oid) / (1024 * 1024)
+        FROM pg_class c
+        JOIN pg_namespace n ON (n.oid = c.relnamespace)
+        WHERE c.relkind = 'r' AND n.nspname = current_schema() AND c.relname IN ({})
+    """
+}
\ No newline at end of file
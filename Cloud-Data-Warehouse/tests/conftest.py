@@ -0,0 +1,63 @@
+import configparser
+import os
+import re
+import sys
+import tempfile
+import pytest
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+
+def readme_config():
+    """
+    The dwh.cfg template of the README
+    """
+    with open(os.path.join(PROJECT_DIR, 'README.md')) as f:
+        template = re.search(r"```\n(\[CLUSTER\].*?)```", f.read(), re.DOTALL).group(1)
+    config = configparser.ConfigParser()
+    config.read_string(template)
+    return config
+
+
+def pytest_configure(config):
+    # sql_queries reads dwh.cfg from the working directory when it is imported
+    dwh = readme_config()
+    dwh.set('CLUSTER', 'DWH_REGION', 'us-west-2')
+    dwh.set('IAM_ROLE', 'ARN', 'arn:aws:iam::123456789012:role/dwhRole')
+    directory = tempfile.mkdtemp(prefix='dwh-test-')
+    with open(os.path.join(directory, 'dwh.cfg'), 'w') as f:
+        dwh.write(f)
+    os.chdir(directory)
+
+
+@pytest.fixture(scope='session')
+def postgres_dsn(tmp_path_factory):
+    """
+    Local Postgres stand-in for Redshift: `SPARKIFY_TEST_DSN` when set, else a throwaway `pgserver` instance
+    """
+    if os.environ.get('SPARKIFY_TEST_DSN'):
+        yield os.environ['SPARKIFY_TEST_DSN']
+        return
+    pgserver = pytest.importorskip('pgserver')
+    server = pgserver.get_server(str(tmp_path_factory.mktemp('pgdata')), cleanup_mode='stop')
+    yield server.get_uri()
+    server.cleanup()
+
+
+@pytest.fixture
+def cur(postgres_dsn):
+    """
+    Cursor on an empty schema of the Postgres stand-in, dropped after the test
+    """
+    psycopg2 = pytest.importorskip('psycopg2')
+    conn = psycopg2.connect(postgres_dsn)
+    conn.autocommit = True
+    cursor = conn.cursor()
+    schema = f"test_{os.getpid()}_{id(cursor)}"
+    cursor.execute(f"CREATE SCHEMA {schema}; SET search_path TO {schema}")
+    try:
+        yield cursor
+    finally:
+        cursor.execute(f"DROP SCHEMA {schema} CASCADE")
+        conn.close()
@@ -0,0 +1,135 @@
+import datetime
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+from botocore.stub import Stubber, ANY
+from create_redshift_cluster import create_iam_role_and_policy, create_red_shift_cluster, wait_for_cluster, \
+    open_incoming_tcp
+
+ROLE_NAME = 'dwhRole'
+ROLE_ARN = 'arn:aws:iam::123456789012:role/dwhRole'
+CLUSTER = 'dwhCluster'
+# Stubbed responses have no metadata, the `role_exists` waiter matches on the status code
+OK = {'ResponseMetadata': {'HTTPStatusCode': 200}}
+CLUSTER_ARGS = (ROLE_ARN, 'multi-node', 'dc2.large', '4', 'dwh', CLUSTER, 'dwhuser', 'Passw0rd')
+
+
+def client(service):
+    return boto3.client(service, region_name='us-west-2', aws_access_key_id='test', aws_secret_access_key='test')
+
+
+def role():
+    return {'Role': {'Path': '/', 'RoleName': ROLE_NAME, 'RoleId': 'AROAEXAMPLE12345678', 'Arn': ROLE_ARN,
+                     'CreateDate': datetime.datetime(2018, 11, 1)},
+            **OK}
+
+
+def cluster(status, endpoint=True):
+    props = {'ClusterIdentifier': CLUSTER, 'ClusterStatus': status, 'VpcId': 'vpc-1',
+             'IamRoles': [{'IamRoleArn': ROLE_ARN}]}
+    if endpoint:
+        props['Endpoint'] = {'Address': f'{CLUSTER}.example.us-west-2.redshift.amazonaws.com', 'Port': 5439}
+    return {'Clusters': [props]}
+
+
+def role_not_ready():
+    return dict(service_error_code='InvalidParameterValue', service_message=f'Invalid IAM role {ROLE_ARN}.')
+
+
+def test_waits_for_new_role():
+    iam = client('iam')
+    with Stubber(iam) as stub:
+        stub.add_response('create_role', role(), {'Path': '/', 'RoleName': ROLE_NAME, 'Description': ANY,
+                                                  'AssumeRolePolicyDocument': ANY})
+        # The waiter retries until the role is visible
+        stub.add_client_error('get_role', 'NoSuchEntity', http_status_code=404)
+        stub.add_response('get_role', role(), {'RoleName': ROLE_NAME})
+        stub.add_response('attach_role_policy', OK, {'RoleName': ROLE_NAME, 'PolicyArn': ANY})
+        stub.add_response('get_role', role(), {'RoleName': ROLE_NAME})
+        assert create_iam_role_and_policy(iam, ROLE_NAME, waiter_config={'Delay': 0, 'MaxAttempts': 3}) == ROLE_ARN
+        stub.assert_no_pending_responses()
+
+
+def test_retries_cluster_while_role_not_ready():
+    redshift, sleeps = client('redshift'), []
+    with Stubber(redshift) as stub:
+        stub.add_client_error('create_cluster', **role_not_ready())
+        stub.add_client_error('create_cluster', **role_not_ready())
+        stub.add_response('create_cluster', {})
+        create_red_shift_cluster(redshift, *CLUSTER_ARGS, sleep=sleeps.append)
+        stub.assert_no_pending_responses()
+    assert sleeps == [1, 2]
+
+
+def test_other_errors_are_not_retried():
+    redshift, sleeps = client('redshift'), []
+    with Stubber(redshift) as stub:
+        # The message mentions the role, but the error code is not one of a role that is not visible yet
+        stub.add_client_error('create_cluster', 'UnauthorizedOperation', 'Not authorized to pass the role.')
+        with pytest.raises(ClientError):
+            create_red_shift_cluster(redshift, *CLUSTER_ARGS, sleep=sleeps.append)
+    assert sleeps == []
+
+
+def test_gives_up_after_attempts():
+    redshift, sleeps = client('redshift'), []
+    with Stubber(redshift) as stub:
+        for _ in range(3):
+            stub.add_client_error('create_cluster', **role_not_ready())
+        with pytest.raises(ClientError):
+            create_red_shift_cluster(redshift, *CLUSTER_ARGS, attempts=3, sleep=sleeps.append)
+    assert sleeps == [1, 2]
+
+
+def test_existing_cluster():
+    redshift, sleeps = client('redshift'), []
+    with Stubber(redshift) as stub:
+        stub.add_client_error('create_cluster', 'ClusterAlreadyExists')
+        create_red_shift_cluster(redshift, *CLUSTER_ARGS, sleep=sleeps.append)
+        stub.assert_no_pending_responses()
+    assert sleeps == []
+
+
+def test_wait_for_cluster_backoff():
+    redshift, sleeps = client('redshift'), []
+    with Stubber(redshift) as stub:
+        for _ in range(5):
+            stub.add_response('describe_clusters', cluster('creating', endpoint=False), {'ClusterIdentifier': CLUSTER})
+        # Available, but without an endpoint yet
+        stub.add_response('describe_clusters', cluster('available', endpoint=False), {'ClusterIdentifier': CLUSTER})
+        stub.add_response('describe_clusters', cluster('available'), {'ClusterIdentifier': CLUSTER})
+        props = wait_for_cluster(redshift, CLUSTER, sleep=sleeps.append)
+        stub.assert_no_pending_responses()
+    assert sleeps == [5, 10, 20, 30, 30, 30]
+    assert props['Endpoint']['Address'].startswith(CLUSTER)
+
+
+def test_endpoint_as_soon_as_available():
+    redshift, sleeps = client('redshift'), []
+    with Stubber(redshift) as stub:
+        stub.add_response('describe_clusters', cluster('available'), {'ClusterIdentifier': CLUSTER})
+        props = wait_for_cluster(redshift, CLUSTER, sleep=sleeps.append)
+        stub.assert_no_pending_responses()
+    assert sleeps == []
+    assert props['ClusterStatus'] == 'available'
+
+
+def test_wait_for_failed_cluster():
+    redshift = client('redshift')
+    with Stubber(redshift) as stub:
+        stub.add_response('describe_clusters', cluster('incompatible-network', endpoint=False))
+        with pytest.raises(RuntimeError):
+            wait_for_cluster(redshift, CLUSTER, sleep=lambda seconds: None)
+
+
+def test_open_incoming_tcp_in_default_vpc():
+    ec2 = boto3.resource('ec2', region_name='us-west-2', aws_access_key_id='test', aws_secret_access_key='test')
+    with Stubber(ec2.meta.client) as stub:
+        stub.add_response('describe_vpcs', {'Vpcs': [{'VpcId': 'vpc-1'}]})
+        stub.add_response('describe_security_groups',
+                          {'SecurityGroups': [{'GroupId': 'sg-1', 'GroupName': 'default', 'VpcId': 'vpc-1'}]})
+        stub.add_response('authorize_security_group_ingress', {},
+                          {'GroupId': 'sg-1', 'GroupName': 'default', 'CidrIp': '0.0.0.0/0', 'IpProtocol': 'TCP',
+                           'FromPort': 5439, 'ToPort': 5439})
+        assert open_incoming_tcp(ec2, '5439') == 'vpc-1'
+        stub.assert_no_pending_responses()
@@ -0,0 +1,81 @@
+import pandas as pd
+from design_advisor import ALL_THRESHOLD, advise_table, choose_encoding, create_table_ddl, parse_create_table
+from sql_queries import songplay_table_create, staging_events_table_create, user_table_create
+
+
+def estimates(columns, num_rows, **distinct):
+    """
+    Estimates with `num_rows` distinct values for every column that is not given
+    """
+    return pd.DataFrame([(c, distinct.get(c, num_rows), 8.0) for c in columns],
+                        columns=['column', 'distinct', 'avg_width']).set_index('column')
+
+
+def test_parse_create_table():
+    table, columns, distkey, sortkey = parse_create_table(songplay_table_create)
+    assert table == 'songplays'
+    assert list(columns) == ['songplay_id', 'start_time', 'user_id', 'level', 'song_id', 'artist_id', 'session_id',
+                             'location', 'user_agent', 'load_id']
+    # The comma inside IDENTITY(0,1) does not split the definition
+    assert columns['songplay_id'] == 'songplay_id int IDENTITY(0,1) PRIMARY KEY'
+    assert columns['start_time'] == 'start_time timestamp NOT NULL'
+    assert (distkey, sortkey) == ('start_time', 'start_time')
+
+
+def test_parse_create_table_without_keys():
+    table, columns, distkey, sortkey = parse_create_table(staging_events_table_create)
+    assert table == 'staging_events'
+    assert len(columns) == 18 and columns['userId'] == 'userId int'
+    assert (distkey, sortkey) == (None, None)
+
+
+def test_choose_encoding():
+    assert choose_encoding('user_id int NOT NULL', 10, False) == 'az64'
+    assert choose_encoding('start_time timestamp NOT NULL', 10 ** 6, False) == 'az64'
+    assert choose_encoding('level varchar', 2, False) == 'bytedict'
+    assert choose_encoding('title varchar NOT NULL', 10 ** 5, False) == 'zstd'
+    assert choose_encoding('start_time timestamp NOT NULL', 10 ** 6, True) == 'raw'
+
+
+def test_small_dimension_is_copied_to_every_node():
+    table, columns, distkey, sortkey = parse_create_table(user_table_create)
+    design = advise_table(table, columns, ALL_THRESHOLD - 1, estimates(columns, ALL_THRESHOLD - 1, level=2))
+    assert (design['diststyle'], design['distkey']) == ('ALL', None)
+    assert design['sortkey'] == 'user_id'
+    assert design['encodings'] == {'user_id': 'raw', 'first_name': 'zstd', 'last_name': 'zstd', 'gender': 'zstd',
+                                   'level': 'bytedict'}
+
+    design = advise_table(table, columns, ALL_THRESHOLD, estimates(columns, ALL_THRESHOLD))
+    assert (design['diststyle'], design['distkey']) == ('KEY', 'user_id')
+
+
+def test_small_staging_table_is_not_copied_to_every_node():
+    table, columns, distkey, sortkey = parse_create_table(staging_events_table_create)
+    design = advise_table(table, columns, 1000, estimates(columns, 1000, song=500))
+    assert (design['diststyle'], design['distkey']) == ('KEY', 'song')
+    assert design['sortkey'] == 'ts'
+
+
+def test_large_fact_is_distributed_on_the_most_selective_join_column():
+    table, columns, distkey, sortkey = parse_create_table(songplay_table_create)
+    num_rows = 10 * ALL_THRESHOLD
+    design = advise_table(table, columns, num_rows, estimates(columns, num_rows, user_id=10 ** 4, song_id=10 ** 6,
+                                                              artist_id=10 ** 5, start_time=5 * 10 ** 5))
+    assert (design['diststyle'], design['distkey']) == ('KEY', 'song_id')
+    assert design['sortkey'] == 'start_time'
+    assert design['encodings']['start_time'] == 'raw'
+
+    # Even the most selective join column would skew the slices
+    design = advise_table(table, columns, num_rows, estimates(columns, num_rows, user_id=10, song_id=10 ** 4,
+                                                              artist_id=10 ** 3, start_time=10 ** 3))
+    assert (design['diststyle'], design['distkey']) == ('EVEN', None)
+
+
+def test_create_table_ddl():
+    table, columns, distkey, sortkey = parse_create_table(user_table_create)
+    design = advise_table(table, columns, 100, estimates(columns, 100))
+    ddl = create_table_ddl(table, columns, design)
+    # The encoding goes before the column constraints
+    assert "user_id int ENCODE raw PRIMARY KEY" in ddl
+    assert "first_name varchar ENCODE bytedict NOT NULL" in ddl
+    assert ddl.endswith("DISTSTYLE ALL\nSORTKEY (user_id);")
@@ -0,0 +1,16 @@
+import pytest
+from etl import load_graph, check_graph
+from sql_queries import copy_table_queries, insert_table_queries, rollup_table_update
+
+
+def test_load_graph_runs_every_load_statement_once():
+    queries = [query for query, dependencies in load_graph.values()]
+    assert sorted(queries) == sorted(copy_table_queries + insert_table_queries + [rollup_table_update])
+    check_graph(load_graph)
+
+
+def test_check_graph_rejects_unknown_and_circular_dependencies():
+    with pytest.raises(ValueError, match='unknown'):
+        check_graph({'a': ('SELECT 1', ['b'])})
+    with pytest.raises(ValueError, match='circular'):
+        check_graph({'a': ('SELECT 1', ['b']), 'b': ('SELECT 2', ['a'])})
@@ -0,0 +1,46 @@
+from types import SimpleNamespace
+from explain_plans import capture, compare, latest_run, plan_queries, save_run
+
+
+def plans(flags):
+    return {'songplays': {'query': 'SELECT 1', 'plan': [], 'cost': 10.0, 'rows': 5, 'flags': flags}}
+
+
+def test_runs_are_compared_within_the_same_mode(tmp_path):
+    plain = {'engine': 'postgres', 'analyze': False, 'captured_at': '2026-10-19T10:00:00.000001', 'plans': plans([])}
+    analyzed = {'engine': 'postgres', 'analyze': True, 'captured_at': '2026-10-19T10:00:00.000002',
+                'plans': plans(['misestimate: Seq Scan on songplays'])}
+    save_run(str(tmp_path), plain)
+    save_run(str(tmp_path), analyzed)
+
+    assert latest_run(str(tmp_path), 'postgres', analyze=False) == plain
+    assert latest_run(str(tmp_path), 'postgres', analyze=True) == analyzed
+    assert latest_run(str(tmp_path), 'redshift') is None
+    assert compare(latest_run(str(tmp_path), 'postgres', analyze=True)['plans'], analyzed['plans']) == []
+    # Against the plan-only run the ANALYZE flag would be a regression
+    assert compare(plain['plans'], analyzed['plans']) == [('songplays', 'new misestimate: Seq Scan on songplays')]
+
+
+def test_runs_captured_at_the_same_time_are_both_stored(tmp_path):
+    run = {'engine': 'postgres', 'analyze': False, 'captured_at': '2026-10-19T10:00:00.000001', 'plans': plans([])}
+    first, second = save_run(str(tmp_path), run), save_run(str(tmp_path), dict(run, plans=plans(['nested loop: x'])))
+    assert first != second
+    assert latest_run(str(tmp_path), 'postgres')['plans'] == plans(['nested loop: x'])
+
+
+class EmptyExplainCursor:
+    """
+    Cursor whose EXPLAIN returns no plan lines
+    """
+    connection = SimpleNamespace(rollback=lambda: None)
+
+    def execute(self, query):
+        pass
+
+    def fetchall(self):
+        return []
+
+
+def test_statements_without_a_plan_are_skipped(capsys):
+    assert capture(EmptyExplainCursor(), 'redshift') == {}
+    assert capsys.readouterr().out.count('Warning: skipping') == len(list(plan_queries()))
@@ -0,0 +1,63 @@
+import gzip
+import json
+import os
+import pytest
+from conftest import readme_config
+from prepare_staging import LocalStore, number_of_files, split_input
+
+
+def test_number_of_files_with_readme_template():
+    config = readme_config()
+    assert config.get('STAGING', 'NUM_SLICES') == ''
+    assert number_of_files(config) == 4 * 2
+
+
+def test_number_of_files_with_empty_and_set_values():
+    config = readme_config()
+    config.set('STAGING', 'FILES_PER_SLICE', '')
+    assert number_of_files(config) == 8
+    config.set('STAGING', 'NUM_SLICES', '6')
+    config.set('STAGING', 'FILES_PER_SLICE', '3')
+    assert number_of_files(config) == 18
+    config.remove_section('STAGING')
+    assert number_of_files(config) == 8
+
+
+def song(k):
+    return {'num_songs': 1, 'artist_id': f'AR{k:04d}', 'artist_latitude': None, 'artist_longitude': None,
+            'artist_location': '', 'artist_name': f'Artist {k}', 'song_id': f'SO{k:04d}', 'title': f'Song {k}',
+            'duration': 200.0 + k, 'year': 2000}
+
+
+def read_split(store, manifest_url):
+    with open(manifest_url) as f:
+        entries = json.load(f)['entries']
+    sizes = [os.path.getsize(entry['url']) for entry in entries]
+    assert sizes == [entry['meta']['content_length'] for entry in entries]
+    return [[json.loads(line) for line in gzip.decompress(store.read(os.path.relpath(entry['url'], store.root)))
+             .splitlines()] for entry in entries]
+
+
+@pytest.mark.parametrize('num_files', [1, 3, 8])
+def test_split_pretty_printed_files(tmp_path, num_files):
+    # Pretty printed song files are several times larger than their re-serialized records
+    source = LocalStore(str(tmp_path / 'input'))
+    for k in range(10):
+        source.write(f'song_data/A/song{k}.json', json.dumps(song(k), indent=8).encode('utf8') + b'\n' * 200)
+    target = LocalStore(str(tmp_path / 'output'))
+
+    chunks = read_split(target, split_input(source, 'song_data', target, 'prepared/song_data', num_files))
+    assert len(chunks) == num_files
+    assert all(chunks)
+    assert [record for chunk in chunks for record in chunk] == [song(k) for k in range(10)]
+    assert max(map(len, chunks)) - min(map(len, chunks)) <= 1
+
+
+def test_split_fewer_records_than_files(tmp_path):
+    source = LocalStore(str(tmp_path / 'input'))
+    source.write('log_data/events.json', b''.join(json.dumps(song(k)).encode('utf8') + b'\n' for k in range(3)))
+    target = LocalStore(str(tmp_path / 'output'))
+
+    chunks = read_split(target, split_input(source, 'log_data', target, 'prepared/log_data', 8))
+    assert len(chunks) == 8
+    assert [record for chunk in chunks for record in chunk] == [song(k) for k in range(3)]
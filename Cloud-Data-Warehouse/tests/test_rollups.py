@@ -0,0 +1,53 @@
+from explain_plans import to_postgres
+from sql_queries import songplay_table_insert, rollups, rollup_table_create_queries, rollup_table_update
+from test_songplay_insert import FIRST_LOAD, LATER_PLAYS, create_tables, stage_events
+
+
+def rollup_rows(cur, table):
+    keys = ', '.join(rollups[table]['keys'])
+    cur.execute(f"SELECT {keys}, plays FROM {table} ORDER BY {keys}")
+    return cur.fetchall()
+
+
+def full_aggregate(cur, table):
+    # The rollup computed from all of songplays
+    keys = rollups[table]['keys']
+    cur.execute(f"""
+        SELECT {', '.join(f'{expression} AS {key}' for key, expression in keys.items())}, COUNT(*) AS plays
+        FROM songplays
+        GROUP BY {', '.join(keys.values())}
+        ORDER BY {', '.join(keys)}""")
+    return cur.fetchall()
+
+
+def test_rollups_match_songplays_after_every_load(cur):
+    create_tables(cur)
+    for query in rollup_table_create_queries:
+        cur.execute(to_postgres(query))
+
+    for plays in [FIRST_LOAD, FIRST_LOAD + LATER_PLAYS, FIRST_LOAD + LATER_PLAYS]:
+        stage_events(cur, plays)
+        cur.execute(songplay_table_insert)
+        cur.execute(rollup_table_update)
+        for table in rollups:
+            assert rollup_rows(cur, table) == full_aggregate(cur, table)
+
+
+def test_plays_with_a_lower_songplay_id_are_rolled_up(cur):
+    # Redshift allocates IDENTITY values per slice, a later insert can get songplay_ids below the earlier ones
+    create_tables(cur)
+    for query in rollup_table_create_queries:
+        cur.execute(to_postgres(query))
+
+    stage_events(cur, FIRST_LOAD)
+    cur.execute(songplay_table_insert)
+    cur.execute(rollup_table_update)
+    cur.execute("UPDATE songplays SET songplay_id = songplay_id + 1000")
+
+    stage_events(cur, FIRST_LOAD + LATER_PLAYS)
+    cur.execute(songplay_table_insert)
+    cur.execute("SELECT MAX(songplay_id) < 1000, COUNT(DISTINCT load_id) FROM songplays WHERE load_id = 2")
+    assert cur.fetchone() == (True, 1)
+    cur.execute(rollup_table_update)
+    for table in rollups:
+        assert rollup_rows(cur, table) == full_aggregate(cur, table)
@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta
+import pytest
+from explain_plans import to_postgres
+from sql_queries import staging_events_table_create, staging_songs_table_create, songplay_table_create, \
+    songplay_table_insert
+
+# The songplay insert before the anti-join rewrite: a correlated NOT IN that skips every play of a
+# (user_id, session_id) that already has a play in songplays
+NOT_IN_INSERT = """
+    INSERT INTO songplays (start_time, user_id, level, song_id, artist_id, session_id, location, user_agent)
+    SELECT DISTINCT(se.ts) as start_time,
+           se.userId as user_id, se.level as level, ss.song_id as song_id,
+           ss.artist_id as artist_id, se.sessionId as session_id,
+           se.location as location, se.userAgent as user_agent
+    FROM staging_events se
+    JOIN staging_songs ss
+        ON (se.song = ss.title AND se.artist = ss.artist_name)
+    WHERE
+        se.page = 'NextSong' AND
+        se.userId NOT IN (
+            SELECT DISTINCT
+                s.user_id
+            FROM
+                songplays s
+            WHERE
+                s.user_id = se.userId AND
+                s.session_id = se.sessionId
+        )
+"""
+
+START = datetime(2018, 11, 1)
+
+
+def create_tables(cur):
+    for query in [staging_events_table_create, staging_songs_table_create, songplay_table_create]:
+        cur.execute(to_postgres(query))
+    cur.execute("INSERT INTO staging_songs (song_id, title, artist_id, artist_name, duration) VALUES "
+                "('SO1', 'Song 1', 'AR1', 'Artist 1', 200), ('SO2', 'Song 2', 'AR2', 'Artist 2', 180)")
+
+
+def stage_events(cur, plays):
+    """
+    Replace the staging events by NextSong events (and one Home page event per play that is not a song play)
+
+    :param cur: psycopg2 cursor object
+    :param (list) plays: tuples with the user, session and minute after START of every play
+    """
+    cur.execute("TRUNCATE staging_events")
+    for user, session, minute in plays:
+        ts = START + timedelta(minutes=minute)
+        cur.execute("INSERT INTO staging_events (artist, song, page, ts, userId, sessionId, level, location, userAgent) "
+                    "VALUES (%s, %s, 'NextSong', %s, %s, %s, 'free', 'Utrecht', 'Mozilla'), "
+                    "(NULL, NULL, 'Home', %s, %s, %s, 'free', 'Utrecht', 'Mozilla')",
+                    (f"Artist {1 + minute % 2}", f"Song {1 + minute % 2}", ts, user, session, ts, user, session))
+
+
+def load(cur, query, batches):
+    """
+    Run the songplay insert once per batch of plays
+
+    :return list with the number of rows in songplays after every load
+    """
+    counts = []
+    for plays in batches:
+        stage_events(cur, plays)
+        cur.execute(query)
+        cur.execute("SELECT COUNT(*) FROM songplays")
+        counts.append(cur.fetchone()[0])
+    return counts
+
+
+def songplays(cur):
+    cur.execute("SELECT start_time, user_id, level, song_id, artist_id, session_id, location, user_agent "
+                "FROM songplays ORDER BY start_time, user_id, session_id")
+    return cur.fetchall()
+
+
+FIRST_LOAD = [(user, session, 10 * user + minute) for user in (1, 2) for session in (100, 200) for minute in range(5)]
+# Five later plays of every session of the first load
+LATER_PLAYS = [(user, session, 10 * user + minute) for user in (1, 2) for session in (100, 200) for minute in range(5, 10)]
+
+
+@pytest.mark.parametrize('batches', [[FIRST_LOAD], [FIRST_LOAD, FIRST_LOAD, FIRST_LOAD]])
+def test_same_result_as_not_in_for_fresh_and_repeated_loads(cur, batches):
+    create_tables(cur)
+    expected_counts = load(cur, NOT_IN_INSERT, batches)
+    expected = songplays(cur)
+    cur.execute("TRUNCATE songplays")
+
+    assert load(cur, songplay_table_insert, batches) == expected_counts == [len(FIRST_LOAD)] * len(batches)
+    assert songplays(cur) == expected
+
+
+def test_new_plays_of_a_loaded_session_are_inserted(cur):
+    # The NOT IN skipped the later plays of a session that was loaded before, the anti-join on
+    # (start_time, user_id, session_id) inserts every play that is not loaded yet
+    create_tables(cur)
+    batches = [FIRST_LOAD, FIRST_LOAD + LATER_PLAYS, FIRST_LOAD + LATER_PLAYS]
+    assert load(cur, NOT_IN_INSERT, batches) == [20, 20, 20]
+    cur.execute("TRUNCATE songplays")
+    assert load(cur, songplay_table_insert, batches) == [20, 40, 40]
@@ -0,0 +1,88 @@
+"""
+Compares filtering a month of I94 records on the valid U.S. ports with a collected `isin()` list against a
+broadcast semi-join on local Spark. Without the immigration data a month of synthetic records is generated.
+
+    python benchmark_semi_join.py --labels I94_SAS_Labels_Descriptions.SAS --rows 3000000
+"""
+import argparse
+import time
+import pyspark.sql.functions as F
+from pyspark.sql import SparkSession
+from sas_labels import load_catalog
+from lookups import port_lookups, semi_join
+
+
+def synthetic_month(spark, ports, rows):
+    """
+    Method to generate a month of I94 records with a port drawn from all ports of the label file
+
+    :param spark: Spark session
+    :param (list) ports: all port ids of the label file
+    :param (int) rows: number of records
+    :return Spark DataFrame with `im_id`, `port_id` and `arrdate`
+    """
+    port_array = F.array(*[F.lit(port) for port in ports])
+    return spark.range(rows)\
+        .select(F.col('id').alias('im_id'),
+                port_array[(F.col('id') * 7919 % len(ports)).cast('int')].alias('port_id'),
+                (F.lit(20545) + F.col('id') % 30).alias('arrdate'))
+
+
+def measure(build, rounds):
+    """
+    Method to time the planning and the execution of a query. The executed plan of a DataFrame is computed once,
+    so every round builds a new DataFrame and its build time (e.g. collecting the `isin()` list) counts as planning.
+
+    :param build: function that returns a new Spark DataFrame of the query
+    :param (int) rounds: number of executions, the fastest one is reported
+    :return tuple with the planning and execution time in seconds and the number of rows
+    """
+    planning, execution = [], []
+    for _ in range(rounds):
+        start = time.time()
+        df = build()
+        df._jdf.queryExecution().executedPlan()
+        planning.append(time.time() - start)
+        start = time.time()
+        rows = df.count()
+        execution.append(time.time() - start)
+    return min(planning), min(execution), rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare isin() filters with broadcast semi-joins on local Spark')
+    parser.add_argument('--labels', default='I94_SAS_Labels_Descriptions.SAS', help='SAS label descriptions')
+    parser.add_argument('--immigration', help='sas7bdat file with a month of I94 data, synthetic data when omitted')
+    parser.add_argument('--rows', type=int, default=3000000, help='rows of the synthetic month')
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    spark = SparkSession.builder.master('local[*]')\
+        .config("spark.jars.packages", "saurfang:spark-sas7bdat:2.0.0-s_2.11").getOrCreate()
+    catalog = load_catalog(args.labels)
+    valid_ports, valid_cities = port_lookups(spark, catalog)
+
+    if args.immigration:
+        fact_im = spark.read.format('com.github.saurfang.sas.spark').load(args.immigration)\
+            .select(F.col('cicid').alias('im_id'), F.col('i94port').alias('port_id'), 'arrdate')
+    else:
+        fact_im = synthetic_month(spark, sorted(catalog.ports), args.rows)
+    fact_im = fact_im.cache()
+    fact_im.count()
+
+    def isin_filter():
+        port_list = [row[0] for row in valid_ports.collect()]
+        return fact_im.filter(F.col('port_id').isin(port_list))
+
+    variants = [('isin() list', isin_filter),
+                ('broadcast semi-join', lambda: semi_join(fact_im, valid_ports, 'port_id'))]
+
+    print(f"{valid_ports.count()} valid ports")
+    print(f"{'filter':<20} {'planning':>9} {'execution':>10} {'rows':>10}")
+    for name, build in variants:
+        planning, execution, rows = measure(build, args.rounds)
+        print(f"{name:<20} {planning:>8.3f}s {execution:>9.3f}s {rows:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+import glob
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+import pyspark.sql.functions as F
+from lookups import semi_join
+
+MONTHS = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+
+# Column of the I94 data, column of the fact and its type, `sas_date` are days since 1960-01-01
+FACT_COLUMNS = [
+    ('cicid', 'im_id', 'integer'),
+    ('i94port', 'port_id', 'string'),
+    ('i94visa', 'visa_id', 'integer'),
+    ('i94addr', 'state_id', 'string'),
+    ('i94mode', 'mode_id', 'integer'),
+    ('i94cit', 'country_id_cit', 'integer'),
+    ('i94res', 'country_id_res', 'integer'),
+    ('i94yr', 'im_yr', 'integer'),
+    ('i94mon', 'im_mon', 'integer'),
+    ('i94bir', 'bir_yr', 'integer'),
+    ('gender', 'gender', 'string'),
+    ('depdate', 'depdate', 'sas_date'),
+    ('arrdate', 'arrdate', 'sas_date')
+]
+
+# `cicid` is a record number within a monthly file, so a record is only unique within its year and month
+FACT_KEY = ['im_yr', 'im_mon', 'im_id']
+
+SAS_FILE = re.compile(r"i94_(?P<month>[a-z]{3})(?P<year>\d{2})_sub\.sas7bdat$")
+
+
+def discover_months(directory, year=16):
+    """
+    Method to find the monthly I94 SAS files of a year, e.g. `i94_apr16_sub.sas7bdat`
+
+    :param (str) directory: directory with the SAS files
+    :param (int) year: last two digits of the year
+    :return list of tuples with the month name and the path, in calendar order
+    """
+    months = []
+    for path in glob.glob(os.path.join(directory, f"i94_*{year:02d}_sub.sas7bdat")):
+        match = SAS_FILE.search(os.path.basename(path))
+        if match and match.group('month') in MONTHS:
+            months.append((match.group('month'), path))
+    return sorted(months, key=lambda month: MONTHS.index(month[0]))
+
+
+def convert_month(spark, sas_path, parquet_path):
+    """
+    Method to convert a monthly SAS file once to parquet, the conversion is skipped while the parquet output is
+    newer than the SAS file
+
+    :param spark: Spark session
+    :param (str) sas_path: path to the SAS file
+    :param (str) parquet_path: directory of the parquet output
+    :return tuple with parquet_path and True if the month was (re)converted
+    """
+    success = os.path.join(parquet_path, '_SUCCESS')
+    if os.path.exists(success) and os.path.getmtime(success) >= os.path.getmtime(sas_path):
+        return parquet_path, False
+    spark.read.format('com.github.saurfang.sas.spark').load(sas_path)\
+        .write.parquet(parquet_path, mode='overwrite')
+    return parquet_path, True
+
+
+def convert_months(spark, months, cache_dir, max_workers=4):
+    """
+    Method to convert the monthly SAS files to parquet in parallel, every month is a separate Spark job
+    submitted from its own thread on the same Spark session
+
+    :param spark: Spark session
+    :param (list) months: tuples with the month name and the path as returned by `discover_months`
+    :param (str) cache_dir: directory of the parquet output, one subdirectory per SAS file
+    :param (int) max_workers: maximum number of months converted at the same time
+    :return list of tuples with the parquet directory and True if the month was (re)converted, in the order of
+    `months`
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(convert_month, spark, sas_path,
+                                   os.path.join(cache_dir, os.path.basename(sas_path).split('.')[0]))
+                   for month, sas_path in months]
+        return [future.result() for future in futures]
+
+
+def fact_partition(output_path, month, year=16):
+    """
+    Method to get the directory of the partition of a month in the immigration fact
+
+    :param (str) output_path: directory of the fact
+    :param (str) month: month name, e.g. 'apr'
+    :param (int) year: last two digits of the year
+    :return directory of the partition
+    """
+    return os.path.join(output_path, f"im_yr={2000 + year}", f"im_mon={MONTHS.index(month) + 1}")
+
+
+def pending_months(months, converted, output_path, year=16):
+    """
+    Method to select the months to transform and write: the months that were just (re)converted and the months
+    that are missing in the fact, so adding or refreshing one month only reads and writes that month
+
+    :param (list) months: tuples with the month name and the path as returned by `discover_months`
+    :param (list) converted: tuples with the parquet directory and the conversion flag as returned by `convert_months`
+    :param (str) output_path: directory of the fact
+    :param (int) year: last two digits of the year
+    :return list of parquet directories of the pending months
+    """
+    return [parquet_path for (month, sas_path), (parquet_path, changed) in zip(months, converted)
+            if changed or not os.path.isdir(fact_partition(output_path, month, year))]
+
+
+def sas_date(column):
+    """
+    Method to convert a SAS date (days since 1960-01-01) to a date with a Spark expression instead of a UDF
+
+    :param (str) column: column with the SAS date
+    :return Spark Column with the date, NULL for a missing or zero SAS date like before
+    """
+    return F.when(F.col(column) != 0, F.expr(f"date_add(DATE '1960-01-01', CAST({column} AS INT))"))
+
+
+def transform_fact(df, valid_ports):
+    """
+    Method to transform the I94 data into the immigration fact with one projection: the selection, renaming
+    and casting of the columns and the conversion of the SAS dates. Duplicates are dropped on `FACT_KEY`, the record
+    number `im_id` is only unique within a month.
+
+    :param df: Spark DataFrame of the I94 data
+    :param valid_ports: Spark DataFrame with the valid `port_id`s
+    :return Spark DataFrame of the fact
+    """
+    projection = [(sas_date(source) if data_type == 'sas_date' else F.col(source).cast(data_type)).alias(column)
+                  for source, column, data_type in FACT_COLUMNS]
+    return semi_join(df.select(*projection), valid_ports, 'port_id').dropDuplicates(FACT_KEY)
+
+
+def write_fact(spark, fact_im, output_path):
+    """
+    Method to write the immigration fact partitioned by year and month. Only the partitions of the months in
+    `fact_im` are overwritten, the other months in the output are kept.
+
+    :param spark: Spark session
+    :param fact_im: Spark DataFrame of the fact
+    :param (str) output_path: directory of the fact
+    """
+    spark.conf.set("spark.sql.sources.partitionOverwriteMode", "dynamic")
+    fact_im.write.partitionBy('im_yr', 'im_mon').parquet(output_path, mode='overwrite')
@@ -0,0 +1,29 @@
+import pyspark.sql.functions as F
+from sas_labels import us_port_cities
+
+
+def port_lookups(spark, catalog):
+    """
+    Method to create the small lookup tables of the valid U.S. ports and cities from the label catalog
+
+    :param spark: Spark session
+    :param (LabelCatalog) catalog: label catalog
+    :return tuple with a DataFrame of the valid `port_id`s and a DataFrame of the valid `City`s
+    """
+    valid_ports_cities = spark.createDataFrame(us_port_cities(catalog), "port_id STRING, City STRING")
+    valid_ports = valid_ports_cities.select('port_id').distinct().cache()
+    valid_cities = valid_ports_cities.select('City').distinct().cache()
+    return valid_ports, valid_cities
+
+
+def semi_join(df, lookup, column):
+    """
+    Method to keep the rows of a DataFrame whose value of `column` is in a small lookup table. The lookup is
+    broadcast to every executor, so the filter is a hash lookup instead of a predicate with a literal per value.
+
+    :param df: Spark DataFrame
+    :param lookup: small Spark DataFrame with the valid values in `column`
+    :param (str) column: column to filter on
+    :return filtered Spark DataFrame with the columns of `df`
+    """
+    return df.join(F.broadcast(lookup), on=column, how='left_semi')
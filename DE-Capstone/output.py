@@ -0,0 +1,31 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def write_table(df, path):
+    """
+    Method to write a small table as a single parquet file
+
+    :param df: Spark DataFrame of the table
+    :param (str) path: directory of the table
+    :return write time in seconds
+    """
+    start = time.time()
+    df.coalesce(1).write.parquet(path, mode='overwrite')
+    return time.time() - start
+
+
+def write_dimensions(dimensions, output_dir, max_workers=None):
+    """
+    Method to write the dimensions concurrently, every dimension is a separate Spark job submitted from its own
+    thread on the same Spark session
+
+    :param (dict) dimensions: table name to the Spark DataFrame of the dimension
+    :param (str) output_dir: directory with a subdirectory per table
+    :param (int) max_workers: maximum number of tables written at the same time, defaults to all of them
+    :return dictionary with the write time in seconds per table
+    """
+    with ThreadPoolExecutor(max_workers=max_workers or len(dimensions)) as executor:
+        futures = {table: executor.submit(write_table, df, f"{output_dir}/{table}/")
+                   for table, df in dimensions.items()}
+        return {table: future.result() for table, future in futures.items()}
@@ -0,0 +1,99 @@
+from functools import reduce
+from operator import or_
+import pyspark.sql.functions as F
+
+# Minimum ratio of the foreign keys of a fact found in their dimension, lower it explicitly for known gaps
+MIN_COVERAGE = 0.99
+
+
+def profile_table(df, key=None, foreign_keys=None, cache=True):
+    """
+    Method to profile a table in one aggregate job: row count, NULL ratio per column, uniqueness of the key and
+    the coverage of the foreign keys by their dimension. The (small) dimensions are broadcast to the job.
+
+    :param df: Spark DataFrame of the table
+    :param key: key column of the table, or a list of columns for a composite key
+    :param (dict) foreign_keys: foreign key column to a tuple of the dimension DataFrame and its key column
+    :param (bool) cache: True to cache the table, so the profile and later writes do not recompute it
+    :return dictionary with the profile of the table
+    """
+    foreign_keys = foreign_keys or {}
+    if cache:
+        df = df.cache()
+    columns = df.columns
+    key_columns = [key] if isinstance(key, str) else list(key or [])
+
+    profiled = df
+    for k, (column, (dim, dim_key)) in enumerate(foreign_keys.items()):
+        keys = dim.select(F.col(dim_key).alias(f"_fk{k}")).distinct()
+        profiled = profiled.join(F.broadcast(keys), profiled[column] == F.col(f"_fk{k}"), 'left')
+
+    aggregates = [F.count(F.lit(1)).alias('rows')]
+    aggregates += [F.sum(F.col(c).isNull().cast('long')).alias(f"null{k}") for k, c in enumerate(columns)]
+    if key_columns:
+        # COUNT(DISTINCT) skips the keys with a NULL in any of their columns
+        aggregates += [F.countDistinct(*[F.col(c) for c in key_columns]).alias('distinct_keys'),
+                       F.sum(reduce(or_, [F.col(c).isNull() for c in key_columns]).cast('long')).alias('null_keys')]
+    for k, column in enumerate(foreign_keys):
+        aggregates += [F.sum(F.col(column).isNotNull().cast('long')).alias(f"fk{k}"),
+                       F.sum(F.col(f"_fk{k}").isNotNull().cast('long')).alias(f"matched{k}")]
+    result = profiled.agg(*aggregates).first().asDict()
+
+    rows = result['rows']
+    profile = {
+        'rows': rows,
+        'null_ratio': {c: round((result[f"null{k}"] or 0) / rows, 4) if rows else 0.0 for k, c in enumerate(columns)}
+    }
+    if key_columns:
+        profile.update({'key': ', '.join(key_columns),
+                        'duplicate_keys': rows - result['distinct_keys'] - (result['null_keys'] or 0)})
+    profile['foreign_key_coverage'] = {
+        column: round((result[f"matched{k}"] or 0) / result[f"fk{k}"], 4) if result[f"fk{k}"] else 1.0
+        for k, column in enumerate(foreign_keys)
+    }
+    return profile
+
+
+def check_profile(profile, min_coverage=MIN_COVERAGE):
+    """
+    Method to check the profile of a table: at least one row, no duplicate keys and enough foreign key coverage
+
+    :param (dict) profile: result of `profile_table`
+    :param (float) min_coverage: minimum ratio of foreign keys found in their dimension
+    :return list of failed checks, empty if the table passed
+    """
+    failed = []
+    if profile['rows'] == 0:
+        failed.append("no records")
+    if profile.get('duplicate_keys'):
+        failed.append(f"{profile['duplicate_keys']} duplicate values of {profile['key']}")
+    failed += [f"only {coverage:.1%} of {column} found in its dimension"
+               for column, coverage in profile['foreign_key_coverage'].items() if coverage < min_coverage]
+    return failed
+
+
+def quality_report(tables, min_coverage=MIN_COVERAGE):
+    """
+    Method to profile and check all tables
+
+    :param (dict) tables: table name to a dictionary with the DataFrame (`df`) and the arguments of `profile_table`
+    :param (float) min_coverage: minimum ratio of foreign keys found in their dimension
+    :return dictionary with per table the profile and the failed checks
+    """
+    report = {}
+    for table, spec in tables.items():
+        profile = profile_table(spec['df'], spec.get('key'), spec.get('foreign_keys'))
+        profile['failed'] = check_profile(profile, min_coverage=min_coverage)
+        report[table] = profile
+    return report
+
+
+def print_report(report):
+    for table, profile in report.items():
+        status = 'failed: ' + '; '.join(profile['failed']) if profile['failed'] else 'passed'
+        print(f"Table {table}: {profile['rows']} records, check {status}")
+        nulls = {c: r for c, r in profile['null_ratio'].items() if r > 0}
+        if nulls:
+            print(f"    NULL ratio: {nulls}")
+        if profile['foreign_key_coverage']:
+            print(f"    foreign key coverage: {profile['foreign_key_coverage']}")
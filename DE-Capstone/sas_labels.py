@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import re
+from collections import namedtuple
+
+# Section header in the label file (e.g. `/* I94PORT - This format shows ...`) with the name of the catalog map
+# and the type of its codes
+SECTIONS = {
+    'I94CIT & I94RES': ('countries', int),
+    'I94PORT': ('ports', str),
+    'I94MODE': ('modes', int),
+    'I94ADDR': ('states', str),
+    'I94VISA': ('visas', int)
+}
+
+LabelCatalog = namedtuple('LabelCatalog', [name for name, code_type in SECTIONS.values()])
+
+HEADER = re.compile(r"^/\*\s*(?P<section>[A-Z0-9]+(?:\s*&\s*[A-Z0-9]+)?)\s*-")
+
+# `582 =  'MEXICO ...'`, `'ALC'	=	'ALCAN, AK   '`, `'AL'='ALABAMA'` and (in a comment) `1 = Business`
+ENTRY = re.compile(r"^\s*'?(?P<code>[^'=\s]+)'?\s*=\s*(?:'(?P<quoted>.*)'|(?P<bare>[^\s;]+))")
+
+
+def parse_labels(lines):
+    """
+    Method to parse the code to label maps of the I94 SAS label descriptions in one pass
+
+    :param (list) lines: lines of `I94_SAS_Labels_Descriptions.SAS`
+    :return LabelCatalog with a typed dictionary from code to label per section
+    """
+    maps = {name: {} for name, code_type in SECTIONS.values()}
+    section = None
+    for line in lines:
+        header = HEADER.match(line)
+        if header:
+            section = SECTIONS.get(re.sub(r"\s+", " ", header.group('section')))
+            continue
+        match = ENTRY.match(line) if section else None
+        if match:
+            name, code_type = section
+            label = match.group('quoted') if match.group('quoted') is not None else match.group('bare')
+            maps[name].setdefault(code_type(match.group('code')), label.strip())
+    return LabelCatalog(**maps)
+
+
+def file_hash(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def from_json(maps):
+    # JSON object keys are strings, convert the codes back to their type
+    return LabelCatalog(**{name: {code_type(code): label for code, label in maps[name].items()}
+                           for name, code_type in SECTIONS.values()})
+
+
+def load_catalog(path, cache_path=None):
+    """
+    Method to get the label catalog of a label file, parsed once and cached on disk. The cache is used as long as
+    the modification time and size of the file are unchanged, or else its content hash is unchanged.
+
+    :param (str) path: path to `I94_SAS_Labels_Descriptions.SAS`
+    :param (str) cache_path: path to the JSON cache, defaults to `<path>.catalog.json`
+    :return LabelCatalog
+    """
+    cache_path = cache_path or f"{path}.catalog.json"
+    stat = os.stat(path)
+
+    cache = None
+    if os.path.exists(cache_path):
+        with open(cache_path) as f:
+            cache = json.load(f)
+
+    if cache and (cache['mtime'], cache['size']) == (stat.st_mtime, stat.st_size):
+        return from_json(cache['catalog'])
+
+    sha = file_hash(path)
+    if cache and cache['sha256'] == sha:
+        catalog = from_json(cache['catalog'])
+    else:
+        with open(path) as f:
+            catalog = parse_labels(f)
+
+    with open(cache_path, 'w') as f:
+        json.dump({'mtime': stat.st_mtime, 'size': stat.st_size, 'sha256': sha, 'catalog': catalog._asdict()}, f)
+    return catalog
+
+
+def us_port_cities(catalog):
+    """
+    Method to get the ports in the U.S., the label of these ports ends with the 2 letter state code
+
+    :param (LabelCatalog) catalog: label catalog
+    :return list of tuples with the port id and the city
+    """
+    return [(port_id, airport.split(', ')[0].title()) for port_id, airport in catalog.ports.items()
+            if len(airport.split(', ')[-1]) == 2]
+
+
+def to_dataframe(spark, mapping, columns):
+    """
+    Method to create a Spark DataFrame of a code to label map
+
+    :param spark: Spark session
+    :param (dict) mapping: code to label map of the catalog
+    :param (list) columns: names of the code and the label column
+    :return Spark DataFrame with an INT or STRING code and a STRING label
+    """
+    code_type = 'INT' if all(isinstance(code, int) for code in mapping) else 'STRING'
+    return spark.createDataFrame(sorted(mapping.items()), f"{columns[0]} {code_type}, {columns[1]} STRING")
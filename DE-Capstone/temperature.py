@@ -0,0 +1,90 @@
+import json
+import os
+import pyspark.sql.functions as F
+from pyspark.sql.types import StructType, StructField, DateType, DoubleType, StringType
+from lookups import semi_join
+
+# Schema of GlobalLandTemperaturesByCity.csv
+TEMP_SCHEMA = StructType([
+    StructField("dt", DateType(), True),
+    StructField("AverageTemperature", DoubleType(), True),
+    StructField("AverageTemperatureUncertainty", DoubleType(), True),
+    StructField("City", StringType(), True),
+    StructField("Country", StringType(), True),
+    StructField("Latitude", StringType(), True),
+    StructField("Longitude", StringType(), True)
+])
+
+
+def cache_is_valid(csv_path, cache_path):
+    """
+    Method to check if the parquet cache was written with the current schema from the current CSV file,
+    the CSV file itself is not needed when it is missing
+
+    :param (str) csv_path: path to the temperature CSV file
+    :param (str) cache_path: directory of the parquet cache
+    :return True if the cache can be used
+    """
+    meta_path = os.path.join(cache_path, '_cache.json')
+    if not os.path.exists(os.path.join(cache_path, '_SUCCESS')) or not os.path.exists(meta_path):
+        return False
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if meta['schema'] != TEMP_SCHEMA.jsonValue():
+        return False
+    if os.path.exists(csv_path):
+        stat = os.stat(csv_path)
+        return (meta['mtime'], meta['size']) == (stat.st_mtime, stat.st_size)
+    return True
+
+
+def convert_temperatures(spark, csv_path, cache_path):
+    """
+    Method to convert the temperature CSV file once into typed parquet partitioned by year
+
+    :param spark: Spark session
+    :param (str) csv_path: path to the temperature CSV file
+    :param (str) cache_path: directory of the parquet cache
+    """
+    spark.read.csv(csv_path, header=True, schema=TEMP_SCHEMA, dateFormat='yyyy-MM-dd')\
+        .withColumn('year', F.year('dt'))\
+        .repartition('year')\
+        .sortWithinPartitions('City', 'dt')\
+        .write.partitionBy('year').parquet(cache_path, mode='overwrite')
+
+    stat = os.stat(csv_path)
+    with open(os.path.join(cache_path, '_cache.json'), 'w') as f:
+        json.dump({'schema': TEMP_SCHEMA.jsonValue(), 'mtime': stat.st_mtime, 'size': stat.st_size}, f)
+
+
+def load_temperatures(spark, csv_path, cache_path):
+    """
+    Method to read the temperatures from the parquet cache, the cache is (re)built from the CSV file when it
+    is missing or out of date
+
+    :param spark: Spark session
+    :param (str) csv_path: path to the temperature CSV file
+    :param (str) cache_path: directory of the parquet cache
+    :return Spark DataFrame with the typed temperature data and a `year` partition column
+    """
+    if not cache_is_valid(csv_path, cache_path):
+        convert_temperatures(spark, csv_path, cache_path)
+    return spark.read.parquet(cache_path)
+
+
+def clean_temp_data(df, from_year, valid_cities):
+    """
+    Method to select the temperatures of the valid cities after the start of `from_year`. The year filter prunes
+    the partitions of the cache and the date filter is pushed down into the parquet scan.
+
+    :param df: Spark DataFrame as returned by `load_temperatures`
+    :param (str) from_year: first year of the temperatures
+    :param valid_cities: Spark DataFrame with the valid `City`s
+    :return Spark DataFrame with the date, city and average temperature
+    """
+    df = df\
+        .filter(F.col('year') >= int(from_year))\
+        .filter(F.col('dt') > F.lit(f"{from_year}-01-01").cast(DateType()))\
+        .filter(F.col('AverageTemperature').isNotNull())\
+        .select('dt', 'City', 'AverageTemperature')
+    return semi_join(df, valid_cities, 'City')
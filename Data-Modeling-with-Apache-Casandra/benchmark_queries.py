@@ -0,0 +1,91 @@
+"""
+Replays the three access patterns of the notebook with random keys taken from event_datafile_new.csv against a
+local node and reports the latency percentiles per query. Every request reads its full result, page by page.
+Run it after the tables are loaded (the notebook or benchmark_writes.py).
+
+    python benchmark_queries.py --keyspace sparkify --requests 2000 --fetch-size 5000
+"""
+import argparse
+import random
+import time
+from cassandra.cluster import Cluster
+from loader import read_lines
+from reader import QUERIES
+
+PERCENTILES = [50, 90, 99]
+
+
+def distinct_keys(file, queries=QUERIES):
+    """
+    Method to collect the distinct keys of every access pattern in one pass over the csv file
+
+    :param (str) file: path to event_datafile_new.csv
+    :param (dict) queries: query name to its `Query`
+    :return dictionary with a sorted list of keys per query
+    """
+    keys = {name: set() for name in queries}
+    for line in read_lines(file):
+        for name, query in queries.items():
+            keys[name].add(query.key(line))
+    return {name: sorted(values) for name, values in keys.items()}
+
+
+def percentile(timings, p):
+    # Nearest-rank percentile of sorted timings
+    return timings[max(0, min(len(timings) - 1, -(-p * len(timings) // 100) - 1))]
+
+
+def replay(session, select, keys, requests, fetch_size, rng, warmup=50):
+    """
+    Method to time requests of one access pattern with random keys
+
+    :param session: Cassandra session
+    :param (str) select: CQL of the access pattern
+    :param (list) keys: keys to draw from
+    :param (int) requests: number of timed requests
+    :param (int) fetch_size: number of rows per page
+    :param rng: random.Random object
+    :param (int) warmup: number of requests before the timing starts
+    :return tuple with the sorted latencies in milliseconds and the total number of rows read
+    """
+    statement = session.prepare(select)
+    timings, rows = [], 0
+    for k in range(warmup + requests):
+        bound = statement.bind(rng.choice(keys))
+        bound.fetch_size = fetch_size
+        start = time.perf_counter()
+        result = sum(1 for row in session.execute(bound))
+        if k >= warmup:
+            timings.append((time.perf_counter() - start) * 1000)
+            rows += result
+    return sorted(timings), rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the latency percentiles of the access patterns')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--keyspace', default='sparkify')
+    parser.add_argument('--file', default='event_datafile_new.csv', help='csv file to draw the keys from')
+    parser.add_argument('--requests', type=int, default=2000, help='timed requests per query')
+    parser.add_argument('--fetch-size', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    keys = distinct_keys(args.file)
+    rng = random.Random(args.seed)
+
+    cluster = Cluster([args.host])
+    session = cluster.connect(args.keyspace)
+
+    print(f"{'query':<16} {'keys':>7} {'rows/req':>9}" + ''.join(f" {f'p{p}':>8}" for p in PERCENTILES) +
+          f" {'max':>8}")
+    for name, query in QUERIES.items():
+        timings, rows = replay(session, query.select, keys[name], args.requests, args.fetch_size, rng)
+        print(f"{name:<16} {len(keys[name]):>7} {rows / len(timings):>9.1f}" +
+              ''.join(f" {percentile(timings, p):>6.2f}ms" for p in PERCENTILES) + f" {timings[-1]:>6.2f}ms")
+
+    cluster.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Compares the write throughput of loading the three query tables with synchronous single-row INSERTs, concurrent
+single-row INSERTs (`load_events`) and partition-grouped UNLOGGED batches (`load_events_batched`) on a local node.
+The tables are created in a separate keyspace and truncated before every load.
+
+    python benchmark_writes.py --file event_datafile_new.csv --rounds 3
+"""
+import argparse
+import os
+import time
+from cassandra.cluster import Cluster
+from events import event_file_paths, consolidate
+from loader import TABLES, prepare_inserts, fan_out, read_lines, load_events, load_events_batched
+
+CREATE_TABLES = {
+    'songs_sessions': "CREATE TABLE IF NOT EXISTS songs_sessions (session_id int, item_session int, "
+                      "artist_name varchar, song_title varchar, duration float, "
+                      "PRIMARY KEY (session_id, item_session))",
+    'songs_users': "CREATE TABLE IF NOT EXISTS songs_users (user_id int, session_id int, item_session int, "
+                   "first_name varchar, last_name varchar, artist_name varchar, song_title varchar, "
+                   "PRIMARY KEY ((user_id, session_id), item_session))",
+    'music_hist': "CREATE TABLE IF NOT EXISTS music_hist (song_title varchar, user_id int, first_name varchar, "
+                  "last_name varchar, PRIMARY KEY (song_title, user_id))"
+}
+
+
+def create_tables(session, keyspace):
+    """
+    Method to create a keyspace with the three query tables and to use it in the session
+
+    :param session: Cassandra session
+    :param (str) keyspace: name of the keyspace
+    """
+    session.execute(f"CREATE KEYSPACE IF NOT EXISTS {keyspace} "
+                    "WITH REPLICATION = { 'class' : 'SimpleStrategy', 'replication_factor' : 1 }")
+    session.set_keyspace(keyspace)
+    for query in CREATE_TABLES.values():
+        session.execute(query)
+
+
+def load_events_per_row(session, file):
+    """
+    Method to load all query tables with one synchronous INSERT at a time
+
+    :param session: Cassandra session
+    :param (str) file: path to event_datafile_new.csv
+    :return number of rows written
+    """
+    rows = 0
+    for name, statement, values in fan_out(read_lines(file), prepare_inserts(session, TABLES)):
+        session.execute(statement, values)
+        rows += 1
+    return rows
+
+
+def measure(session, load, rounds):
+    """
+    Method to time a load of the query tables
+
+    :param session: Cassandra session
+    :param load: function that loads the tables and returns the number of rows written
+    :param (int) rounds: number of loads, the fastest one is reported
+    :return tuple with the load time in seconds and the number of rows written
+    """
+    timings = []
+    for _ in range(rounds):
+        for name in TABLES:
+            session.execute(f"TRUNCATE {name}")
+        start = time.time()
+        rows = load()
+        timings.append(time.time() - start)
+    return min(timings), rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare single-row, concurrent and batched writes on a local node')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--keyspace', default='sparkify_benchmark')
+    parser.add_argument('--file', default='event_datafile_new.csv', help='consolidated from event_data when missing')
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--max-rows', type=int, default=50, help='maximum number of rows per batch')
+    parser.add_argument('--max-bytes', type=int, default=5 * 1024, help='maximum size of the values per batch')
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.file):
+        consolidate(event_file_paths(os.path.join(os.getcwd(), 'event_data')), args.file)
+
+    cluster = Cluster([args.host])
+    session = cluster.connect()
+    create_tables(session, args.keyspace)
+
+    variants = [
+        ('single-row', lambda: load_events_per_row(session, args.file)),
+        ('concurrent', lambda: sum(load_events(session, args.file, args.concurrency).values())),
+        ('batched', lambda: load_events_batched(session, args.file, args.concurrency,
+                                                max_rows=args.max_rows, max_bytes=args.max_bytes)['rows'])
+    ]
+
+    print(f"{'writes':<12} {'rows':>8} {'time':>9} {'rows/s':>9}")
+    for name, load in variants:
+        seconds, rows = measure(session, load, args.rounds)
+        print(f"{name:<12} {rows:>8} {seconds:>8.3f}s {rows / seconds:>9.0f}")
+
+    cluster.shutdown()
+
+
+if __name__ == '__main__':
+    main()
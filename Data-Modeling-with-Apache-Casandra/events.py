@@ -0,0 +1,54 @@
+import csv
+import glob
+import os
+
+# Columns of event_datafile_new.csv and their position in the original event csv files
+COLUMNS = ['artist', 'firstName', 'gender', 'itemInSession', 'lastName', 'length',
+           'level', 'location', 'sessionId', 'song', 'userId']
+SOURCE_INDEXES = [0, 2, 3, 4, 5, 6, 7, 8, 12, 13, 16]
+
+
+def event_file_paths(directory):
+    """
+    Method to list the event csv files in a directory and its subdirectories
+
+    :param (str) directory: directory with the event data
+    :return sorted list of file paths
+    """
+    return sorted(glob.glob(os.path.join(directory, '**', '*.csv'), recursive=True))
+
+
+def read_events(file_paths):
+    """
+    Method to stream the events of all files one row at a time, skipping the header of every file and the
+    events without an artist (no song was played)
+
+    :param (list) file_paths: event csv files
+    :return generator of rows with the columns in `COLUMNS`
+    """
+    for file_path in file_paths:
+        with open(file_path, 'r', encoding='utf8', newline='') as csvfile:
+            csvreader = csv.reader(csvfile)
+            next(csvreader, None)
+            for line in csvreader:
+                if line and line[0] != '':
+                    yield [line[k] for k in SOURCE_INDEXES]
+
+
+def consolidate(file_paths, output_file='event_datafile_new.csv'):
+    """
+    Method to write the events of all files to one csv file, row by row so the memory use does not grow
+    with the number of files
+
+    :param (list) file_paths: event csv files
+    :param (str) output_file: consolidated csv file
+    :return number of rows written
+    """
+    count = 0
+    with open(output_file, 'w', encoding='utf8', newline='') as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_ALL, skipinitialspace=True)
+        writer.writerow(COLUMNS)
+        for row in read_events(file_paths):
+            writer.writerow(row)
+            count += 1
+    return count
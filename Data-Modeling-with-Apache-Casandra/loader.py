@@ -0,0 +1,163 @@
+import csv
+from collections import namedtuple
+from cassandra.query import BatchStatement, BatchType
+from cassandra.concurrent import execute_concurrent
+
+# INSERT statement of a query table, the function that maps a row of event_datafile_new.csv to its values
+# and the number of leading values that form the partition key
+Table = namedtuple('Table', ['insert', 'values', 'partition_columns'])
+
+TABLES = {
+    'songs_sessions': Table(
+        "INSERT INTO songs_sessions (session_id, item_session, artist_name, song_title, duration) VALUES (?, ?, ?, ?, ?)",
+        lambda line: (int(line[8]), int(line[3]), line[0], line[9], float(line[5])),
+        1),
+    'songs_users': Table(
+        "INSERT INTO songs_users (user_id, session_id, item_session, first_name, last_name, artist_name, song_title) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        lambda line: (int(line[-1]), int(line[8]), int(line[3]), line[1], line[4], line[0], line[9]),
+        2),
+    'music_hist': Table(
+        "INSERT INTO music_hist (song_title, user_id, first_name, last_name) VALUES (?, ?, ?, ?)",
+        lambda line: (line[9], int(line[-1]), line[1], line[4]),
+        1)
+}
+
+
+def prepare_inserts(session, tables=TABLES):
+    """
+    Method to prepare the INSERT statement of every table once
+
+    :param session: Cassandra session
+    :param (dict) tables: table name to its `Table`
+    :return dictionary with the prepared statement per table
+    """
+    return {name: session.prepare(table.insert) for name, table in tables.items()}
+
+
+def read_lines(file):
+    """
+    Method to stream the rows of event_datafile_new.csv
+
+    :param (str) file: path to the csv file
+    :return generator of rows without the header
+    """
+    with open(file, encoding='utf8') as f:
+        csvreader = csv.reader(f)
+        next(csvreader)  # skip header
+        yield from csvreader
+
+
+def fan_out(lines, prepared, tables=TABLES):
+    """
+    Method to map every row to the INSERT of every table
+
+    :param lines: iterable of rows of event_datafile_new.csv
+    :param (dict) prepared: prepared statement per table
+    :param (dict) tables: table name to its `Table`
+    :return generator of tuples with the table name, the prepared statement and its values
+    """
+    for line in lines:
+        for name, table in tables.items():
+            yield name, prepared[name], table.values(line)
+
+
+def load_events(session, file='event_datafile_new.csv', concurrency=100, tables=TABLES):
+    """
+    Method to load all query tables in one pass over the csv file, with at most `concurrency` requests in flight
+
+    :param session: Cassandra session
+    :param (str) file: path to event_datafile_new.csv
+    :param (int) concurrency: maximum number of requests in flight
+    :param (dict) tables: table name to its `Table`
+    :return dictionary with the number of rows written per table
+    """
+    prepared = prepare_inserts(session, tables)
+    counts = dict.fromkeys(tables, 0)
+
+    def statements():
+        for name, statement, values in fan_out(read_lines(file), prepared, tables):
+            counts[name] += 1
+            yield statement, values
+
+    execute_statements(session, statements(), concurrency)
+    return counts
+
+
+def execute_statements(session, statements, concurrency):
+    """
+    Method to execute statements with at most `concurrency` requests in flight, raising on the first error
+
+    :param session: Cassandra session
+    :param statements: iterable of tuples with a statement and its values
+    :param (int) concurrency: maximum number of requests in flight
+    """
+    for result in execute_concurrent(session, statements, concurrency=concurrency,
+                                     raise_on_first_error=True, results_generator=True):
+        pass
+
+
+def value_size(values):
+    # Rough size in bytes of the values of a row
+    return sum(len(value.encode('utf8')) if isinstance(value, str) else 8 for value in values)
+
+
+def partition_batches(statements, tables=TABLES, max_rows=50, max_bytes=5 * 1024, max_open=1000):
+    """
+    Method to group the rows of the same partition into UNLOGGED batches, so every batch is written to a single
+    replica set. A batch is sent when it reaches `max_rows` rows or `max_bytes` bytes (Cassandra warns for
+    batches above 5 KB by default), or when more than `max_open` partitions are waiting, the oldest first.
+
+    :param statements: iterable of tuples with the table name, the prepared statement and its values (`fan_out`)
+    :param (dict) tables: table name to its `Table`
+    :param (int) max_rows: maximum number of rows per batch
+    :param (int) max_bytes: maximum (estimated) size of the values per batch
+    :param (int) max_open: maximum number of partitions with a batch that is not sent yet
+    :return generator of tuples with a batch and its number of rows
+    """
+    open_batches = {}
+
+    for name, statement, values in statements:
+        key = (name,) + tuple(values[:tables[name].partition_columns])
+        batch = open_batches.get(key)
+        if batch is None:
+            batch = open_batches[key] = [BatchStatement(batch_type=BatchType.UNLOGGED), 0, 0]
+        batch[0].add(statement, values)
+        batch[1] += 1
+        batch[2] += value_size(values)
+
+        if batch[1] >= max_rows or batch[2] >= max_bytes:
+            yield tuple(open_batches.pop(key)[:2])
+        elif len(open_batches) > max_open:
+            yield tuple(open_batches.pop(next(iter(open_batches)))[:2])
+
+    for batch in open_batches.values():
+        yield tuple(batch[:2])
+
+
+def load_events_batched(session, file='event_datafile_new.csv', concurrency=50, tables=TABLES,
+                        max_rows=50, max_bytes=5 * 1024, max_open=1000):
+    """
+    Method to load all query tables in one pass over the csv file with UNLOGGED batches per partition
+
+    :param session: Cassandra session
+    :param (str) file: path to event_datafile_new.csv
+    :param (int) concurrency: maximum number of batches in flight
+    :param (dict) tables: table name to its `Table`
+    :param (int) max_rows: maximum number of rows per batch
+    :param (int) max_bytes: maximum (estimated) size of the values per batch
+    :param (int) max_open: maximum number of partitions with a batch that is not sent yet
+    :return dictionary with the number of rows and batches written
+    """
+    prepared = prepare_inserts(session, tables)
+    counts = {'rows': 0, 'batches': 0}
+
+    def statements():
+        for batch, rows in partition_batches(fan_out(read_lines(file), prepared, tables), tables,
+                                             max_rows, max_bytes, max_open):
+            counts['rows'] += rows
+            counts['batches'] += 1
+            yield batch, None
+
+    execute_statements(session, statements(), concurrency)
+    return counts
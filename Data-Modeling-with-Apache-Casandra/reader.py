@@ -0,0 +1,48 @@
+from collections import namedtuple
+import pandas as pd
+
+# SELECT of an access pattern and the function that maps a row of event_datafile_new.csv to its key
+Query = namedtuple('Query', ['select', 'key'])
+
+QUERIES = {
+    'songs_sessions': Query(
+        "SELECT artist_name, song_title, duration FROM songs_sessions WHERE session_id = ? AND item_session = ?",
+        lambda line: (int(line[8]), int(line[3]))),
+    'songs_users': Query(
+        "SELECT artist_name, song_title, first_name, last_name FROM songs_users WHERE user_id = ? AND session_id = ?",
+        lambda line: (int(line[-1]), int(line[8]))),
+    'music_hist': Query(
+        "SELECT first_name, last_name FROM music_hist WHERE song_title = ?",
+        lambda line: (line[9],))
+}
+
+
+def read_chunks(session, query, parameters=None, fetch_size=5000):
+    """
+    Method to stream the result of a query as pandas DataFrames, one per page of `fetch_size` rows. The next page
+    is requested before the current one is converted, so at most two pages are held in memory.
+
+    :param session: Cassandra session
+    :param query: CQL string or prepared statement
+    :param (tuple) parameters: values of the placeholders
+    :param (int) fetch_size: number of rows per page
+    :return generator of pandas DataFrames
+    """
+    statement = query if hasattr(query, 'bind') else session.prepare(query)
+    bound = statement.bind(parameters or ())
+    bound.fetch_size = fetch_size
+
+    future = session.execute_async(bound)
+    chunks = 0
+    while True:
+        result = future.result()
+        page, columns = result.current_rows, result.column_names
+        has_more_pages = future.has_more_pages
+        if has_more_pages:
+            future.start_fetching_next_page()
+        # The last page can be empty, an empty DataFrame is only returned for an empty result
+        if page or (not has_more_pages and not chunks):
+            chunks += 1
+            yield pd.DataFrame(list(page), columns=columns)
+        if not has_more_pages:
+            break
@@ -0,0 +1,150 @@
+"""
+Runs every task of the `sparkify-songplays-analysis` (or `sparkify-songplays-backfill`) DAG in-process against
+a local Postgres database that stands in for Redshift, with COPY from S3 emulated by local JSON fixtures.
+
+    python benchmark/benchmark_dag.py "host=localhost dbname=sparkify user=postgres" --scale 10
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DAG_ID = 'sparkify-songplays-analysis'
+BACKFILL_DAG_ID = 'sparkify-songplays-backfill'
+
+os.environ.setdefault('AIRFLOW__CORE__DAGS_FOLDER', os.path.join(PROJECT_DIR, 'dags'))
+os.environ.setdefault('AIRFLOW__CORE__PLUGINS_FOLDER', os.path.join(PROJECT_DIR, 'plugins'))
+os.environ.setdefault('AIRFLOW__CORE__LOAD_EXAMPLES', 'False')
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'plugins'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from generate_fixtures import generate
+from local_redshift import LocalRedshiftHook, FakeAwsHook, FakeS3Hook
+
+
+class FakeTaskInstance:
+    """
+    Keeps the XCom values of a task in memory.
+    """
+
+    def __init__(self, task_id):
+        self.task_id = task_id
+        self.xcom = {}
+
+    def xcom_push(self, key, value):
+        self.xcom[key] = value
+
+
+def load_dag(dag_id=DAG_ID):
+    from airflow.models import DagBag
+
+    dag_bag = DagBag(dag_folder=os.path.join(PROJECT_DIR, 'dags'), include_examples=False)
+    if dag_id not in dag_bag.dags:
+        raise ValueError(f"DAG {dag_id} could not be loaded: {dag_bag.import_errors}")
+    return dag_bag.get_dag(dag_id)
+
+
+def patch_hooks(dag, hook):
+    """
+    Method to replace the Redshift, AWS and S3 hooks in the modules of the DAG's operators
+
+    :param dag: Airflow DAG
+    :param hook: LocalRedshiftHook object
+    """
+    FakeS3Hook.fixtures_dir = hook.fixtures_dir
+    for task in dag.tasks:
+        module = sys.modules[type(task).__module__]
+        if hasattr(module, 'PostgresHook'):
+            module.PostgresHook = hook
+        if hasattr(module, 'AwsHook'):
+            module.AwsHook = FakeAwsHook
+        if hasattr(module, 'S3Hook'):
+            module.S3Hook = FakeS3Hook
+
+
+def critical_path(dag, durations):
+    """
+    Method to compute the critical path of the DAG from the measured task durations
+
+    :param dag: Airflow DAG
+    :param (dict) durations: duration per task_id in seconds
+    :return total duration of the critical path and the task_ids on it
+    """
+    finish, previous = {}, {}
+    for task in dag.topological_sort():
+        upstream = max(task.upstream_task_ids, key=lambda t: finish[t], default=None)
+        finish[task.task_id] = durations[task.task_id] + (finish[upstream] if upstream else 0)
+        previous[task.task_id] = upstream
+
+    task_id = max(finish, key=finish.get)
+    path = []
+    while task_id:
+        path.insert(0, task_id)
+        task_id = previous[task_id]
+    return finish[path[-1]], path
+
+
+def run_dag(dag, execution_date):
+    """
+    Method to execute all tasks of the DAG in topological order and time them
+
+    :param dag: Airflow DAG
+    :param (datetime) execution_date: logical date of the run
+    :return duration per task_id in seconds and the XCom values per task_id
+    """
+    durations, xcoms = {}, {}
+    for task in dag.topological_sort():
+        ti = FakeTaskInstance(task.task_id)
+        context = {
+            'dag': dag,
+            'task': task,
+            'ti': ti,
+            'task_instance': ti,
+            'execution_date': execution_date,
+            'ds': execution_date.strftime('%Y-%m-%d'),
+            'ts': execution_date.isoformat(),
+            'ts_nodash': execution_date.strftime('%Y%m%dT%H%M%S'),
+            'run_id': f"benchmark__{execution_date.isoformat()}",
+        }
+        start = time.time()
+        task.execute(context)
+        durations[task.task_id] = time.time() - start
+        xcoms[task.task_id] = ti.xcom
+        print(f"{task.task_id:<32} {durations[task.task_id]:8.3f}s")
+    return durations, xcoms
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Sparkify DAG against a local Postgres database')
+    parser.add_argument('dsn', help='libpq connection string of the local Postgres database')
+    parser.add_argument('--fixtures-dir', help='directory with (or for) the generated fixtures')
+    parser.add_argument('--scale', type=float, default=1.0, help='1 is about the size of the Udacity dataset')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--execution-date', default='2018-11-01T00:00:00', help='in the range of the fixtures')
+    parser.add_argument('--dag-id', default=DAG_ID, choices=[DAG_ID, BACKFILL_DAG_ID],
+                        help='hourly DAG or the backfill DAG that loads a day per run')
+    args = parser.parse_args()
+
+    fixtures_dir = args.fixtures_dir or tempfile.mkdtemp(prefix='sparkify-fixtures-')
+    if not os.path.isdir(os.path.join(fixtures_dir, 'log_data')):
+        num_songs, num_events = generate(fixtures_dir, args.scale, args.seed)
+        print(f"Generated {num_songs} songs and {num_events} events in {fixtures_dir}")
+
+    os.environ.setdefault('SPARKIFY_METRICS_PATH', os.path.join(fixtures_dir, 'metrics.jsonl'))
+    hook = LocalRedshiftHook(args.dsn, fixtures_dir)
+    hook.create_tables(os.path.join(PROJECT_DIR, 'create_tables.sql'))
+
+    dag = load_dag(args.dag_id)
+    patch_hooks(dag, hook)
+    durations, _ = run_dag(dag, datetime.strptime(args.execution_date, '%Y-%m-%dT%H:%M:%S'))
+
+    total, path = critical_path(dag, durations)
+    print(f"\nTotal task time:    {sum(durations.values()):8.3f}s")
+    print(f"Critical path time: {total:8.3f}s ({' >> '.join(path)})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Compares the bytes transferred and the load time of the staging input formats of the StageToRedshiftOperator
+(raw JSON, gzip/zstd compressed JSON and CSV, and Parquet) on a local Postgres database.
+
+    python benchmark/benchmark_formats.py "host=localhost dbname=sparkify user=postgres" --scale 10
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'plugins'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from generate_fixtures import generate
+from helpers import prestage
+from local_redshift import LocalRedshiftHook, list_prefix, read_json_records
+
+VARIANTS = [('json', None), ('json', 'gzip'), ('json', 'zstd'),
+            ('csv', None), ('csv', 'gzip'), ('csv', 'zstd'),
+            ('parquet', None)]
+
+# Staging table, raw prefix and jsonpaths file, like the DAG
+SOURCES = [('staging_events', 'log_data', 'log_json_path.json'),
+           ('staging_songs', 'song_data', 'auto')]
+
+
+def copy_sql(table, prefix, data_format, compression, json_path='auto'):
+    format_options = {'json': f"FORMAT AS JSON '{json_path}'", 'csv': "FORMAT AS CSV IGNOREHEADER 1",
+                      'parquet': "FORMAT AS PARQUET"}[data_format]
+    return f"COPY {table} FROM 's3://local/{prefix}' {format_options} {(compression or '').upper()}"
+
+
+def convert(hook, table, prefix, json_path, data_format, compression, rows_per_file):
+    """
+    Method to convert the raw JSON files of a staging table into one of the staging formats
+
+    :param hook: LocalRedshiftHook object
+    :param (str) table: staging table
+    :param (str) prefix: prefix of the raw JSON files in the fixtures directory
+    :param (str) json_path: jsonpaths file in the fixtures directory or 'auto'
+    :param (str) data_format: one of `prestage.FORMATS`
+    :param (str) compression: one of `prestage.COMPRESSIONS`
+    :param (int) rows_per_file: maximum number of rows per converted file
+    :return prefix of the converted files
+    """
+    columns = hook.get_records(prestage.columns_sql.format(table))
+    keys = None
+    if json_path != 'auto':
+        with open(os.path.join(hook.fixtures_dir, json_path)) as f:
+            keys = prestage.jsonpaths_keys(f.read())
+
+    records = read_json_records(list_prefix(os.path.join(hook.fixtures_dir, prefix)))
+    extension = prestage.file_extension(data_format, compression)
+    target = f"formats/{table}/{extension[1:]}"
+    os.makedirs(os.path.join(hook.fixtures_dir, target), exist_ok=True)
+    for k, chunk in enumerate(prestage.chunks(prestage.to_rows(records, columns, keys), rows_per_file)):
+        with open(os.path.join(hook.fixtures_dir, target, f"part-{k:05d}{extension}"), 'wb') as f:
+            f.write(prestage.encode(chunk, columns, data_format, compression))
+    return target
+
+
+def measure_load(hook, table, sql, rounds):
+    """
+    Method to time the COPY of a staging table
+
+    :param hook: LocalRedshiftHook object
+    :param (str) table: staging table
+    :param (str) sql: COPY statement
+    :param (int) rounds: number of loads, the fastest one is reported
+    :return load time in seconds
+    """
+    timings = []
+    for _ in range(rounds):
+        hook.run(f"DELETE FROM {table}")
+        start = time.time()
+        hook.run(sql)
+        timings.append(time.time() - start)
+    return min(timings)
+
+
+def size_of(fixtures_dir, prefix):
+    files = list_prefix(os.path.join(fixtures_dir, prefix))
+    return len(files), sum(os.path.getsize(f) for f in files)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the staging input formats on a local Postgres database')
+    parser.add_argument('dsn', help='libpq connection string of the local Postgres database')
+    parser.add_argument('--fixtures-dir', help='directory with (or for) the generated fixtures')
+    parser.add_argument('--scale', type=float, default=1.0, help='1 is about the size of the Udacity dataset')
+    parser.add_argument('--rows-per-file', type=int, default=100000)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    fixtures_dir = args.fixtures_dir or tempfile.mkdtemp(prefix='sparkify-fixtures-')
+    if not os.path.isdir(os.path.join(fixtures_dir, 'log_data')):
+        generate(fixtures_dir, args.scale)
+    hook = LocalRedshiftHook(args.dsn, fixtures_dir)
+    hook.create_tables(os.path.join(PROJECT_DIR, 'create_tables.sql'))
+
+    print(f"{'table':<16} {'format':<14} {'files':>7} {'bytes':>12} {'convert':>9} {'load':>9}")
+    for table, prefix, json_path in SOURCES:
+        num_files, num_bytes = size_of(fixtures_dir, prefix)
+        load = measure_load(hook, table, copy_sql(table, prefix, 'json', None, json_path), args.rounds)
+        print(f"{table:<16} {'raw json':<14} {num_files:>7} {num_bytes:>12} {'':>9} {load:>8.3f}s")
+
+        for data_format, compression in VARIANTS:
+            name = prestage.file_extension(data_format, compression)[1:]
+            start = time.time()
+            try:
+                target = convert(hook, table, prefix, json_path, data_format, compression, args.rows_per_file)
+            except ValueError as e:
+                print(f"{table:<16} {name:<14} skipped: {e}")
+                continue
+            converted = time.time() - start
+            num_files, num_bytes = size_of(fixtures_dir, target)
+            load = measure_load(hook, table, copy_sql(table, target, data_format, compression), args.rounds)
+            print(f"{table:<16} {name:<14} {num_files:>7} {num_bytes:>12} {converted:>8.3f}s {load:>8.3f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+import argparse
+import json
+import os
+import random
+from datetime import datetime, timedelta
+
+# Same mapping as s3://udacity-dend/log_json_path.json
+LOG_JSONPATHS = ["artist", "auth", "firstName", "gender", "itemInSession", "lastName", "length", "level",
+                 "location", "method", "page", "registration", "sessionId", "song", "status", "ts",
+                 "userAgent", "userId"]
+
+PAGES = ['NextSong'] * 8 + ['Home', 'Logout', 'Settings']
+
+
+def generate_songs(rng, num_songs, num_artists):
+    """
+    Method to generate song metadata records in the format of the Million Song Dataset subset
+
+    :param rng: random.Random object
+    :param (int) num_songs: number of songs
+    :param (int) num_artists: number of artists
+    :return list of song dictionaries
+    """
+    songs = []
+    for k in range(num_songs):
+        artist = rng.randrange(num_artists)
+        songs.append({
+            "num_songs": 1,
+            "artist_id": f"AR{artist:016X}",
+            "artist_latitude": round(rng.uniform(-90, 90), 5) if rng.random() < 0.4 else None,
+            "artist_longitude": round(rng.uniform(-180, 180), 5) if rng.random() < 0.4 else None,
+            "artist_location": rng.choice(["", "New York, NY", "London, England", "Austin, TX"]),
+            "artist_name": f"Artist {artist}",
+            "song_id": f"SO{k:016X}",
+            "title": f"Song {k}",
+            "duration": round(rng.uniform(90, 420), 5),
+            "year": rng.choice([0, 1999, 2004, 2008])
+        })
+    return songs
+
+
+def generate_events(rng, songs, num_events, num_users, start):
+    """
+    Method to generate app activity events in the format of the event simulator logs
+
+    :param rng: random.Random object
+    :param (list) songs: song dictionaries the users listen to
+    :param (int) num_events: number of events
+    :param (int) num_users: number of users
+    :param (datetime) start: timestamp of the first event
+    :return list of event dictionaries ordered by timestamp
+    """
+    step = timedelta(days=30) / max(num_events, 1)
+    events = []
+    for k in range(num_events):
+        user = rng.randrange(1, num_users + 1)
+        page = rng.choice(PAGES)
+        song = rng.choice(songs) if page == 'NextSong' else None
+        ts = start + step * k
+        events.append({
+            "artist": song["artist_name"] if song else None,
+            "auth": "Logged In",
+            "firstName": f"First{user}",
+            "gender": "F" if user % 2 else "M",
+            "itemInSession": k % 50,
+            "lastName": f"Last{user}",
+            "length": song["duration"] if song else None,
+            "level": "paid" if user % 3 == 0 else "free",
+            "location": "San Francisco-Oakland-Hayward, CA",
+            "method": "PUT" if song else "GET",
+            "page": page,
+            "registration": 1540000000000.0 + user,
+            "sessionId": user * 1000 + ts.day,
+            "song": song["title"] if song else None,
+            "status": 200,
+            "ts": int(ts.timestamp() * 1000),
+            "userAgent": "Mozilla/5.0",
+            "userId": str(user)
+        })
+    return events
+
+
+def write_fixtures(fixtures_dir, songs, events):
+    """
+    Method to write the records with the same key layout as the `udacity-dend` bucket
+
+    :param (str) fixtures_dir: local directory that stands in for the S3 bucket
+    :param (list) songs: song dictionaries, one file per song
+    :param (list) events: event dictionaries, one JSON lines file per day
+    """
+    for song in songs:
+        track = song["song_id"][2:]
+        path = os.path.join(fixtures_dir, 'song_data', track[-3], track[-2], track[-1])
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, f"TR{track}.json"), 'w') as f:
+            json.dump(song, f)
+
+    days = {}
+    for event in events:
+        day = datetime.utcfromtimestamp(event["ts"] / 1000)
+        days.setdefault(day.strftime('%Y/%m/%Y-%m-%d'), []).append(event)
+    for day, day_events in days.items():
+        path = os.path.join(fixtures_dir, 'log_data', f"{day}-events.json")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.writelines(json.dumps(event) + '\n' for event in day_events)
+
+    with open(os.path.join(fixtures_dir, 'log_json_path.json'), 'w') as f:
+        json.dump({"jsonpaths": [f"$['{key}']" for key in LOG_JSONPATHS]}, f, indent=4)
+
+
+def generate(fixtures_dir, scale=1.0, seed=42):
+    """
+    Method to generate song and log data fixtures, scale 1 is about the size of the Udacity dataset
+
+    :param (str) fixtures_dir: local directory that stands in for the S3 bucket
+    :param (float) scale: multiplier of the number of songs, users and events
+    :param (int) seed: seed of the random generator
+    :return number of songs and events that were generated
+    """
+    rng = random.Random(seed)
+    songs = generate_songs(rng, int(15000 * scale), int(10000 * scale))
+    events = generate_events(rng, songs, int(8000 * scale), max(int(100 * scale), 1), datetime(2018, 11, 1))
+    write_fixtures(fixtures_dir, songs, events)
+    return len(songs), len(events)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate local song and log data fixtures')
+    parser.add_argument('fixtures_dir', help='local directory that stands in for the S3 bucket')
+    parser.add_argument('--scale', type=float, default=1.0, help='1 is about the size of the Udacity dataset')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    num_songs, num_events = generate(args.fixtures_dir, args.scale, args.seed)
+    print(f"Generated {num_songs} songs and {num_events} events in {args.fixtures_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+import csv
+import gzip
+import io
+import json
+import os
+import re
+
+import psycopg2
+import psycopg2.extensions
+
+from helpers.prestage import jsonpaths_keys
+
+COPY_PATTERN = re.compile(r"^\s*COPY\s+(?P<table>\S+)\s+FROM\s+'?(?P<source>[^'\s]+)'?", re.IGNORECASE)
+JSON_PATTERN = re.compile(r"FORMAT\s+AS\s+JSON\s+'?(?P<json_path>[^'\s]+)'?", re.IGNORECASE)
+FORMAT_PATTERN = re.compile(r"FORMAT\s+AS\s+(?P<data_format>JSON|CSV|PARQUET)", re.IGNORECASE)
+COMPRESSION_PATTERN = re.compile(r"\b(?P<compression>GZIP|ZSTD)\b", re.IGNORECASE)
+MANIFEST_PATTERN = re.compile(r"\bMANIFEST\b", re.IGNORECASE)
+
+# Redshift SQL that Postgres does not understand
+TRANSLATIONS = [
+    (re.compile(r"\bdayofweek\b", re.IGNORECASE), "dow"),
+    (re.compile(r"\b(DISTKEY|SORTKEY)\b", re.IGNORECASE), ""),
+]
+
+# Redshift casts implicitly when concatenating an integer with a timestamp (used in the songplay_id md5)
+SHIM_SQL = """
+    CREATE OR REPLACE FUNCTION int_ts_concat(integer, timestamp) RETURNS text
+        AS 'SELECT $1::text || $2::text' LANGUAGE SQL IMMUTABLE;
+    DO $$ BEGIN
+        CREATE OPERATOR || (LEFTARG = integer, RIGHTARG = timestamp, FUNCTION = int_ts_concat);
+    EXCEPTION WHEN duplicate_function THEN NULL;
+    END $$;
+"""
+
+
+def translate(sql):
+    """
+    Method to rewrite Redshift specific SQL into Postgres SQL
+
+    :param (str) sql: Redshift SQL statement
+    :return Postgres SQL statement
+    """
+    for pattern, replacement in TRANSLATIONS:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+def s3_to_local(fixtures_dir, s3_path):
+    """
+    Method to map an S3 path (s3://bucket/key) onto the local fixtures directory
+
+    :param (str) fixtures_dir: local directory that stands in for the S3 bucket
+    :param (str) s3_path: S3 path used in the COPY statement
+    :return local path
+    """
+    key = re.sub(r"^s3://[^/]+/?", "", s3_path)
+    return os.path.join(fixtures_dir, key)
+
+
+def list_prefix(path):
+    """
+    Method to list all files under a prefix, like COPY does for an S3 key prefix
+
+    :param (str) path: local path of the prefix
+    :return sorted list of file paths
+    """
+    if os.path.isfile(path):
+        return [path]
+    directory, prefix = (path, '') if os.path.isdir(path) else os.path.split(path)
+    files = []
+    for root, dirs, names in os.walk(directory):
+        for name in names:
+            file_path = os.path.join(root, name)
+            if os.path.relpath(file_path, directory).startswith(prefix):
+                files.append(file_path)
+    return sorted(files)
+
+
+def read_manifest(fixtures_dir, manifest_path):
+    """
+    Method to list the local files of the entries in a COPY manifest
+
+    :param (str) fixtures_dir: local directory that stands in for the S3 bucket
+    :param (str) manifest_path: S3 path of the manifest
+    :return list of file paths
+    """
+    with open(s3_to_local(fixtures_dir, manifest_path)) as f:
+        return [s3_to_local(fixtures_dir, entry['url']) for entry in json.load(f)['entries']]
+
+
+def read_file(file_path, compression=None):
+    """
+    Method to read and decompress a file
+
+    :param (str) file_path: path of the file
+    :param (str) compression: None, 'gzip' or 'zstd'
+    :return content of the file
+    """
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    if compression == 'gzip':
+        return gzip.decompress(data)
+    if compression == 'zstd':
+        import zstandard
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return data
+
+
+def read_json_records(files, compression=None):
+    """
+    Method to read JSON objects from files that contain one or more objects per line
+
+    :param (list) files: file paths
+    :param (str) compression: None, 'gzip' or 'zstd'
+    :return generator of dictionaries
+    """
+    for file_path in files:
+        for line in read_file(file_path, compression).decode('utf8').splitlines():
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_csv_rows(files, compression=None):
+    """
+    Method to read the rows of CSV files with a header
+
+    :param (list) files: file paths
+    :param (str) compression: None, 'gzip' or 'zstd'
+    :return generator of lists
+    """
+    for file_path in files:
+        reader = csv.reader(io.StringIO(read_file(file_path, compression).decode('utf8')))
+        next(reader, None)
+        yield from reader
+
+
+def read_parquet_rows(files):
+    """
+    Method to read the rows of Parquet files
+
+    :param (list) files: file paths
+    :return generator of lists
+    """
+    import pyarrow.parquet as pq
+
+    for file_path in files:
+        table = pq.read_table(file_path)
+        yield from zip(*[column.to_pylist() for column in table.columns])
+
+
+class LocalRedshiftCursor(psycopg2.extensions.cursor):
+    """
+    Cursor that translates Redshift SQL for Postgres and emulates COPY from S3 with local fixtures.
+    """
+
+    def execute(self, query, vars=None):
+        match = COPY_PATTERN.match(query)
+        if match:
+            return self.copy_from_fixtures(match.group('table'), match.group('source'), query)
+        return super(LocalRedshiftCursor, self).execute(translate(query), vars)
+
+    def table_columns(self, table):
+        schema, _, name = table.rpartition('.')
+        super(LocalRedshiftCursor, self).execute(
+            "SELECT column_name FROM information_schema.columns WHERE table_name = %s AND table_schema = %s "
+            "ORDER BY ordinal_position", (name.lower(), (schema or 'public').lower()))
+        return [row[0] for row in self.fetchall()]
+
+    def copy_from_fixtures(self, table, source, query):
+        """
+        Method to load the local fixtures of an S3 prefix into a table through the same jsonpaths mapping
+
+        :param (str) table: destination table
+        :param (str) source: S3 prefix used in the COPY statement
+        :param (str) query: full COPY statement
+        """
+        fixtures_dir = self.connection.fixtures_dir
+        columns = self.table_columns(table)
+        format_match = FORMAT_PATTERN.search(query)
+        data_format = format_match.group('data_format').lower() if format_match else 'json'
+        compression_match = COMPRESSION_PATTERN.search(query)
+        compression = compression_match.group('compression').lower() if compression_match else None
+
+        if MANIFEST_PATTERN.search(query):
+            files = read_manifest(fixtures_dir, source)
+        else:
+            files = list_prefix(s3_to_local(fixtures_dir, source))
+
+        if data_format == 'csv':
+            rows = read_csv_rows(files, compression)
+        elif data_format == 'parquet':
+            rows = read_parquet_rows(files)
+        else:
+            json_match = JSON_PATTERN.search(query)
+            json_path = json_match.group('json_path') if json_match else 'auto'
+            if json_path.lower() == 'auto':
+                def row(record):
+                    lowered = {k.lower(): v for k, v in record.items()}
+                    return [lowered.get(column) for column in columns]
+            else:
+                with open(s3_to_local(fixtures_dir, json_path)) as f:
+                    keys = jsonpaths_keys(f.read())
+                columns = columns[:len(keys)]
+
+                def row(record):
+                    return [record.get(key) for key in keys]
+            rows = (row(record) for record in read_json_records(files, compression))
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for values in rows:
+            # BLANKSASNULL EMPTYASNULL: unquoted empty CSV fields are loaded as NULL
+            writer.writerow(['' if value is None else value for value in values])
+        buffer.seek(0)
+        self.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+class LocalRedshiftConnection(psycopg2.extensions.connection):
+    fixtures_dir = None
+
+
+class LocalRedshiftHook:
+    """
+    Stand-in for the PostgresHook that connects to a local Postgres database instead of Redshift.
+    """
+
+    def __init__(self, dsn, fixtures_dir):
+        self.dsn = dsn
+        self.fixtures_dir = fixtures_dir
+
+    def __call__(self, *args, **kwargs):
+        # Operators create their hook with `PostgresHook(postgres_conn_id=...)`
+        return self
+
+    def get_conn(self):
+        conn = psycopg2.connect(self.dsn, connection_factory=LocalRedshiftConnection,
+                                cursor_factory=LocalRedshiftCursor)
+        conn.fixtures_dir = self.fixtures_dir
+        return conn
+
+    def run(self, sql, parameters=None):
+        conn = self.get_conn()
+        try:
+            cur = conn.cursor()
+            for statement in ([sql] if isinstance(sql, str) else sql):
+                cur.execute(statement, parameters)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_records(self, sql, parameters=None):
+        conn = self.get_conn()
+        try:
+            cur = conn.cursor()
+            cur.execute(sql, parameters)
+            return cur.fetchall()
+        finally:
+            conn.close()
+
+    def get_first(self, sql, parameters=None):
+        conn = self.get_conn()
+        try:
+            cur = conn.cursor()
+            cur.execute(sql, parameters)
+            return cur.fetchone()
+        finally:
+            conn.close()
+
+    def create_tables(self, ddl_file):
+        """
+        Method to (re)create the tables of `create_tables.sql` and the Redshift shims in the local database
+
+        :param (str) ddl_file: path to create_tables.sql
+        """
+        with open(ddl_file) as f:
+            ddl = f.read()
+        tables = re.findall(r"CREATE TABLE IF NOT EXISTS (\S+)", ddl)
+        self.run([f"DROP TABLE IF EXISTS {table} CASCADE" for table in dict.fromkeys(tables)] + [SHIM_SQL, ddl])
+
+
+class FakeCredentials:
+    access_key = 'local'
+    secret_key = 'local'
+
+
+class FakeAwsHook:
+    """
+    Stand-in for the AwsHook, the credentials are not used by the emulated COPY.
+    """
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def get_credentials(self):
+        return FakeCredentials()
+
+
+class FakeS3Hook:
+    """
+    Stand-in for the S3Hook that lists and writes keys in the local fixtures directory.
+    """
+
+    fixtures_dir = None
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def list_keys(self, bucket_name=None, prefix='', delimiter=''):
+        path = os.path.join(self.fixtures_dir, prefix)
+        return [os.path.relpath(f, self.fixtures_dir) for f in list_prefix(path)]
+
+    @staticmethod
+    def parse_s3_url(s3_url):
+        bucket, _, key = re.sub(r"^s3://", "", s3_url).partition('/')
+        return bucket, key
+
+    def read_key(self, key, bucket_name=None):
+        with open(os.path.join(self.fixtures_dir, key)) as f:
+            return f.read()
+
+    def load_bytes(self, bytes_data, key, bucket_name=None, replace=False):
+        path = os.path.join(self.fixtures_dir, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(bytes_data)
+
+    def load_string(self, string_data, key, bucket_name=None, replace=False):
+        self.load_bytes(string_data.encode('utf8'), key, bucket_name, replace)
@@ -89,6 +89,13 @@ CREATE TABLE IF NOT EXISTS public.time (
     hour int NOT NULL, day int NOT NULL, week int NOT NULL, 
     month int NOT NULL, year int NOT NULL, weekday int NOT NULL);
 
-
-
-
+CREATE TABLE IF NOT EXISTS public.data_quality_results (
+	run_id varchar(256),
+	checked_at timestamp NOT NULL,
+	table_name varchar(256) NOT NULL,
+	check_name varchar(256) NOT NULL,
+	column_name varchar(256),
+	result int8,
+	expected varchar(256),
+	passed boolean NOT NULL
+);
@@ -3,15 +3,20 @@ import os
 from airflow import DAG
 from airflow.operators.dummy_operator import DummyOperator
 from airflow.operators import (StageToRedshiftOperator, LoadFactOperator,
-                                LoadDimensionOperator, DataQualityOperator)
+                                LoadDimensionOperator, DataQualityOperator,
+                                DropStagingOperator)
 from helpers import SqlQueries
 
+# Number of hours that one run of the backfill DAG loads, the song data is staged once per window
+BACKFILL_WINDOW_HOURS = 24
+
 # AWS_KEY = os.environ.get('AWS_KEY')
 # AWS_SECRET = os.environ.get('AWS_SECRET')
 
 default_args = {
     'owner': 'TCACastelijns',
-    'start_date': datetime(2019, 1, 12),
+    'start_date': datetime(2018, 11, 1),
+    'end_date': datetime(2018, 11, 30, 23),
     'depends_on_past': False,
     'retries': 3,
     'retry_delay': timedelta(seconds=300),
@@ -19,106 +24,161 @@ default_args = {
     'email_on_retry': False
 }
 
-dag = DAG('sparkify-songplays-analysis',
-          default_args=default_args,
-          description='Load and transform data for analysing the Music history of Sparkify in Redshift with Airflow',
-          schedule_interval='0 * * * *',
-          max_active_runs=3
-        )
-
-start_operator = DummyOperator(task_id='Begin_execution',  dag=dag)
-
-stage_events_to_redshift = StageToRedshiftOperator(
-    task_id='Stage_events',
-    dag=dag,
-    table="staging_events",
-    redshift_conn_id="redshift",
-    aws_credentials_id="aws_credentials",
-    s3_bucket="udacity-dend",
-    s3_key="log_data",
-    json_path="s3://udacity-dend/log_json_path.json",
-    region='us-west-2'
-)
-
-stage_songs_to_redshift = StageToRedshiftOperator(
-    task_id='Stage_songs',
-    dag=dag,
-    table="staging_songs",
-    redshift_conn_id="redshift",
-    aws_credentials_id="aws_credentials",
-    s3_bucket="udacity-dend",
-    s3_key="song_data",
-    json_path="auto",
-    region='us-west-2'
-)
-
-load_songplays_table = LoadFactOperator(
-    task_id='Load_songplays_fact_table',
-    dag=dag,
-    redshift_conn_id="redshift",
-    table="songplays",
-    sql_query=SqlQueries.songplay_table_insert
-)
-
-load_user_dimension_table = LoadDimensionOperator(
-    task_id='Load_user_dim_table',
-    dag=dag,
-    redshift_conn_id="redshift",
-    table="users",
-    truncate=True,
-    sql_query=SqlQueries.user_table_insert
-)
-
-load_song_dimension_table = LoadDimensionOperator(
-    task_id='Load_song_dim_table',
-    dag=dag,
-    redshift_conn_id="redshift",
-    table="songs",
-    truncate=True,
-    sql_query=SqlQueries.song_table_insert
-)
-
-load_artist_dimension_table = LoadDimensionOperator(
-    task_id='Load_artist_dim_table',
-    dag=dag,
-    redshift_conn_id="redshift",
-    table="artists",
-    truncate=True,
-    sql_query=SqlQueries.artist_table_insert
-)
-
-load_time_dimension_table = LoadDimensionOperator(
-    task_id='Load_time_dim_table',
-    dag=dag,
-    redshift_conn_id="redshift",
-    table="time",
-    truncate=True,
-    sql_query=SqlQueries.time_table_insert
-)
-
-run_quality_checks = DataQualityOperator(
-    task_id='Run_data_quality_checks',
-    dag=dag,
-    redshift_conn_id="redshift",
-    table_list=["songplays", "users", "songs", "artists", "time"],
-)
-
-end_operator = DummyOperator(task_id='Stop_execution',  dag=dag)
-
-# Dependencies
-start_operator >> stage_events_to_redshift
-start_operator >> stage_songs_to_redshift
-stage_events_to_redshift >> load_songplays_table
-stage_songs_to_redshift >> load_songplays_table
-
-load_songplays_table >> load_user_dimension_table
-load_songplays_table >> load_song_dimension_table
-load_songplays_table >> load_artist_dimension_table
-load_songplays_table >> load_time_dimension_table
-
-load_user_dimension_table >> run_quality_checks
-load_song_dimension_table >> run_quality_checks
-load_artist_dimension_table >> run_quality_checks
-load_time_dimension_table >> run_quality_checks
-
-run_quality_checks >> end_operator
\ No newline at end of file
+# Every DAG run stages into its own copies of these tables, so concurrent runs can backfill in parallel
+STAGING_TABLES = ["staging_events", "staging_songs"]
+
+
+def create_dag(dag_id, schedule_interval, backfill_hours, description):
+    """
+    Method to create a DAG that loads one window of `backfill_hours` hours per run
+
+    :param (str) dag_id: id of the DAG
+    :param schedule_interval: cron expression or timedelta, the length of the window
+    :param (int) backfill_hours: number of hours loaded by one run
+    :param (str) description: description of the DAG
+    :return Airflow DAG
+    """
+    dag = DAG(dag_id,
+              default_args=default_args,
+              description=description,
+              schedule_interval=schedule_interval,
+              max_active_runs=3
+            )
+
+    start_operator = DummyOperator(task_id='Begin_execution',  dag=dag)
+
+    stage_events_to_redshift = StageToRedshiftOperator(
+        task_id='Stage_events',
+        dag=dag,
+        table="staging_events",
+        redshift_conn_id="redshift",
+        aws_credentials_id="aws_credentials",
+        s3_bucket="udacity-dend",
+        s3_key="log_data/{execution_date:%Y/%m/%Y-%m-%d}-events.json",
+        json_path="s3://udacity-dend/log_json_path.json",
+        region='us-west-2',
+        run_scoped=True,
+        backfill_hours=backfill_hours,
+        window_column='ts'
+    )
+
+    stage_songs_to_redshift = StageToRedshiftOperator(
+        task_id='Stage_songs',
+        dag=dag,
+        table="staging_songs",
+        redshift_conn_id="redshift",
+        aws_credentials_id="aws_credentials",
+        s3_bucket="udacity-dend",
+        s3_key="song_data",
+        json_path="auto",
+        region='us-west-2',
+        run_scoped=True,
+        backfill_hours=backfill_hours
+    )
+
+    load_songplays_table = LoadFactOperator(
+        task_id='Load_songplays_fact_table',
+        dag=dag,
+        redshift_conn_id="redshift",
+        table="songplays",
+        staging_tables=STAGING_TABLES,
+        sql_query=SqlQueries.songplay_table_insert
+    )
+
+    load_user_dimension_table = LoadDimensionOperator(
+        task_id='Load_user_dim_table',
+        dag=dag,
+        redshift_conn_id="redshift",
+        table="users",
+        truncate=False,
+        staging_tables=STAGING_TABLES,
+        delete_query=SqlQueries.user_table_delete,
+        sql_query=SqlQueries.user_table_insert
+    )
+
+    load_song_dimension_table = LoadDimensionOperator(
+        task_id='Load_song_dim_table',
+        dag=dag,
+        redshift_conn_id="redshift",
+        table="songs",
+        truncate=False,
+        staging_tables=STAGING_TABLES,
+        sql_query=SqlQueries.song_table_insert
+    )
+
+    load_artist_dimension_table = LoadDimensionOperator(
+        task_id='Load_artist_dim_table',
+        dag=dag,
+        redshift_conn_id="redshift",
+        table="artists",
+        truncate=False,
+        staging_tables=STAGING_TABLES,
+        sql_query=SqlQueries.artist_table_insert
+    )
+
+    load_time_dimension_table = LoadDimensionOperator(
+        task_id='Load_time_dim_table',
+        dag=dag,
+        redshift_conn_id="redshift",
+        table="time",
+        truncate=False,
+        staging_tables=STAGING_TABLES,
+        sql_query=SqlQueries.time_table_insert
+    )
+
+    run_quality_checks = DataQualityOperator(
+        task_id='Run_data_quality_checks',
+        dag=dag,
+        redshift_conn_id="redshift",
+        table_list=["songplays", "users", "songs", "artists", "time"],
+        checks=[
+            {'table': 'songplays', 'check': 'null_count', 'column': 'start_time', 'expected': 0},
+            {'table': 'songplays', 'check': 'null_count', 'column': 'userid', 'expected': 0},
+            {'table': 'songplays', 'check': 'orphan_count', 'column': 'start_time', 'ref_table': 'time', 'ref_column': 'start_time', 'expected': 0},
+            {'table': 'songs', 'check': 'duplicate_count', 'column': 'songid', 'max': 0},
+            {'table': 'songs', 'check': 'null_count', 'column': 'songid', 'expected': 0},
+            {'table': 'artists', 'check': 'null_count', 'column': 'artistid', 'expected': 0},
+            {'table': 'time', 'check': 'duplicate_count', 'column': 'start_time', 'expected': 0},
+        ],
+        max_connections=4,
+        results_table="data_quality_results"
+    )
+
+    drop_staging_tables = DropStagingOperator(
+        task_id='Drop_staging_tables',
+        dag=dag,
+        redshift_conn_id="redshift",
+        staging_tables=STAGING_TABLES,
+        policy='on_success'
+    )
+
+    end_operator = DummyOperator(task_id='Stop_execution',  dag=dag)
+
+    # Dependencies
+    start_operator >> stage_events_to_redshift
+    start_operator >> stage_songs_to_redshift
+    stage_events_to_redshift >> load_songplays_table
+    stage_songs_to_redshift >> load_songplays_table
+
+    load_songplays_table >> load_user_dimension_table
+    load_songplays_table >> load_song_dimension_table
+    load_songplays_table >> load_artist_dimension_table
+    load_songplays_table >> load_time_dimension_table
+
+    load_user_dimension_table >> run_quality_checks
+    load_song_dimension_table >> run_quality_checks
+    load_artist_dimension_table >> run_quality_checks
+    load_time_dimension_table >> run_quality_checks
+
+    run_quality_checks >> drop_staging_tables
+    drop_staging_tables >> end_operator
+
+    return dag
+
+
+dag = create_dag('sparkify-songplays-analysis', '0 * * * *', 1,
+                 'Load and transform data for analysing the Music history of Sparkify in Redshift with Airflow')
+
+# Same tasks with a fixed window of a day per run, to catch up a range of hours with `airflow backfill`
+backfill_dag = create_dag('sparkify-songplays-backfill', timedelta(hours=BACKFILL_WINDOW_HOURS), BACKFILL_WINDOW_HOURS,
+                          f'Backfill the Sparkify songplays in windows of {BACKFILL_WINDOW_HOURS} hours')
@@ -1,5 +1,16 @@
 from helpers.sql_queries import SqlQueries
+from helpers import prestage
+from helpers.backfill import backfill_window, render_hourly_keys, window_epoch_ms
+from helpers.staging import run_scoped_table, scope_query
+from helpers.telemetry import SqlTelemetry
 
 __all__ = [
     'SqlQueries',
-]
\ No newline at end of file
+    'prestage',
+    'backfill_window',
+    'render_hourly_keys',
+    'window_epoch_ms',
+    'run_scoped_table',
+    'scope_query',
+    'SqlTelemetry',
+]
@@ -0,0 +1,49 @@
+import calendar
+from datetime import timedelta
+
+
+def backfill_window(context, hours):
+    """
+    Method to get the hours that are covered by one DAG run
+
+    :param context: Airflow task context
+    :param (int) hours: number of hours covered by the run, starting at the execution date
+    :return list of datetimes, one per hour
+    """
+    start = context['execution_date']
+    return [start + timedelta(hours=k) for k in range(max(int(hours), 1))]
+
+
+def window_epoch_ms(context, hours):
+    """
+    Method to get the bounds of the backfill window in epoch milliseconds, like the `ts` of the log data
+
+    :param context: Airflow task context
+    :param (int) hours: number of hours covered by the run
+    :return tuple with the start (inclusive) and the end (exclusive) of the window
+    """
+    window = backfill_window(context, hours)
+    end = window[-1] + timedelta(hours=1)
+    return tuple(calendar.timegm(hour.utctimetuple()) * 1000 for hour in (window[0], end))
+
+
+def render_hourly_keys(s3_key, context, hours):
+    """
+    Method to render the S3 key (prefix) of every hour in the backfill window
+
+    :param (str) s3_key: key with `str.format` placeholders, e.g. `log_data/{execution_date:%Y/%m/%Y-%m-%d}`
+    :param context: Airflow task context
+    :param (int) hours: number of hours covered by the run
+    :return list of unique keys in chronological order
+    """
+    keys = []
+    for hour in backfill_window(context, hours):
+        hour_context = dict(context,
+                            execution_date=hour,
+                            ds=hour.strftime('%Y-%m-%d'),
+                            ts=hour.isoformat(),
+                            ts_nodash=hour.strftime('%Y%m%dT%H%M%S'))
+        key = s3_key.format(**hour_context)
+        if key not in keys:
+            keys.append(key)
+    return keys
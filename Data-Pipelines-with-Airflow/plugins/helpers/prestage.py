@@ -0,0 +1,177 @@
+import csv
+import gzip
+import io
+import json
+import re
+from decimal import Decimal
+
+FORMATS = ('json', 'csv', 'parquet')
+COMPRESSIONS = (None, 'gzip', 'zstd')
+
+# Query to get the column layout of a (staging) table, works on Redshift and Postgres
+columns_sql = """
+    SELECT column_name, data_type, character_maximum_length, numeric_precision, numeric_scale
+    FROM information_schema.columns
+    WHERE table_name = '{}'
+    ORDER BY ordinal_position
+"""
+
+# Top-level key of a jsonpaths expression in bracket (`$['key']`) or dot (`$.key`) notation
+JSONPATH_KEY = re.compile(r"\$(?:\[['\"]?([^'\"\]]+)['\"]?\]|\.(\w+))")
+
+
+def file_extension(data_format, compression=None):
+    """
+    Method to get the file extension of a staging file
+
+    :param (str) data_format: one of `FORMATS`
+    :param (str) compression: one of `COMPRESSIONS`
+    :return file extension, e.g. `.csv.gz`
+    """
+    extension = f".{data_format}"
+    if data_format != 'parquet' and compression:
+        extension += {'gzip': '.gz', 'zstd': '.zst'}[compression]
+    return extension
+
+
+def jsonpaths_keys(jsonpaths_document):
+    """
+    Method to get the JSON keys of a jsonpaths file in column order
+
+    :param (str) jsonpaths_document: content of a jsonpaths file
+    :return list of keys
+    """
+    keys = []
+    for path in json.loads(jsonpaths_document)['jsonpaths']:
+        match = JSONPATH_KEY.match(path)
+        if not match:
+            raise ValueError(f"Unsupported jsonpaths expression {path}")
+        keys.append(match.group(1) or match.group(2))
+    return keys
+
+
+def read_json_records(document):
+    """
+    Method to read the JSON objects of a raw file with one or more objects per line
+
+    :param (str) document: content of the file
+    :return generator of dictionaries
+    """
+    for line in document.splitlines():
+        if line.strip():
+            yield json.loads(line)
+
+
+def to_rows(records, columns, keys=None):
+    """
+    Method to map JSON records onto the columns of a table, like COPY does with a jsonpaths file or 'auto'
+
+    :param records: iterable of dictionaries
+    :param (list) columns: column tuples as returned by `columns_sql`
+    :param (list) keys: JSON keys in column order, None to match keys on column name ('auto')
+    :return generator of lists with the values converted to the column types
+    """
+    for record in records:
+        if keys is None:
+            lowered = {k.lower(): v for k, v in record.items()}
+            values = [lowered.get(column[0]) for column in columns]
+        else:
+            values = [record.get(key) for key in keys]
+        yield [convert(value, column) for value, column in zip(values, columns)]
+
+
+def convert(value, column):
+    """
+    Method to convert a JSON value to the type of a column (TRUNCATECOLUMNS BLANKSASNULL EMPTYASNULL)
+
+    :param value: JSON value
+    :param (tuple) column: column tuple as returned by `columns_sql`
+    :return converted value
+    """
+    name, data_type, max_length, precision, scale = column
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    if data_type in ('integer', 'bigint', 'smallint'):
+        return int(value)
+    if data_type == 'numeric':
+        return Decimal(str(float(value))).quantize(Decimal(1).scaleb(-(scale or 0)))
+    if data_type in ('double precision', 'real'):
+        return float(value)
+    value = str(value)
+    return value[:max_length] if max_length else value
+
+
+def compress(data, compression):
+    """
+    Method to compress the content of a staging file
+
+    :param (bytes) data: uncompressed content
+    :param (str) compression: one of `COMPRESSIONS`
+    :return compressed content
+    """
+    if compression == 'gzip':
+        return gzip.compress(data)
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("zstd compression needs the `zstandard` package")
+        return zstandard.ZstdCompressor().compress(data)
+    return data
+
+
+def encode(rows, columns, data_format, compression=None):
+    """
+    Method to write rows as the content of a staging file
+
+    :param (list) rows: lists of converted values in column order
+    :param (list) columns: column tuples as returned by `columns_sql`
+    :param (str) data_format: one of `FORMATS`
+    :param (str) compression: one of `COMPRESSIONS`, Parquet is always compressed with snappy
+    :return content of the file
+    """
+    names = [column[0] for column in columns]
+    if data_format == 'json':
+        lines = (json.dumps(dict(zip(names, row)), default=float) + '\n' for row in rows)
+        return compress(''.join(lines).encode('utf8'), compression)
+    if data_format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(names)
+        writer.writerows(rows)
+        return compress(buffer.getvalue().encode('utf8'), compression)
+    if data_format == 'parquet':
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Parquet staging files need the `pyarrow` package")
+        types = {'integer': pa.int32(), 'smallint': pa.int16(), 'bigint': pa.int64(),
+                 'double precision': pa.float64(), 'real': pa.float32()}
+        schema = pa.schema([(name, pa.decimal128(precision or 38, scale or 0) if data_type == 'numeric'
+                             else types.get(data_type, pa.string()))
+                            for name, data_type, _, precision, scale in columns])
+        table = pa.Table.from_arrays([pa.array([row[k] for row in rows], type=field.type)
+                                      for k, field in enumerate(schema)], schema=schema)
+        buffer = io.BytesIO()
+        pq.write_table(table, buffer, compression='snappy')
+        return buffer.getvalue()
+    raise ValueError(f"Unknown staging format '{data_format}', use one of {FORMATS}")
+
+
+def chunks(rows, rows_per_file):
+    """
+    Method to split rows into lists of at most `rows_per_file` rows
+
+    :param rows: iterable of rows
+    :param (int) rows_per_file: maximum number of rows per chunk
+    :return generator of lists of rows
+    """
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= rows_per_file:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -19,28 +19,58 @@ class SqlQueries:
                 AND events.length = songs.duration
     """)
 
+    # Upsert of the users: the users of the staged events are deleted and inserted again with their latest level
+    user_table_delete = ("""
+        DELETE FROM users
+        USING staging_events
+        WHERE users.userid = staging_events.userid
+        AND staging_events.page='NextSong'
+    """)
+
     user_table_insert = ("""
-        SELECT distinct userid, firstname, lastname, gender, level
-        FROM staging_events
-        WHERE page='NextSong' 
-        AND userid IS NOT NULL
+        SELECT events.userid, events.firstname, events.lastname, events.gender, events.level
+        FROM (SELECT userid, firstname, lastname, gender, level,
+                     ROW_NUMBER() OVER (PARTITION BY userid ORDER BY ts DESC) AS row_num
+            FROM staging_events
+            WHERE page='NextSong'
+            AND userid IS NOT NULL) events
+        WHERE events.row_num = 1
     """)
 
     song_table_insert = ("""
-        SELECT distinct song_id, title, artist_id, year, duration
-        FROM staging_songs
-        WHERE song_id IS NOT NULL
+        SELECT new_songs.song_id, new_songs.title, new_songs.artist_id, new_songs.year, new_songs.duration
+        FROM (SELECT song_id, title, artist_id, year, duration,
+                     ROW_NUMBER() OVER (PARTITION BY song_id ORDER BY title) AS row_num
+            FROM staging_songs
+            WHERE song_id IS NOT NULL) new_songs
+            LEFT JOIN songs
+            ON new_songs.song_id = songs.songid
+        WHERE new_songs.row_num = 1
+        AND songs.songid IS NULL
     """)
 
     artist_table_insert = ("""
-        SELECT distinct artist_id, artist_name, artist_location, artist_latitude, artist_longitude
-        FROM staging_songs
-        WHERE artist_id IS NOT NULL
+        SELECT new_artists.artist_id, new_artists.artist_name, new_artists.artist_location,
+               new_artists.artist_latitude, new_artists.artist_longitude
+        FROM (SELECT artist_id, artist_name, artist_location, artist_latitude, artist_longitude,
+                     ROW_NUMBER() OVER (PARTITION BY artist_id ORDER BY artist_name) AS row_num
+            FROM staging_songs
+            WHERE artist_id IS NOT NULL) new_artists
+            LEFT JOIN artists
+            ON new_artists.artist_id = artists.artistid
+        WHERE new_artists.row_num = 1
+        AND artists.artistid IS NULL
     """)
 
     time_table_insert = ("""
-        SELECT start_time, extract(hour from start_time), extract(day from start_time), extract(week from start_time), 
-               extract(month from start_time), extract(year from start_time), extract(dayofweek from start_time)
-        FROM songplays
-        WHERE start_time IS NOT NULL
+        SELECT events.start_time, extract(hour from events.start_time), extract(day from events.start_time),
+               extract(week from events.start_time), extract(month from events.start_time),
+               extract(year from events.start_time), extract(dayofweek from events.start_time)
+        FROM (SELECT DISTINCT TIMESTAMP 'epoch' + ts/1000 * interval '1 second' AS start_time
+            FROM staging_events
+            WHERE page='NextSong'
+            AND ts IS NOT NULL) events
+            LEFT JOIN time
+            ON events.start_time = time.start_time
+        WHERE time.start_time IS NULL
     """)
\ No newline at end of file
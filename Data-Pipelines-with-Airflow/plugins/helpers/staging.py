@@ -0,0 +1,26 @@
+import re
+
+
+def run_scoped_table(table, context):
+    """
+    Method to get the name of the staging table of one DAG run
+
+    :param (str) table: name of the template staging table (e.g. `staging_events`)
+    :param context: Airflow task context
+    :return name of the run-scoped staging table (e.g. `staging_events_20190112t000000`)
+    """
+    return f"{table}_{context['ts_nodash']}".lower()
+
+
+def scope_query(sql_query, staging_tables, context):
+    """
+    Method to point a query at the run-scoped copies of the staging tables
+
+    :param (str) sql_query: query that selects from the template staging tables
+    :param (list) staging_tables: names of the template staging tables
+    :param context: Airflow task context
+    :return query selecting from the run-scoped staging tables
+    """
+    for table in staging_tables:
+        sql_query = re.sub(rf"\b{table}\b", run_scoped_table(table, context), sql_query)
+    return sql_query
@@ -0,0 +1,140 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+# Local file where every task appends its metrics as one JSON line
+DEFAULT_METRICS_PATH = os.environ.get('SPARKIFY_METRICS_PATH',
+                                      os.path.join(os.path.expanduser('~'), 'airflow', 'sparkify_metrics.jsonl'))
+
+
+class SqlTelemetry:
+    """
+    Runs the SQL statements of an operator and records the duration, the number of affected rows
+    and, for COPY statements, the number of files and bytes that were loaded.
+    """
+
+    # Only available on Redshift, the statement runs in the same session as the COPY
+    copy_stats_sql = """
+        SELECT pg_last_copy_count(), COUNT(DISTINCT name), COALESCE(SUM(bytes), 0)
+        FROM stl_file_scan
+        WHERE query = pg_last_copy_id()
+    """
+
+    def __init__(self, hook, task_id, metrics_path=DEFAULT_METRICS_PATH):
+        self.hook = hook
+        self.task_id = task_id
+        self.metrics_path = metrics_path
+        self.statements = []
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def _record(self, label, sql, start, rows, **extra):
+        statement = {'label': label or sql.strip().split()[0].upper(),
+                     'duration_s': round(time.time() - start, 3),
+                     'rows': rows}
+        statement.update(extra)
+        with self._lock:
+            self.statements.append(statement)
+        return statement
+
+    def record(self, label, start, rows, **extra):
+        """
+        Method to record a step of an operator that does not run SQL
+
+        :param (str) label: name of the step in the metrics
+        :param (float) start: start time of the step (time.time())
+        :param (int) rows: number of rows processed by the step
+        :return dictionary with the metrics of the step
+        """
+        return self._record(label, label, start, rows, **extra)
+
+    @staticmethod
+    def _copy_stats(cur):
+        """
+        Method to get the loaded rows, files and bytes of the last COPY in the session
+
+        :param cur: psycopg2 cursor object on the connection that ran the COPY
+        :return dictionary with the COPY statistics, empty if the system tables are not available
+        """
+        try:
+            cur.execute(SqlTelemetry.copy_stats_sql)
+            rows, files, num_bytes = cur.fetchone()
+        except Exception:
+            cur.connection.rollback()
+            return {}
+        return {'copy_rows': int(rows), 'files': int(files), 'bytes': int(num_bytes)}
+
+    def run(self, sql, label=None, copy_stats=False):
+        """
+        Method to run and commit a statement while recording its duration and affected rows
+
+        :param (str) sql: SQL statement
+        :param (str) label: name of the statement in the metrics, defaults to the SQL command
+        :param (bool) copy_stats: True to look up the file and byte counts of a COPY statement
+        :return number of affected rows
+        """
+        conn = self.hook.get_conn()
+        try:
+            cur = conn.cursor()
+            start = time.time()
+            cur.execute(sql)
+            rows = cur.rowcount
+            conn.commit()
+            extra = SqlTelemetry._copy_stats(cur) if copy_stats else {}
+            if rows < 0 and 'copy_rows' in extra:
+                rows = extra['copy_rows']
+            self._record(label, sql, start, rows, **extra)
+            return rows
+        finally:
+            conn.close()
+
+    def get_first(self, sql, label=None):
+        """
+        Method to run a query while recording its duration
+
+        :param (str) sql: SQL query
+        :param (str) label: name of the query in the metrics, defaults to the SQL command
+        :return first record of the result
+        """
+        start = time.time()
+        record = self.hook.get_first(sql)
+        self._record(label, sql, start, 1 if record else 0)
+        return record
+
+    def publish(self, context, log=None):
+        """
+        Method to push the metrics of the task to XCom and append them to the local metrics sink
+
+        :param context: Airflow task context
+        :param log: logger of the operator
+        :return dictionary with the metrics of the task
+        """
+        metrics = {
+            'dag_id': context['dag'].dag_id if context.get('dag') else None,
+            'task_id': self.task_id,
+            'run_id': context.get('run_id'),
+            'execution_date': str(context.get('execution_date')),
+            'recorded_at': datetime.utcnow().isoformat(),
+            'duration_s': round(time.time() - self.started, 3),
+            'rows': sum(s['rows'] for s in self.statements if s['rows'] and s['rows'] > 0),
+            'bytes': sum(s.get('bytes', 0) for s in self.statements),
+            'statements': self.statements
+        }
+        if log:
+            for s in self.statements:
+                log.info(f"{s['label']} took {s['duration_s']}s and affected {s['rows']} rows")
+
+        if context.get('ti'):
+            context['ti'].xcom_push(key='metrics', value=metrics)
+
+        if self.metrics_path:
+            try:
+                os.makedirs(os.path.dirname(self.metrics_path) or '.', exist_ok=True)
+                with open(self.metrics_path, 'a') as f:
+                    f.write(json.dumps(metrics) + '\n')
+            except OSError as e:
+                if log:
+                    log.warning(f"Could not write metrics to {self.metrics_path}: {e}")
+        return metrics
@@ -2,10 +2,12 @@ from operators.stage_redshift import StageToRedshiftOperator
 from operators.load_fact import LoadFactOperator
 from operators.load_dimension import LoadDimensionOperator
 from operators.data_quality import DataQualityOperator
+from operators.drop_staging import DropStagingOperator
 
 __all__ = [
     'StageToRedshiftOperator',
     'LoadFactOperator',
     'LoadDimensionOperator',
-    'DataQualityOperator'
+    'DataQualityOperator',
+    'DropStagingOperator'
 ]
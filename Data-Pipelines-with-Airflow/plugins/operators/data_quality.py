@@ -1,33 +1,181 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
 from airflow.hooks.postgres_hook import PostgresHook
 from airflow.models import BaseOperator
 from airflow.utils.decorators import apply_defaults
+from helpers import SqlTelemetry
 
 class DataQualityOperator(BaseOperator):
+    """
+    Runs declarative data quality checks against Redshift.
+
+    Every check is a dictionary with a `table`, a `check` type and the expected outcome,
+    either as an exact `expected` value or as a `min` and/or `max` range:
+        - row_count:       {'table': 'songs', 'check': 'row_count', 'min': 1}
+        - null_count:      {'table': 'users', 'check': 'null_count', 'column': 'userid', 'expected': 0}
+        - duplicate_count: {'table': 'songs', 'check': 'duplicate_count', 'column': 'songid', 'expected': 0}
+        - orphan_count:    {'table': 'songplays', 'check': 'orphan_count', 'column': 'userid',
+                            'ref_table': 'users', 'ref_column': 'userid', 'expected': 0}
+
+    All checks on the same table are compiled into one aggregate query and the tables
+    are checked concurrently by at most `max_connections` threads. Every table query opens
+    and closes its own connection, so at most `max_connections` connections are open at a time.
+    """
 
     ui_color = '#89DA59'
 
+    insert_result_sql = """
+        INSERT INTO {} (run_id, checked_at, table_name, check_name, column_name, result, expected, passed)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """
+
     @apply_defaults
     def __init__(self,
                  redshift_conn_id="",
                  table_list=[],
+                 checks=[],
+                 max_connections=4,
+                 results_table=None,
                  *args, **kwargs):
 
         super(DataQualityOperator, self).__init__(*args, **kwargs)
         self.redshift_conn_id = redshift_conn_id
         self.table_list = table_list
+        self.checks = checks
+        self.max_connections = max_connections
+        self.results_table = results_table
 
-    def execute(self, context):
+    def get_checks(self):
+        """
+        Method to combine the declared checks with a non-empty check for every table in `table_list`
+
+        :return list of check dictionaries
+        """
+        return [{'table': table, 'check': 'row_count', 'min': 1} for table in self.table_list] + list(self.checks)
+
+    @staticmethod
+    def compile_checks(table, checks):
+        """
+        Method to compile all checks of one table into a single aggregate query. The counts are 0
+        on an empty table, only a `row_count` check fails on it.
+
+        :param (str) table: table that is checked
+        :param (list) checks: check dictionaries of this table
+        :return SQL query returning one column per check
+        """
+        columns = []
+        joins = []
+        for k, check in enumerate(checks):
+            kind = check['check']
+            column = check.get('column')
+            if kind == 'row_count':
+                columns.append("COUNT(*)")
+            elif kind == 'null_count':
+                columns.append(f"COALESCE(SUM(CASE WHEN t.{column} IS NULL THEN 1 ELSE 0 END), 0)")
+            elif kind == 'duplicate_count':
+                columns.append(f"COUNT(t.{column}) - COUNT(DISTINCT t.{column})")
+            elif kind == 'orphan_count':
+                ref = f"ref_{k}"
+                joins.append(f"LEFT JOIN (SELECT DISTINCT {check['ref_column']} AS ref_key FROM {check['ref_table']}) {ref} "
+                             f"ON t.{column} = {ref}.ref_key")
+                columns.append(f"COALESCE(SUM(CASE WHEN t.{column} IS NOT NULL AND {ref}.ref_key IS NULL THEN 1 ELSE 0 END), 0)")
+            else:
+                raise ValueError(f"Unknown data quality check '{kind}' on table {table}")
+
+        return "SELECT {} FROM {} t {}".format(", ".join(columns), table, " ".join(joins))
+
+    @staticmethod
+    def evaluate(check, result):
+        """
+        Method to compare the outcome of a check with its expected value or range
+
+        :param (dict) check: check dictionary
+        :param result: outcome of the check query
+        :return True if the check passed, else False
         """
-        Method to check the Data Quality of different steps in ETL. 
+        if result is None:
+            return False
+        if 'expected' in check and result != check['expected']:
+            return False
+        if 'min' in check and result < check['min']:
+            return False
+        if 'max' in check and result > check['max']:
+            return False
+        return True
+
+    def run_table_checks(self, telemetry, table, checks):
+        """
+        Method to run all checks of one table in a single round trip.
+
+        :param telemetry: SqlTelemetry object that records the duration of the query
+        :param (str) table: table that is checked
+        :param (list) checks: check dictionaries of this table
+        :return list of result dictionaries
+        """
+        record = telemetry.get_first(DataQualityOperator.compile_checks(table, checks), label=f"CHECK {table}")
+        if not record or len(record) != len(checks):
+            raise ValueError(f"Data quality check failed. {table} returned no results")
+
+        results = []
+        for check, value in zip(checks, record):
+            value = None if value is None else int(value)
+            expected = check.get('expected', [check.get('min'), check.get('max')])
+            results.append({
+                'table': table,
+                'check': check['check'],
+                'column': check.get('column'),
+                'result': value,
+                'expected': str(expected),
+                'passed': DataQualityOperator.evaluate(check, value)
+            })
+        return results
+
+    def store_results(self, context, results):
+        """
+        Method to write the check results to the `results_table` in Redshift
+
+        :param context: Airflow task context
+        :param (list) results: result dictionaries
         """
         redshift_hook = PostgresHook(self.redshift_conn_id)
-        
-        for table in self.table_list:
-            records = redshift_hook.get_records(f"SELECT COUNT(*) FROM {table}")
-            if len(records) < 1 or len(records[0]) < 1:
-                raise ValueError(f"Data quality check failed. {table} returned no results")
-            num_records = records[0][0]
-            if num_records < 1:
-                raise ValueError(f"Data quality check failed. {table} contained 0 rows")
-            self.log.info(f"Data quality on table {table} check passed with {records[0][0]} records")
-    
\ No newline at end of file
+        conn = redshift_hook.get_conn()
+        try:
+            cur = conn.cursor()
+            checked_at = datetime.utcnow()
+            for result in results:
+                cur.execute(DataQualityOperator.insert_result_sql.format(self.results_table),
+                            (context.get('run_id'), checked_at, result['table'], result['check'], result['column'],
+                             result['result'], result['expected'], result['passed']))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def execute(self, context):
+        """
+        Method to check the Data Quality of different steps in ETL.
+        """
+        telemetry = SqlTelemetry(PostgresHook(self.redshift_conn_id), self.task_id)
+        checks_per_table = OrderedDict()
+        for check in self.get_checks():
+            checks_per_table.setdefault(check['table'], []).append(check)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_connections, len(checks_per_table)))) as pool:
+            futures = [pool.submit(self.run_table_checks, telemetry, table, checks) for table, checks in checks_per_table.items()]
+            results = [result for future in futures for result in future.result()]
+
+        for result in results:
+            self.log.info("Data quality check {check} on {table} {column}: {result} (expected {expected}) -> {status}"
+                          .format(status='passed' if result['passed'] else 'FAILED', **result))
+
+        context['ti'].xcom_push(key='data_quality_results', value=results)
+        if self.results_table:
+            self.store_results(context, results)
+        telemetry.publish(context, self.log)
+
+        failed = [result for result in results if not result['passed']]
+        if failed:
+            raise ValueError("Data quality check failed. {}".format(
+                ", ".join(f"{r['check']} on {r['table']} returned {r['result']}" for r in failed)))
+        self.log.info(f"Data quality checks passed on tables {', '.join(checks_per_table)}")
@@ -0,0 +1,49 @@
+from airflow.hooks.postgres_hook import PostgresHook
+from airflow.models import BaseOperator
+from airflow.utils.decorators import apply_defaults
+from airflow.utils.trigger_rule import TriggerRule
+from helpers import run_scoped_table
+
+class DropStagingOperator(BaseOperator):
+    """
+    Drops the run-scoped staging tables of a DAG run according to a policy:
+        - 'always':     drop the tables when the upstream tasks are done, also after a failure
+        - 'on_success': drop the tables only when all upstream tasks succeeded (keeps them for debugging)
+        - 'never':      keep the tables
+    """
+
+    ui_color = '#D8D8D8'
+
+    policies = ('always', 'on_success', 'never')
+
+    @apply_defaults
+    def __init__(self,
+                 redshift_conn_id="",
+                 staging_tables=[],
+                 policy='on_success',
+                 *args, **kwargs):
+
+        if policy not in DropStagingOperator.policies:
+            raise ValueError(f"Unknown drop policy '{policy}', use one of {DropStagingOperator.policies}")
+        if policy == 'always':
+            kwargs['trigger_rule'] = TriggerRule.ALL_DONE
+
+        super(DropStagingOperator, self).__init__(*args, **kwargs)
+        self.redshift_conn_id = redshift_conn_id
+        self.staging_tables = staging_tables
+        self.policy = policy
+
+    def execute(self, context):
+        """
+        Method to drop the run-scoped copies of the staging tables.
+        """
+        if self.policy == 'never':
+            self.log.info("Keeping the run-scoped staging tables")
+            return
+
+        redshift = PostgresHook(postgres_conn_id=self.redshift_conn_id)
+
+        for table in self.staging_tables:
+            scoped_table = run_scoped_table(table, context)
+            self.log.info(f"Dropping run-scoped staging table {scoped_table}")
+            redshift.run(f"DROP TABLE IF EXISTS {scoped_table}")
@@ -1,6 +1,7 @@
 from airflow.hooks.postgres_hook import PostgresHook
 from airflow.models import BaseOperator
 from airflow.utils.decorators import apply_defaults
+from helpers import scope_query, SqlTelemetry
 
 class LoadDimensionOperator(BaseOperator):
 
@@ -11,26 +12,37 @@ class LoadDimensionOperator(BaseOperator):
                  redshift_conn_id="",
                  table="",
                  sql_query="",
+                 staging_tables=[],
                  truncate = False,
+                 delete_query="",
                  *args, **kwargs):
 
         super(LoadDimensionOperator, self).__init__(*args, **kwargs)
         self.redshift_conn_id = redshift_conn_id
         self.table = table
         self.sql_query = sql_query
+        self.staging_tables = staging_tables
         self.truncate = truncate
+        self.delete_query = delete_query
         
 
     def execute(self, context):
         """
         Method to insert data into dimensional tables from the staging phase (events and songs).
+        The template tables in `staging_tables` are replaced by the run-scoped staging tables of this DAG run.
+        A `delete_query` runs in the same transaction as the insert, to replace the rows of existing keys (upsert).
         """
         
         redshift = PostgresHook(postgres_conn_id=self.redshift_conn_id)
+        telemetry = SqlTelemetry(redshift, self.task_id)
         
         if self.truncate:
             self.log.info("Clearing data from destination Redshift table")
-            redshift.run(f"TRUNCATE TABLE {self.table}")
+            telemetry.run(f"TRUNCATE TABLE {self.table}")
                 
         self.log.info("Inserting data into destination Redshift table")
-        redshift.run(f"INSERT INTO {self.table} {self.sql_query}")
+        sql_query = f"INSERT INTO {self.table} {scope_query(self.sql_query, self.staging_tables, context)}"
+        if self.delete_query:
+            sql_query = f"{scope_query(self.delete_query, self.staging_tables, context)};\n{sql_query}"
+        telemetry.run(sql_query, label='UPSERT' if self.delete_query else None)
+        telemetry.publish(context, self.log)
@@ -1,6 +1,7 @@
 from airflow.hooks.postgres_hook import PostgresHook
 from airflow.models import BaseOperator
 from airflow.utils.decorators import apply_defaults
+from helpers import scope_query, SqlTelemetry
 
 class LoadFactOperator(BaseOperator):
 
@@ -11,19 +12,25 @@ class LoadFactOperator(BaseOperator):
                  redshift_conn_id="",
                  table="",
                  sql_query="",
+                 staging_tables=[],
                  *args, **kwargs):
 
         super(LoadFactOperator, self).__init__(*args, **kwargs)
         self.redshift_conn_id = redshift_conn_id
         self.table = table
         self.sql_query = sql_query
+        self.staging_tables = staging_tables
 
     def execute(self, context):
         """
         Method to insert data into fact table from the staging phase (events and songs).
+        The template tables in `staging_tables` are replaced by the run-scoped staging tables of this DAG run.
         """
         
         redshift = PostgresHook(postgres_conn_id=self.redshift_conn_id)
+        telemetry = SqlTelemetry(redshift, self.task_id)
                 
         self.log.info("Inserting data into destination Redshift table")
-        redshift.run(f"INSERT INTO {self.table} {self.sql_query}")
\ No newline at end of file
+        sql_query = scope_query(self.sql_query, self.staging_tables, context)
+        telemetry.run(f"INSERT INTO {self.table} {sql_query}")
+        telemetry.publish(context, self.log)
@@ -1,7 +1,12 @@
+import json
+import time
+
 from airflow.hooks.postgres_hook import PostgresHook
 from airflow.contrib.hooks.aws_hook import AwsHook
+from airflow.hooks.S3_hook import S3Hook
 from airflow.models import BaseOperator
 from airflow.utils.decorators import apply_defaults
+from helpers import prestage, run_scoped_table, render_hourly_keys, window_epoch_ms, SqlTelemetry
 
 class StageToRedshiftOperator(BaseOperator):
     ui_color = '#358140'
@@ -12,12 +17,21 @@ class StageToRedshiftOperator(BaseOperator):
         FROM '{}'
         ACCESS_KEY_ID '{}'
         SECRET_ACCESS_KEY '{}'
-        FORMAT AS JSON '{}'
+        {}
         COMPUPDATE OFF
         REGION '{}'
-        TIMEFORMAT as 'epochmillisecs'
-        TRUNCATECOLUMNS BLANKSASNULL EMPTYASNULL
+        {}
     """
+    format_sql = {
+        'json': "FORMAT AS JSON '{json_path}' {compression}",
+        'csv': "FORMAT AS CSV IGNOREHEADER 1 {compression}",
+        'parquet': "FORMAT AS PARQUET"
+    }
+    # Data conversion parameters are not supported for columnar formats
+    conversion_sql = """TIMEFORMAT as 'epochmillisecs'
+        TRUNCATECOLUMNS BLANKSASNULL EMPTYASNULL"""
+    create_sql = "CREATE TABLE IF NOT EXISTS {} (LIKE {})"
+    window_sql = "DELETE FROM {table} WHERE {column} IS NULL OR {column} < {start} OR {column} >= {end}"
     
     @apply_defaults
     def __init__(self,
@@ -28,6 +42,14 @@ class StageToRedshiftOperator(BaseOperator):
                  s3_key="",
                  region="",
                  json_path='auto',
+                 run_scoped=False,
+                 backfill_hours=1,
+                 manifest_prefix="manifests",
+                 data_format='json',
+                 compression=None,
+                 prestage_key=None,
+                 rows_per_file=100000,
+                 window_column=None,
                  *args, **kwargs):
 
         super(StageToRedshiftOperator, self).__init__(*args, **kwargs)
@@ -38,33 +60,171 @@ class StageToRedshiftOperator(BaseOperator):
         self.s3_key = s3_key
         self.region = region
         self.json_path = json_path
+        self.run_scoped = run_scoped
+        self.backfill_hours = backfill_hours
+        self.manifest_prefix = manifest_prefix
+        self.data_format = data_format
+        self.compression = compression
+        self.prestage_key = prestage_key
+        self.rows_per_file = rows_per_file
+        self.window_column = window_column
+
+        if data_format not in prestage.FORMATS:
+            raise ValueError(f"Unknown data_format '{data_format}', use one of {prestage.FORMATS}")
+        if compression not in prestage.COMPRESSIONS:
+            raise ValueError(f"Unknown compression '{compression}', use one of {prestage.COMPRESSIONS}")
+
+    def list_files(self, s3, keys):
+        """
+        Method to list all files under the given S3 prefixes
+
+        :param s3: S3Hook object
+        :param (list) keys: S3 keys (prefixes)
+        :return list of S3 keys of the files
+        """
+        files = []
+        for key in keys:
+            files.extend(s3.list_keys(bucket_name=self.s3_bucket, prefix=key) or [])
+        return files
+
+    def prestage_files(self, s3, redshift, keys, context):
+        """
+        Method to convert the raw JSON files under the given prefixes into `data_format` files with `compression`
+        that have the columns of the staging table in the same order.
+
+        :param s3: S3Hook object
+        :param redshift: PostgresHook object
+        :param (list) keys: S3 keys (prefixes) of the raw JSON files
+        :param context: Airflow task context
+        :return list of tuples with the S3 key and the size of every converted file and the number of rows written
+        """
+        columns = redshift.get_records(prestage.columns_sql.format(self.table))
+        json_keys = None
+        if self.json_path != 'auto':
+            bucket, key = S3Hook.parse_s3_url(self.json_path)
+            json_keys = prestage.jsonpaths_keys(s3.read_key(key, bucket_name=bucket))
+
+        files = self.list_files(s3, keys)
+        records = (record for f in files
+                   for record in prestage.read_json_records(s3.read_key(f, bucket_name=self.s3_bucket)))
+        rows = prestage.to_rows(records, columns, json_keys)
+
+        target = self.prestage_key.format(table=self.table, **context)
+        extension = prestage.file_extension(self.data_format, self.compression)
+        written, num_rows = [], 0
+        for k, chunk in enumerate(prestage.chunks(rows, self.rows_per_file)):
+            data = prestage.encode(chunk, columns, self.data_format, self.compression)
+            key = f"{target}/part-{k:05d}{extension}"
+            s3.load_bytes(data, key=key, bucket_name=self.s3_bucket, replace=True)
+            written.append((key, len(data)))
+            num_rows += len(chunk)
+        self.log.info(f"Converted {len(files)} JSON files into {len(written)} {extension} files "
+                      f"({num_rows} rows, {sum(size for key, size in written)} bytes) under {target}")
+        return written, num_rows
+
+    def format_options(self, prestaged=False):
+        """
+        Method to get the format and data conversion parameters of the COPY statement
+
+        :param (bool) prestaged: True if the files were converted by `prestage_files` (JSON keys match the columns)
+        :return format parameters and data conversion parameters
+        """
+        json_path = 'auto' if prestaged else self.json_path
+        compression = (self.compression or '').upper()
+        format_options = StageToRedshiftOperator.format_sql[self.data_format].format(json_path=json_path,
+                                                                                     compression=compression)
+        conversion = '' if self.data_format == 'parquet' else StageToRedshiftOperator.conversion_sql
+        return format_options, conversion
+
+    def write_manifest(self, s3, files, context):
+        """
+        Method to write a COPY manifest that lists exactly the given files
+
+        :param s3: S3Hook object
+        :param (list) files: tuples with the S3 key and the size of every file (None when unknown), the size
+            is required by a COPY of Parquet files with a manifest
+        :param context: Airflow task context
+        :return S3 path of the manifest, None if there are no files
+        """
+        if not files:
+            return None
+
+        entries = []
+        for key, size in files:
+            entry = {"url": f"s3://{self.s3_bucket}/{key}", "mandatory": True}
+            if size is not None:
+                entry["meta"] = {"content_length": size}
+            entries.append(entry)
+        manifest = {"entries": entries}
+        manifest_key = f"{self.manifest_prefix}/{self.table}/{context['ts_nodash']}.manifest"
+        s3.load_string(json.dumps(manifest), key=manifest_key, bucket_name=self.s3_bucket, replace=True)
+        return f"s3://{self.s3_bucket}/{manifest_key}"
 
     def execute(self, context):
         """
-        Method to copy data (JSON format) from a source S3 bucket to a redshift cluster into staging tables
+        Method to copy data (JSON, CSV or Parquet, optionally compressed) from a source S3 bucket to a redshift
+        cluster into staging tables. With `prestage_key` the raw JSON files are converted into `data_format`
+        files with `compression` first.
+        With `run_scoped` the data is copied into a copy of `table` that only belongs to this DAG run.
+        With `backfill_hours` > 1 the files of every hour in the window are loaded with a single COPY using a manifest.
+        The converted files are always loaded with a manifest, so files of an earlier conversion under the same
+        `prestage_key` are not loaded again.
+        With `window_column` (epoch milliseconds, e.g. `ts`) the rows outside the hours of this run are removed after
+        the COPY, so runs that share a (daily) file only keep their own rows.
         """
         
         aws_hook = AwsHook(self.aws_credentials_id)
         credentials = aws_hook.get_credentials()
         redshift = PostgresHook(postgres_conn_id=self.redshift_conn_id)
+        telemetry = SqlTelemetry(redshift, self.task_id)
+
+        table = self.table
+        if self.run_scoped:
+            table = run_scoped_table(self.table, context)
+            self.log.info(f"Creating run-scoped staging table {table} from template {self.table}")
+            telemetry.run(StageToRedshiftOperator.create_sql.format(table, self.table), label='CREATE')
 
         self.log.info("Clearing data from destination Redshift fact table")
-        redshift.run(f"DELETE FROM {self.table}")
+        telemetry.run(f"DELETE FROM {table}")
 
         self.log.info("Copying data from S3 to Redshift")
-        rendered_key = self.s3_key.format(**context)
-        s3_path = f"s3://{self.s3_bucket}/{rendered_key}"
+        rendered_keys = render_hourly_keys(self.s3_key, context, self.backfill_hours)
+        s3 = S3Hook(aws_conn_id=self.aws_credentials_id)
+        manifest_files = None
+        if self.prestage_key:
+            start = time.time()
+            manifest_files, num_rows = self.prestage_files(s3, redshift, rendered_keys, context)
+            telemetry.record('PRESTAGE', start, num_rows,
+                             bytes_written=sum(size for key, size in manifest_files))
+        elif len(rendered_keys) > 1:
+            manifest_files = [(f, None) for f in self.list_files(s3, rendered_keys)]
+            self.log.info(f"Found {len(manifest_files)} files under {len(rendered_keys)} hourly prefixes")
+
+        if manifest_files is not None:
+            s3_path = self.write_manifest(s3, manifest_files, context)
+            if s3_path is None:
+                self.log.info("No files to copy in the backfill window")
+                telemetry.publish(context, self.log)
+                return
+        else:
+            s3_path = f"s3://{self.s3_bucket}/{rendered_keys[0]}"
+        format_options, conversion = self.format_options(prestaged=bool(self.prestage_key))
         formatted_sql = StageToRedshiftOperator.copy_sql.format(
-            self.table,
+            table,
             s3_path,
             credentials.access_key,
             credentials.secret_key,
-            self.json_path,
-            self.region
+            format_options,
+            self.region,
+            conversion
         )
-        redshift.run(formatted_sql)
-
-
-
-
+        if manifest_files is not None:
+            formatted_sql += "MANIFEST"
+        telemetry.run(formatted_sql, copy_stats=True)
 
+        if self.window_column:
+            start, end = window_epoch_ms(context, self.backfill_hours)
+            self.log.info(f"Removing the rows outside the window {self.window_column} [{start}, {end})")
+            telemetry.run(StageToRedshiftOperator.window_sql.format(table=table, column=self.window_column,
+                                                                    start=start, end=end), label='WINDOW')
+        telemetry.publish(context, self.log)
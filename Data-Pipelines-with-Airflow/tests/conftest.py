@@ -0,0 +1,42 @@
+import os
+import sys
+import pytest
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'plugins'))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'benchmark'))
+
+
+@pytest.fixture(scope='session')
+def postgres_dsn(tmp_path_factory):
+    """
+    Local Postgres stand-in for Redshift: `SPARKIFY_TEST_DSN` when set, else a throwaway `pgserver` instance
+    """
+    if os.environ.get('SPARKIFY_TEST_DSN'):
+        yield os.environ['SPARKIFY_TEST_DSN']
+        return
+    pgserver = pytest.importorskip('pgserver')
+    server = pgserver.get_server(str(tmp_path_factory.mktemp('pgdata')), cleanup_mode='stop')
+    yield server.get_uri()
+    server.cleanup()
+
+
+@pytest.fixture
+def cur(postgres_dsn):
+    """
+    Cursor on a schema with the tables of `create_tables.sql`, dropped after the test
+    """
+    psycopg2 = pytest.importorskip('psycopg2')
+    from local_redshift import translate
+    conn = psycopg2.connect(postgres_dsn)
+    conn.autocommit = True
+    cursor = conn.cursor()
+    schema = f"test_{os.getpid()}_{id(cursor)}"
+    cursor.execute(f"CREATE SCHEMA {schema}; SET search_path TO {schema}")
+    with open(os.path.join(PROJECT_DIR, 'create_tables.sql')) as f:
+        cursor.execute(translate(f.read().replace('public.', '')))
+    try:
+        yield cursor
+    finally:
+        cursor.execute(f"DROP SCHEMA {schema} CASCADE")
+        conn.close()
@@ -0,0 +1,23 @@
+import json
+import pytest
+from helpers.prestage import jsonpaths_keys
+
+# The jsonpaths file of the log data
+LOG_JSONPATHS = ["$['artist']", "$['auth']", "$['firstName']", "$['gender']", "$['itemInSession']"]
+
+
+def document(paths):
+    return json.dumps({'jsonpaths': paths})
+
+
+def test_bracket_notation():
+    assert jsonpaths_keys(document(LOG_JSONPATHS)) == ['artist', 'auth', 'firstName', 'gender', 'itemInSession']
+
+
+def test_dot_notation():
+    assert jsonpaths_keys(document(['$.artist', '$.firstName', '$["song_id"]'])) == ['artist', 'firstName', 'song_id']
+
+
+def test_unsupported_expression():
+    with pytest.raises(ValueError):
+        jsonpaths_keys(document(['artist']))
@@ -0,0 +1,39 @@
+import pytest
+from helpers import SqlQueries
+
+START_MS = 1541030400000
+
+
+def stage_events(cur, events):
+    """
+    Replace the staged events by a NextSong and a Home event per (userid, level, minute)
+    """
+    cur.execute("TRUNCATE staging_events")
+    for userid, level, minute in events:
+        for page in ('NextSong', 'Home'):
+            cur.execute("INSERT INTO staging_events (userid, firstname, lastname, gender, level, page, ts) "
+                        "VALUES (%s, %s, %s, 'F', %s, %s, %s)",
+                        (userid, f'First {userid}', f'Last {userid}', level, page, START_MS + minute * 60000))
+
+
+def load_users(cur):
+    cur.execute(f"{SqlQueries.user_table_delete};\nINSERT INTO users {SqlQueries.user_table_insert}")
+    cur.execute("SELECT userid, level FROM users ORDER BY userid")
+    return cur.fetchall()
+
+
+def test_later_window_updates_the_level(cur):
+    stage_events(cur, [(1, 'free', 0), (2, 'free', 1), (1, 'free', 2)])
+    assert load_users(cur) == [(1, 'free'), (2, 'free')]
+
+    # User 1 upgrades in the next window, user 2 is not in it
+    stage_events(cur, [(1, 'free', 60), (1, 'paid', 61), (3, 'paid', 62)])
+    assert load_users(cur) == [(1, 'paid'), (2, 'free'), (3, 'paid')]
+
+
+@pytest.mark.parametrize('loads', [1, 2])
+def test_rerun_of_a_window_keeps_one_row_per_user(cur, loads):
+    stage_events(cur, [(1, 'free', 0), (1, 'paid', 1), (2, 'free', 2)])
+    for _ in range(loads):
+        users = load_users(cur)
+    assert users == [(1, 'paid'), (2, 'free')]